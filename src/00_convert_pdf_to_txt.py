@@ -3,45 +3,112 @@
 Reason for conversion is so that the TXT file can later be parsed
 and words and translations can be extracted.
 
+The pages are read in parallel, from the coordinates of their words.
+Next to the TXT file, every piece of text is saved as a record with its
+page, column, line and x-offset, see utils/pdf_layout.py.
+
 Note: This script was used only once during the beginning of the project.
 The exported TXT file has since been manually edited to fix parsing
 errors.
 """
 
+import argparse
+import json
 import os
-import subprocess
-
-from utils.constants import WORDLIST_PDF_PATH, WORDLIST_TXT_PATH
-from utils.logger import logger
-
-if not os.path.exists(WORDLIST_PDF_PATH):
-    logger.error('PDF file not found')
-    logger.error(f'{WORDLIST_PDF_PATH} does not exist')
-    raise SystemExit('Aborting')
-
-logger.info('Converting PDF to TXT')
-
-completed_process = subprocess.run(
-    [
-        'pdftotext',
-        '-layout',  # Maintains the original physical layout of the file.
-        '-f',  # Specifies the first page to convert.
-        '16',
-        '-l',  # Specifies the last page to convert.
-        '102',
-        WORDLIST_PDF_PATH,
-        WORDLIST_TXT_PATH,
-    ],
-    capture_output=True,
+from functools import partial
+
+from utils.constants import (
+    PAGE_BREAK,
+    WORDLIST_PDF_PATH,
+    WORDLIST_RECORDS_JSONL_PATH,
+    WORDLIST_TXT_PATH,
 )
+from utils.logger import logger, run_step
+from utils.pdf_layout import extract_pages
+
+# Pages of the Goethe-Zertifikat B1 wordlist holding the words.
+FIRST_PAGE = 16
+LAST_PAGE = 102
+
+
+def read_input(pdf_path: str = WORDLIST_PDF_PATH) -> str:
+    """Check the wordlist PDF exists and return its path."""
+    if not os.path.exists(pdf_path):
+        logger.error('PDF file not found')
+        logger.error(f'{pdf_path} does not exist')
+        raise SystemExit('Aborting')
+
+    return pdf_path
+
+
+def run(
+    pdf_path: str,
+    first_page: int = FIRST_PAGE,
+    last_page: int = LAST_PAGE,
+    workers: int | None = None,
+) -> list[tuple[list[dict], str]]:
+    """Extract the records and the text of every page."""
+    logger.info('Converting PDF to TXT')
+
+    pages = extract_pages(pdf_path, first_page, last_page, workers)
+
+    logger.info('Successfully converted PDF to TXT')
+    return pages
 
-if completed_process.returncode != 0:
-    logger.error(
-        f'pdftotext returned non-zero exit status '
-        f'{completed_process.returncode}'
+
+def write_output(pages: list[tuple[list[dict], str]]) -> None:
+    """Save the raw TXT wordlist and the records of the pages."""
+    # Every page ends with a page break, on a line of its own: in
+    # pdftotext's output the running header of the next page follows it,
+    # which 01_clean_txt.py drops together with the page break line.
+    with open(WORDLIST_TXT_PATH, 'w', encoding='utf-8') as file:
+        file.write(''.join(f'{text}{PAGE_BREAK}\n' for _, text in pages))
+
+    with open(WORDLIST_RECORDS_JSONL_PATH, 'w', encoding='utf-8') as file:
+        for records, _ in pages:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    logger.info(f'Saved raw TXT wordlist at {WORDLIST_TXT_PATH}')
+    logger.info(f'Saved wordlist records at {WORDLIST_RECORDS_JSONL_PATH}')
+
+
+def main() -> None:
+    """Convert the pages of the wordlist PDF file."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pdf', default=WORDLIST_PDF_PATH, help='PDF file')
+    parser.add_argument(
+        '--first-page',
+        type=int,
+        default=FIRST_PAGE,
+        help='First page to convert, counting from 1',
     )
-    logger.error(completed_process.stderr)
-    raise SystemExit('Aborting')
+    parser.add_argument(
+        '--last-page',
+        type=int,
+        default=LAST_PAGE,
+        help='Last page to convert, inclusive',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of worker processes, by default one per CPU core',
+    )
+    args = parser.parse_args()
+
+    run_step(
+        '00_convert_pdf_to_txt',
+        partial(read_input, args.pdf),
+        partial(
+            run,
+            first_page=args.first_page,
+            last_page=args.last_page,
+            workers=args.workers,
+        ),
+        write_output,
+    )
+
 
-logger.info('Successfully converted PDF to TXT')
-logger.info(f'Saved raw TXT wordlist at {WORDLIST_TXT_PATH}')
+if __name__ == '__main__':
+    main()
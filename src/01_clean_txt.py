@@ -2,29 +2,22 @@
 
 Remove unnecessary strings and strip margins - left,
 top and bottom margins.
+
+The file is streamed line by line through a chain of generators, so
+it's never held in memory as a whole.
 """
 
 import os.path
 import re
+from collections.abc import Iterable, Iterator
 
 from utils.constants import (
     PAGE_BREAK,
     WORDLIST_CLEANED_TXT_PATH,
     WORDLIST_TXT_PATH,
 )
-from utils.logger import logger
-
-if not os.path.exists(WORDLIST_TXT_PATH):
-    logger.error(
-        'Wordlist TXT file not found. Did you run "00_convert_pdf_to_txt.py"?'
-    )
-    logger.error(f'{WORDLIST_TXT_PATH} does not exist')
-    raise SystemExit('Aborting')
-
-logger.info('Cleaning TXT')
-
-with open(WORDLIST_TXT_PATH, 'r', encoding='utf-8') as file:
-    txt_lines = file.readlines()
+from utils.job_queue import atomic_open
+from utils.logger import logger, run_step
 
 # Lines containing the following can be removed:
 #   - 'd+ WORTLISTE'
@@ -36,46 +29,143 @@ page_num_after_pattern = re.compile(r'\s+WORTLISTE\s+\d+')
 vs_03 = 'VS_03'
 zertifikat_b1 = 'ZERTIFIKAT B1'
 
-# Holds final result. Will be saved to a file.
-cleaned_lines = []
-# Do the actual cleaning.
-for line in txt_lines:
-    # All page break lines have text on them, strip it.
-    if line.startswith(PAGE_BREAK):
-        cleaned_lines.append(PAGE_BREAK)
-        continue
-
-    # Remove the following lines.
-    if (
-        page_num_before_pattern.search(line)
-        or page_num_after_pattern.search(line)
-        or vs_03 in line
-        or zertifikat_b1 in line
-    ):
-        continue
-
-    # All left margins are 8 whitespaces, strip them.
-    if len(line) > 8:
-        line = line[8:]
-
-    cleaned_lines.append(line)
-
-# Convert to string, so we can use Regex to strip out top and bottom margins.
-# Also strip leading and trailing newlines, it's safe to do so.
-cleaned_contents = ''.join(cleaned_lines).strip()
-
-# Remove top margins (all newlines after a page break except one).
-cleaned_contents = re.sub(
-    rf'{PAGE_BREAK}\n+', rf'{PAGE_BREAK}\n', cleaned_contents
-)
 
-# Remove bottom margins (all newlines before a page break except one).
-cleaned_contents = re.sub(
-    rf'\n+{PAGE_BREAK}', rf'\n{PAGE_BREAK}', cleaned_contents
-)
+def read_input() -> Iterator[str]:
+    """Read the raw TXT wordlist line by line."""
+    if not os.path.exists(WORDLIST_TXT_PATH):
+        logger.error(
+            'Wordlist TXT file not found. '
+            'Did you run "00_convert_pdf_to_txt.py"?'
+        )
+        logger.error(f'{WORDLIST_TXT_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    with open(WORDLIST_TXT_PATH, 'r', encoding='utf-8') as file:
+        yield from file
+
+
+def clean_lines(txt_lines: Iterable[str]) -> Iterator[str]:
+    """Remove the unnecessary lines and the left margins.
+
+    Yields the text in pieces - lines with their newline, and page
+    breaks without one.
+    """
+    for line in txt_lines:
+        # Page break lines can have the running header of the next page
+        # on them, strip it.
+        if line.startswith(PAGE_BREAK):
+            yield PAGE_BREAK + ('\n' if line.endswith('\n') else '')
+            continue
+
+        # Remove the following lines.
+        if (
+            page_num_before_pattern.search(line)
+            or page_num_after_pattern.search(line)
+            or vs_03 in line
+            or zertifikat_b1 in line
+        ):
+            continue
+
+        # All left margins are 8 whitespaces, strip them.
+        if len(line) > 8:
+            line = line[8:]
+
+        yield line
+
+
+def split_lines(pieces: Iterable[str]) -> Iterator[str]:
+    """Join the pieces of text and split them into lines, without newlines.
+
+    A page break is on the same line as whatever follows it.
+    """
+    current = ''
+    for piece in pieces:
+        if piece.endswith('\n'):
+            yield current + piece[:-1]
+            current = ''
+        else:
+            current += piece
+    if current:
+        yield current
+
+
+def collapse_margins(lines: Iterable[str]) -> Iterator[str]:
+    """Remove the top and bottom margins of the pages.
+
+    These are the empty lines right after and right before a page break.
+    The empty lines are held back until it's known whether a page break
+    follows them.
+    """
+    empty_lines = 0
+    after_page_break = False
+    for line in lines:
+        if not line:
+            # Top margin.
+            if not after_page_break:
+                empty_lines += 1
+            continue
+
+        # Bottom margin.
+        if not line.startswith(PAGE_BREAK):
+            yield from [''] * empty_lines
+        empty_lines = 0
+
+        yield line
+        after_page_break = line.endswith(PAGE_BREAK)
+
+    yield from [''] * empty_lines
+
+
+def strip_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Strip the leading and trailing whitespace of the whole text.
+
+    Lines of only whitespace are held back until more text follows.
+    """
+    lines = iter(lines)
+    for line in lines:
+        if line.strip():
+            held = [line.lstrip()]
+            break
+    else:
+        return
+
+    for line in lines:
+        if line.strip():
+            yield from held
+            held = []
+        held.append(line)
+
+    yield held[0].rstrip()
+
+
+def run(txt_lines: Iterable[str]) -> Iterator[str]:
+    """Clean the raw TXT lines, yielding the cleaned lines one by one.
+
+    The lines are cleaned as they are read, without holding the whole
+    text in memory.
+    """
+    logger.info('Cleaning TXT')
+
+    yield from strip_lines(
+        collapse_margins(split_lines(clean_lines(txt_lines)))
+    )
+
+    logger.info('Successfully cleaned TXT')
+
+
+def write_output(cleaned_lines: Iterable[str]) -> None:
+    """Save the cleaned TXT wordlist, once all lines are written."""
+    with atomic_open(WORDLIST_CLEANED_TXT_PATH, 'w', encoding='utf-8') as file:
+        for idx, line in enumerate(cleaned_lines):
+            file.write(f'\n{line}' if idx else line)
+
+    logger.info(f'Saved cleaned TXT wordlist at {WORDLIST_CLEANED_TXT_PATH}')
+
+
+def main() -> None:
+    """Clean the raw TXT wordlist file."""
+    run_step('01_clean_txt', read_input, run, write_output)
 
-with open(WORDLIST_CLEANED_TXT_PATH, 'w', encoding='utf-8') as file:
-    file.write(cleaned_contents)
 
-logger.info('Successfully cleaned TXT')
-logger.info(f'Saved cleaned TXT wordlist at {WORDLIST_CLEANED_TXT_PATH}')
+if __name__ == '__main__':
+    main()
@@ -7,83 +7,113 @@ Reason for preprocessing is to allow parsing of the file.
 
 import os.path
 import re
-from collections import Counter
+from collections.abc import Iterable, Iterator
 
+from utils.columns import Window, find_gutters, split_columns
 from utils.constants import (
     PAGE_BREAK,
     WORDLIST_CLEANED_TXT_PATH,
     WORDLIST_PREPROCESSED_TXT_PATH,
 )
-from utils.logger import logger
+from utils.logger import logger, run_step
+
+# Where the gutters between the columns are searched, one per gutter.
+# All middles are somewhere between 68 and 88. This is an observation.
+GUTTER_WINDOWS: list[Window] = [(68, 88)]
+# Shorter lines don't reach the gutters.
+MIN_LINE_LENGTH = 100
+
+
+def read_input() -> Iterator[str]:
+    """Read the cleaned TXT wordlist line by line, without newlines."""
+    if not os.path.exists(WORDLIST_CLEANED_TXT_PATH):
+        logger.error(
+            'Cleaned wordlist TXT file not found. '
+            'Did you run "01_clean_txt.py"?'
+        )
+        logger.error(f'{WORDLIST_CLEANED_TXT_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    with open(WORDLIST_CLEANED_TXT_PATH, 'r', encoding='utf-8') as file:
+        line = '\n'
+        for line in file:
+            yield line.removesuffix('\n')
+        # A trailing newline ends with an empty line.
+        if line.endswith('\n'):
+            yield ''
+
+
+def split_pages(lines: Iterable[str]) -> Iterator[list[str]]:
+    """Group the lines into pages, split at the lines holding a page break.
+
+    A page break on the first or the last line, or right after another
+    page break, belongs to the page - like splitting the text at
+    newline, page break, newline.
+    """
+    page: list[str] = []
+    after_page_break = True
+    held_page_break = False
+    for line in lines:
+        if held_page_break:
+            # The page break wasn't on the last line.
+            yield page
+            page = []
+            held_page_break = False
+            after_page_break = True
+
+        if line == PAGE_BREAK and not after_page_break:
+            held_page_break = True
+            continue
 
-if not os.path.exists(WORDLIST_CLEANED_TXT_PATH):
-    logger.error(
-        'Cleaned wordlist TXT file not found. Did you run "01_clean_txt.py"?'
-    )
-    logger.error(f'{WORDLIST_CLEANED_TXT_PATH} does not exist')
-    raise SystemExit('Aborting')
+        page.append(line)
+        after_page_break = False
 
-logger.info('Preprocessing TXT')
+    if held_page_break:
+        page.append(PAGE_BREAK)
+    yield page
 
-with open(WORDLIST_CLEANED_TXT_PATH, 'r', encoding='utf-8') as file:
-    contents = file.read()
 
-pages = contents.split(f'\n{PAGE_BREAK}\n')
+def run(cleaned_lines: Iterable[str]) -> str:
+    """Expand the pages of the cleaned lines into a single column."""
+    logger.info('Preprocessing TXT')
 
-# Holds final result. Will be saved to a file.
-preprocessed_lines = []
-# Do the actual preprocessing.
-for page in pages:
-    lines = page.split('\n')
+    # Holds final result.
+    preprocessed_lines = []
+    # Do the actual preprocessing.
+    for lines in split_pages(cleaned_lines):
+        # The gutters are the positions where most lines have a column
+        # starting - two spaces followed by a letter.
+        gutters = find_gutters(lines, GUTTER_WINDOWS, MIN_LINE_LENGTH)
 
-    # Count occurrences of '  [A-Za-z]' in the middle of the page.
-    # The most common index will correspond to the middle of the page.
-    indices_occurrences = []
-    for line in lines:
-        # Skip lines shorter than 100 to avoid errors.
-        if len(line) < 100:
-            continue
-        # All middles are somewhere between 68 and 88. This is an observation.
-        for i in range(68, 88):
-            if line[i - 1] == ' ' and line[i] == ' ' and line[i + 1].isalpha():
-                indices_occurrences.append(i)
+        # Even though a line may have no content in the later columns,
+        # there is a newline which will most-likely indicate a new word.
+        for column in split_columns(lines, gutters):
+            preprocessed_lines.append('\n'.join(column) + '\n')
 
-    # Find the most common index.
-    counter = Counter(indices_occurrences)
-    most_common_idx: tuple[int, int] = counter.most_common(1)[0]
+    # Convert to string, so we can use Regex to reduce amount of newlines.
+    preprocessed_content = '\n'.join(preprocessed_lines).strip()
 
-    # First int is index, second is frequency.
-    most_common_idx: int = most_common_idx[0]
+    # Convert 3 or more newlines into 2 newlines.
+    preprocessed_content = re.sub(r'\n{3,}', '\n\n', preprocessed_content)
 
-    # Everything before most_common_idx is considered left column.
-    # Everything after most_common_idx is considered right column.
-    left_page_column_content = ''
-    right_page_column_content = ''
+    logger.info('Successfully preprocessed TXT')
+    return preprocessed_content
 
-    for line in lines:
-        if len(line) >= most_common_idx:
-            left_page_column_content += f'{line[:most_common_idx]}\n'
-            # most_common_idx + 1 so we don't grab the space before the letter
-            right_page_column_content += f'{line[most_common_idx + 1:]}\n'
-        else:
-            left_page_column_content += f'{line}\n'
-            # Even though there is no content in right column, there is
-            # a newline which will most-likely indicate a new word.
-            right_page_column_content += '\n'
-
-    preprocessed_lines.append(left_page_column_content)
-    preprocessed_lines.append(right_page_column_content)
-
-# Convert to string, so we can use Regex to reduce amount of newlines.
-preprocessed_content = '\n'.join(preprocessed_lines).strip()
-
-# Convert 3 or more newlines into 2 newlines.
-preprocessed_content = re.sub(r'\n{3,}', '\n\n', preprocessed_content)
-
-with open(WORDLIST_PREPROCESSED_TXT_PATH, 'w', encoding='utf-8') as file:
-    file.write(preprocessed_content)
-
-logger.info('Successfully preprocessed TXT')
-logger.info(
-    f'Saved preprocessed TXT wordlist at {WORDLIST_PREPROCESSED_TXT_PATH}'
-)
+
+def write_output(preprocessed_content: str) -> None:
+    """Save the preprocessed TXT wordlist."""
+    with open(WORDLIST_PREPROCESSED_TXT_PATH, 'w', encoding='utf-8') as file:
+        file.write(preprocessed_content)
+
+    logger.info(
+        f'Saved preprocessed TXT wordlist at {WORDLIST_PREPROCESSED_TXT_PATH}'
+    )
+
+
+def main() -> None:
+    """Preprocess the cleaned TXT wordlist file."""
+    run_step('02_preprocess_txt', read_input, run, write_output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,31 +3,48 @@
 Extract words and examples to a CSV file.
 """
 
+import io
 import os.path
 import re
+from collections.abc import Iterable, Iterator
+from enum import Enum
 
 import pandas as pd
+
 from utils.constants import WORDLIST_CSV_PATH, WORDLIST_PREPROCESSED_TXT_PATH
-from utils.logger import logger
+from utils.logger import logger, run_step
+from utils.shards import map_shards, section_shards
 
-if not os.path.exists(WORDLIST_PREPROCESSED_TXT_PATH):
-    logger.error(
-        'Preprocessed wordlist TXT file not found. Did you run "02_preprocess_txt.py"?'
-    )
-    logger.error(f'{WORDLIST_PREPROCESSED_TXT_PATH} does not exist')
-    raise SystemExit('Aborting')
+# Lines with single letters A B C D E F G ...
+letter_pattern = re.compile(r'^[A-Z]$')
+# Lines with just a prefix, e.g. 'Haupt-' or 'herunter-, runter-',
+# heading the words starting with it.
+prefix_pattern = re.compile(r'^[^\W\d_]+-(, [^\W\d_]+-)*$')
+# Pattern matching ' 1. ' or ' 2. ' etc... followed by some text.
+example_start_pattern = re.compile(r'\s\s\d+\.\s.')
+# Reduce all 2 or more whitespaces to just 2, so lines can be split.
+column_gap_pattern = re.compile(r'\s{2,}')
+
+# Characters, besides letters, words consist of.
+word_chars = frozenset('äöü→„–(/-&')
 
-logger.info('Parsing TXT')
 
-with open(WORDLIST_PREPROCESSED_TXT_PATH, 'r', encoding='utf-8') as file:
-    lines = file.readlines()
+class LineKind(Enum):
+    """What a line of the preprocessed TXT holds."""
 
-# Remove lines with single letters A B C D E F G ...
-# as those mess with the parsing.
-letter_regex = r'^[A-Z]$'
-for line in lines:
-    if re.match(letter_regex, line.strip()):
-        lines.remove(line)
+    BLANK = 'blank'
+    # A single letter, the heading of a section of the alphabet.
+    HEADING = 'heading'
+    # A prefix, before the words starting with it.
+    PREFIX = 'prefix'
+    # A word with its first example.
+    NEW_ENTRY = 'new entry'
+    # The start of a second, third, ... example.
+    NUMBERED_EXAMPLE = 'numbered example'
+    # More of the word, the example or both.
+    CONTINUATION = 'continuation'
+    # Anything else, most likely starting with a digit.
+    OTHER = 'other'
 
 
 def is_word_letter(char: str) -> bool:
@@ -36,141 +53,221 @@ def is_word_letter(char: str) -> bool:
     Words consist of alphanumeric characters, umlauts and a few special
     characters such as parentheses, dashes or arrows.
     """
-    return char.isalpha() or char.lower() in [
-        'ä',
-        'ö',
-        'ü',
-        '→',
-        '„',
-        '–',
-        '(',
-        '/',
-        '-',
-        '&',
-    ]
-
-
-current_word: str | None = None
-current_example: str | None = None
-# Hold the final result which will be exported to CSV.
-words = []
-examples = []
-# Pattern matching ' 1. ' or ' 2. ' etc...
-example_start_pattern = r'\s*(\s\s\d+\.\s).+'
-
-for line in lines:
-    # If line is a newline and there is a current_word, save.
-    # Another word almost always comes after a newline.
-    is_newline = len(line.strip()) == 0
-    if is_newline and current_word:
-        words.append(current_word)
-        examples.append(current_example)
-        current_word = None
-        current_example = None
-        continue
-    elif is_newline:
-        continue
-
-    # Else the line is longer. We have parsing to do...
+    return char.isalpha() or char.lower() in word_chars
 
+
+def classify(line: str) -> tuple[LineKind, re.Match | None]:
+    """Classify the line, returning the match of a numbered example."""
+    stripped = line.strip()
+    if not stripped:
+        return LineKind.BLANK, None
+    if letter_pattern.match(stripped):
+        return LineKind.HEADING, None
+    if prefix_pattern.match(line.rstrip()):
+        return LineKind.PREFIX, None
     # '  1. ' always indicates a new word.
     if '  1. ' in line:
-        # If there was a word previously, save it first.
-        if current_word:
-            words.append(current_word)
-            examples.append(current_example)
-
-        line_sections = line.split('  1. ')
-        # First section is word.
-        current_word = line_sections[0].strip() + '\n'
-        # Second section is example.
-        current_example = '1. ' + line_sections[1].strip() + '\n'
-
-    # If there is a ' 2. ' or ' 3. ', ... then we definitely have
-    # a second/third/... example.
-    elif re.search(example_start_pattern, line):
-        search = re.search(example_start_pattern, line)
-        example_start = search.group(1)
-        # Get index of '  2. '
-        idx_example_start: int = line.find(example_start)
-        # Before the index is a word. There could be nothing, but we
-        # append it anyway.
-        word = line[:idx_example_start].strip() + '\n'
-        # After the index is the example.
-        example = line[idx_example_start - 1 :].strip() + '\n'
-
-        # If there is a word, append to it, else append to last inserted word.
-        # The latter are common cases where a word spans over multiple columns.
-        if current_word and current_example:
-            current_word += word
-            current_example += example
-        else:
-            words[-1] += word
-            examples[-1] += example
-
-    # First char being a word letter and having a current_word could mean 3 things:
-    #    1. Continuation of current_word and example.
-    #    2. Just continuation of current_word.
-    #    3. Just continuation of example.
-    elif is_word_letter(line.lstrip()[0]) and current_word:
-        # Reduce all 2 or more whitespaces to just 2, so we can split the line.
-        line = re.sub(r'\s{2,}', '  ', line)
-        line_sections = line.split('  ')
-        # Remove empty strings.
-        line_sections = [x for x in line_sections if x]
-        if len(line_sections) == 2:
-            # We have a word and an example.
-            current_word += line_sections[0].strip() + '\n'
-            current_example += line_sections[1].strip() + '\n'
-        elif len(line_sections) == 1:
-            # It could be a word or an example. If first char of line is a
-            # letter, then we consider it a word, otherwise an example.
-            if is_word_letter(line[0]):
-                current_word += line_sections[0].strip() + '\n'
-            else:
-                current_example += line_sections[0].strip() + '\n'
-        else:
-            # Anything other than 1 or 2 shouldn't happen.
-            logger.error(f'Weird edge case at line "{line}"')
+        return LineKind.NEW_ENTRY, None
+    if match := example_start_pattern.search(line):
+        return LineKind.NUMBERED_EXAMPLE, match
+    if is_word_letter(line.lstrip()[0]):
+        return LineKind.CONTINUATION, None
+    return LineKind.OTHER, None
+
+
+def split_sections(line: str) -> tuple[str, list[str]]:
+    """Split a line at the gaps between its columns.
+
+    Returns the line with the gaps reduced and the non-empty sections.
+    """
+    line = column_gap_pattern.sub('  ', line)
+    return line, [x for x in line.split('  ') if x]
+
+
+def read_input() -> str:
+    """Read the preprocessed TXT wordlist."""
+    if not os.path.exists(WORDLIST_PREPROCESSED_TXT_PATH):
+        logger.error(
+            'Preprocessed wordlist TXT file not found. '
+            'Did you run "02_preprocess_txt.py"?'
+        )
+        logger.error(f'{WORDLIST_PREPROCESSED_TXT_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    with open(WORDLIST_PREPROCESSED_TXT_PATH, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def parse_entries(
+    lines: Iterable[str], start: int = 1
+) -> Iterator[tuple[str, str | None]]:
+    """Parse the lines into words and their examples, yielding them one by one.
+
+    A state machine over the classified lines. The word and the examples
+    of the current entry are collected in lists of lines. A finished
+    entry is held back until the next one starts, as lines between
+    entries - e.g. at the top of a new page-column - still belong to it.
+    start is the number of the first line, used in error messages.
+    """
+    # Lines of the current word and example.
+    current_word: list[str] | None = None
+    current_example: list[str] | None = None
+    # Lines of the last finished word and example.
+    last_word: list[str] | None = None
+    last_example: list[str] | None = None
+
+    def join(parts: list[str] | None) -> str | None:
+        return None if parts is None else '\n'.join(parts) + '\n'
+
+    def last_entry_lines(line_number: int, line: str) -> tuple[list, list]:
+        if last_word is None or last_example is None:
+            logger.error(
+                f'Line {line_number} belongs to no word: "{line.rstrip()}"'
+            )
             raise SystemExit('Aborting')
+        return last_word, last_example
+
+    for line_number, line in enumerate(lines, start=start):
+        kind, match = classify(line)
+
+        if kind is LineKind.HEADING:
+            # Lines with single letters mess with the parsing.
+            continue
 
-    # Same as above, however, this time it would be a new word/example or both.
-    elif is_word_letter(line.lstrip()[0]) and not current_word:
-        # Reduce all 2 or more whitespaces to just 2, so we can split the line.
-        line = re.sub(r'\s{2,}', '  ', line)
-        line_sections = line.split('  ')
-        # Remove empty strings.
-        line_sections = [x for x in line_sections if x]
-        if len(line_sections) == 2:
-            # We have a word and an example.
-            current_word = line_sections[0].strip() + '\n'
-            current_example = line_sections[1].strip() + '\n'
-        elif len(line_sections) == 1:
-            # It could be a word or an example. If first char of line is a
-            # letter, then we consider it a word, otherwise an example.
-            if is_word_letter(line[0]):
-                current_word = line_sections[0].strip() + '\n'
+        if kind is LineKind.PREFIX:
+            # A prefix between two words has no example, skip it. Else
+            # it's a part of the current word, broken across lines.
+            if not current_word:
+                continue
+            kind = LineKind.CONTINUATION
+
+        if kind is LineKind.BLANK:
+            # If line is a newline and there is a current_word, save.
+            # Another word almost always comes after a newline.
+            if current_word:
+                if last_word is not None:
+                    yield join(last_word), join(last_example)
+                last_word, last_example = current_word, current_example
+                current_word = None
+                current_example = None
+
+        elif kind is LineKind.NEW_ENTRY:
+            # If there was a word previously, save it first.
+            if current_word:
+                if last_word is not None:
+                    yield join(last_word), join(last_example)
+                last_word, last_example = current_word, current_example
+
+            line_sections = line.split('  1. ')
+            # First section is word, second section is example.
+            current_word = [line_sections[0].strip()]
+            current_example = ['1. ' + line_sections[1].strip()]
+
+        elif kind is LineKind.NUMBERED_EXAMPLE:
+            # Index of '  2. ', '  3. ', ... Before it is a word. There
+            # could be nothing, but we append it anyway. After it is the
+            # example.
+            idx_example_start = match.start()
+            word = line[:idx_example_start].strip()
+            example = line[idx_example_start - 1 :].strip()
+
+            # If there is a word, append to it, else append to last
+            # inserted word. The latter are common cases where a word
+            # spans over multiple columns.
+            if current_word and current_example:
+                current_word.append(word)
+                current_example.append(example)
             else:
-                current_example = line_sections[0].strip() + '\n'
-        else:
-            # Anything other than 1 or 2 shouldn't happen.
-            logger.error(f'Weird edge case at line "{line}"')
-            raise SystemExit('Aborting')
+                words, examples = last_entry_lines(line_number, line)
+                words.append(word)
+                examples.append(example)
+
+        elif kind is LineKind.CONTINUATION:
+            # With a current_word, the line could mean 3 things:
+            #    1. Continuation of current_word and example.
+            #    2. Just continuation of current_word.
+            #    3. Just continuation of example.
+            # Without, it's a new word/example or both.
+            line, line_sections = split_sections(line)
+            if len(line_sections) == 2:
+                # We have a word and an example.
+                word, example = (x.strip() for x in line_sections)
+                if current_word:
+                    current_word.append(word)
+                    current_example.append(example)
+                else:
+                    current_word = [word]
+                    current_example = [example]
+            elif len(line_sections) == 1:
+                # It could be a word or an example. If first char of line
+                # is a letter, then we consider it a word, otherwise an
+                # example.
+                section = line_sections[0].strip()
+                if is_word_letter(line[0]):
+                    if current_word:
+                        current_word.append(section)
+                    else:
+                        current_word = [section]
+                elif current_word:
+                    current_example.append(section)
+                else:
+                    current_example = [section]
+            else:
+                # Anything other than 1 or 2 shouldn't happen.
+                logger.error(f'Weird edge case at line {line_number} "{line}"')
+                raise SystemExit('Aborting')
 
-    # Else we have something that isn't a word letter - most likely a digit.
-    # Add it to example.
-    else:
-        line = line.strip()
-        if current_example:
-            current_example += line + '\n'
+        # Something that isn't a word letter - most likely a digit.
+        # Add it to example.
+        elif current_example:
+            current_example.append(line.strip())
         else:
             # Usually a new page-column.
-            examples[-1] += line + '\n'
+            _, examples = last_entry_lines(line_number, line)
+            examples.append(line.strip())
+
+    if last_word is not None:
+        yield join(last_word), join(last_example)
+    # The input may end without a blank line after the last entry.
+    if current_word:
+        yield join(current_word), join(current_example)
+
+
+def parse_section(section: tuple[int, list[str]]) -> list[tuple]:
+    """Parse the lines of a section, given with the number of the first."""
+    start, lines = section
+    return list(parse_entries(lines, start))
+
+
+def run(contents: str) -> pd.DataFrame:
+    """Parse the preprocessed contents into words and examples.
+
+    The sections of the alphabet are parsed in parallel.
+    """
+    logger.info('Parsing TXT')
+
+    lines = io.StringIO(contents).readlines()
+    sections = map_shards(parse_section, section_shards(lines))
+    df = pd.DataFrame(
+        [entry for entries in sections for entry in entries],
+        columns=['word', 'examples'],
+    )
+
+    logger.info(f'Parsed {df.shape[0]} words')
+    logger.info('Successfully parsed TXT')
+    return df
+
+
+def write_output(df: pd.DataFrame) -> None:
+    """Save the raw CSV wordlist."""
+    df.to_csv(WORDLIST_CSV_PATH, index=False)
+    logger.info(f'Saved raw CSV wordlist at {WORDLIST_CSV_PATH}')
+
 
+def main() -> None:
+    """Parse the preprocessed TXT wordlist file."""
+    run_step('03_parse_txt', read_input, run, write_output)
 
-df = pd.DataFrame({'word': words, 'examples': examples})
-logger.info(f'Parsed {df.shape[0]} words')
 
-df.to_csv(WORDLIST_CSV_PATH, index=False)
-logger.info('Successfully parsed TXT')
-logger.info(f'Saved raw CSV wordlist at {WORDLIST_CSV_PATH}')
+if __name__ == '__main__':
+    main()
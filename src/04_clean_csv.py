@@ -4,47 +4,87 @@ Strip whitespaces and newlines.
 """
 
 import os
+from functools import partial
 
 import pandas as pd
+
 from utils.constants import WORDLIST_CLEANED_CSV_PATH, WORDLIST_CSV_PATH
-from utils.logger import logger
+from utils.logger import logger, run_step
+from utils.row_cache import apply_incrementally
+from utils.shards import map_row_shards
+
+
+def read_input() -> pd.DataFrame:
+    """Read the raw CSV wordlist."""
+    if not os.path.exists(WORDLIST_CSV_PATH):
+        logger.error(
+            'Wordlist CSV file not found. Did you run "03_parse_txt.py"?'
+        )
+        logger.error(f'{WORDLIST_CSV_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    return pd.read_csv(WORDLIST_CSV_PATH)
+
+
+def clean_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip whitespaces and newlines from the given rows."""
+    df = df.copy()
+
+    # Strip leading whitespaces and trailing newlines.
+    df['word'] = df['word'].str.strip()
+    df['examples'] = df['examples'].str.strip()
 
-if not os.path.exists(WORDLIST_CSV_PATH):
-    logger.error('Wordlist CSV file not found. Did you run "03_parse_txt.py"?')
-    logger.error(f'{WORDLIST_CSV_PATH} does not exist')
-    raise SystemExit('Aborting')
+    # Certain words are transferred over with a hyphen + newline. Undo that.
+    df['word'] = df['word'].str.replace('-\n', '')
+    df['examples'] = df['examples'].str.replace('-\n', '')
 
-logger.info('Cleaning CSV')
+    # If word isn't transferred but there is a word after, it's a newline.
+    # Make that a whitespace.
+    df['word'] = df['word'].str.replace('\n', ' ')
+    df['examples'] = df['examples'].str.replace('\n', ' ')
 
-df = pd.read_csv(WORDLIST_CSV_PATH)
+    return df
 
-# Ensure that there are no cells with null values.
-null_count: int = df.isnull().sum().sum()
-if null_count > 0:
-    null_mask = df.isnull().any(axis=1)
-    null_rows = df[null_mask]
 
-    logger.error(f'Found {null_count} cells with null values')
-    logger.error(
-        'Cleaning/Preprocessing/Parsing of the TXT file must '
-        'have gone wrong. Null rows are:'
-        f'{null_rows}'
+def run(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip whitespaces and newlines from words and examples."""
+    logger.info('Cleaning CSV')
+
+    # Ensure that there are no cells with null values.
+    null_count: int = df.isnull().sum().sum()
+    if null_count > 0:
+        null_mask = df.isnull().any(axis=1)
+        null_rows = df[null_mask]
+
+        logger.error(f'Found {null_count} cells with null values')
+        logger.error(
+            'Cleaning/Preprocessing/Parsing of the TXT file must '
+            'have gone wrong. Null rows are:'
+            f'{null_rows}'
+        )
+        raise SystemExit('Aborting')
+
+    df = apply_incrementally(
+        '04_clean_csv',
+        df,
+        partial(map_row_shards, clean_rows),
+        columns=['word', 'examples'],
     )
-    raise SystemExit('Aborting')
 
-# Strip leading whitespaces and trailing newlines.
-df['word'] = df['word'].str.strip()
-df['examples'] = df['examples'].str.strip()
+    logger.info('Successfully cleaned CSV')
+    return df
+
+
+def write_output(df: pd.DataFrame) -> None:
+    """Save the cleaned CSV wordlist."""
+    df.to_csv(WORDLIST_CLEANED_CSV_PATH, index=False)
+    logger.info(f'Saved cleaned CSV wordlist at {WORDLIST_CLEANED_CSV_PATH}')
+
 
-# Certain words are transferred over with a hyphen + newline. Undo that.
-df['word'] = df['word'].str.replace('-\n', '')
-df['examples'] = df['examples'].str.replace('-\n', '')
+def main() -> None:
+    """Clean the raw CSV wordlist file."""
+    run_step('04_clean_csv', read_input, run, write_output)
 
-# If word isn't transferred but there is a word after, it's a newline.
-# Make that a whitespace.
-df['word'] = df['word'].str.replace('\n', ' ')
-df['examples'] = df['examples'].str.replace('\n', ' ')
 
-df.to_csv(WORDLIST_CLEANED_CSV_PATH, index=False)
-logger.info('Successfully cleaned CSV')
-logger.info(f'Saved cleaned CSV wordlist at {WORDLIST_CLEANED_CSV_PATH}')
+if __name__ == '__main__':
+    main()
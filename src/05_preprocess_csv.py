@@ -5,131 +5,151 @@ Prepare for translation and creation of audio files.
 
 import os
 import re
+from collections import Counter
 
 import pandas as pd
+
 from utils.constants import (
+    PREPROCESSING_RULES_PATH,
     WORDLIST_CLEANED_CSV_PATH,
     WORDLIST_PREPROCESSED_CSV_PATH,
+    WORDLIST_PREPROCESSED_JSONL_PATH,
 )
-from utils.logger import logger
-
-if not os.path.exists(WORDLIST_CLEANED_CSV_PATH):
-    logger.error(
-        'Cleaned wordlist CSV file not found. Did you run "04_clean_csv.py"?'
-    )
-    logger.error(f'{WORDLIST_CLEANED_CSV_PATH} does not exist')
-    raise SystemExit('Aborting')
-
-logger.info('Preprocessing CSV')
-
-df = pd.read_csv(WORDLIST_CLEANED_CSV_PATH)
+from utils.logger import logger, run_step
+from utils.row_cache import apply_incrementally
+from utils.rules import load_rule_sets
+from utils.shards import map_shards, row_shards, worker_count
+from utils.wordlist import write_preprocessed_wordlist
 
 # Catch strings such as '1. ' or '2. ' or '13. '.
 example_number_pattern = re.compile(r'(\d+)\.\s\w+')
 
 
-def split_example(example: str) -> list[str]:
-    """Split example string into a list of examples if many are found."""
-    is_only_one_example = not example.startswith('1. ')
-    if is_only_one_example:
-        return [example]
-
-    # Else we have multiple examples.
+def find_delimiters(numbers: tuple[str, ...]) -> tuple[str, ...]:
+    """Find actual delimiters among the numbers found in the examples.
 
-    # Find actual delimiters by ensuring each one is bigger than
-    # the previous delimiter by 1.
-    # For example [1, 2, 3, 200, 4, 5] -> [1, 2, 3, 4, 5]
-    matches: list[str] = re.findall(example_number_pattern, example)
-    actual_numeric_delimiters = []
+    Ensure each one is bigger than the previous delimiter by 1.
+    For example [1, 2, 3, 200, 4, 5] -> [1, 2, 3, 4, 5]
+    """
+    delimiters = []
     last_num = 0
-    for str_num in matches:
-        int_num = int(str_num)
-        if int_num == last_num + 1:
-            actual_numeric_delimiters.append(f'{str_num}. ')
+    for str_num in numbers:
+        if int(str_num) == last_num + 1:
+            delimiters.append(f'{str_num}. ')
             last_num += 1
-
-    # To split with multiple delimiters, we have to create a regex pattern.
-    pattern = '|'.join(map(re.escape, actual_numeric_delimiters))
-    pattern = re.compile(pattern)
-    examples = pattern.split(example)
-    examples = [example.strip() for example in examples if example.strip()]
-
-    return examples
-
-
-df['examples'] = df['examples'].apply(split_example)
-
-verb_pattern = re.compile(r'^([^,]+),([^,]+),([^,]+), (hat|ist).+')
-der_die_pattern = re.compile(r'^(der\s[\wÄÖÜäöü]+),.*\s(die\s[\wÄÖÜäöü]+), .+')
-normal_word_pattern = re.compile(r'((der|die|das)\s[\wÄÖÜäöü\-]+)')
-
-
-def determine_audio_text(word: str) -> str:
-    """Determine which part of the words has to be converted to an audio file."""
-    if match := verb_pattern.match(word):
-        return (
-            match.group(1)
-            .strip()
-            .replace('(sich etwas)', 'sich etwas')
-            .replace('(sich)', 'sich')
+    return tuple(delimiters)
+
+
+def split_examples(examples: pd.Series) -> pd.Series:
+    """Split every example string into a list of examples if many are found.
+
+    Strings with the same numbers share a single compiled pattern.
+    """
+    patterns: dict[tuple[str, ...], re.Pattern] = {}
+    result = []
+    for example in examples.tolist():
+        if not example.startswith('1. '):
+            result.append([example])
+            continue
+
+        numbers = tuple(example_number_pattern.findall(example))
+        if numbers not in patterns:
+            # To split with multiple delimiters, we have to create a regex
+            # pattern.
+            patterns[numbers] = re.compile(
+                '|'.join(map(re.escape, find_delimiters(numbers)))
+            )
+        parts = map(str.strip, patterns[numbers].split(example))
+        result.append([part for part in parts if part])
+    return pd.Series(result, index=examples.index)
+
+
+# Which part of the words has to be converted to an audio file, and the
+# word that needs to be translated.
+rule_sets = load_rule_sets(PREPROCESSING_RULES_PATH)
+audio_text_rules = rule_sets['word_audio']
+word_search_rules = rule_sets['word_search']
+
+
+def preprocess_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Split examples and determine the audio and search text of rows."""
+    df = df.copy()
+    df['examples'] = split_examples(df['examples'])
+    df['word_audio'] = audio_text_rules.apply_all(df['word'])
+    df['word_search'] = word_search_rules.apply_all(df['word_audio'])
+    return df
+
+
+def preprocess_shard(
+    df: pd.DataFrame,
+) -> tuple[pd.DataFrame, dict[str, tuple[Counter, Counter]]]:
+    """Preprocess a shard of rows, counting the hits of the rules on it."""
+    for rules in rule_sets.values():
+        rules.reset_stats()
+    df = preprocess_rows(df)
+    return df, {
+        name: (rules.hits.copy(), rules.seconds.copy())
+        for name, rules in rule_sets.items()
+    }
+
+
+def preprocess_in_shards(df: pd.DataFrame) -> pd.DataFrame:
+    """Preprocess the rows in shards and log the statistics of the rules."""
+    results = map_shards(preprocess_shard, row_shards(df, worker_count()))
+
+    for name, rules in rule_sets.items():
+        rules.reset_stats()
+        for _, stats in results:
+            rules.add_stats(*stats[name])
+        rules.log_stats()
+
+    return pd.concat([shard_df for shard_df, _ in results])
+
+
+def read_input() -> pd.DataFrame:
+    """Read the cleaned CSV wordlist."""
+    if not os.path.exists(WORDLIST_CLEANED_CSV_PATH):
+        logger.error(
+            'Cleaned wordlist CSV file not found. '
+            'Did you run "04_clean_csv.py"?'
         )
+        logger.error(f'{WORDLIST_CLEANED_CSV_PATH} does not exist')
+        raise SystemExit('Aborting')
 
-    if match := der_die_pattern.match(word):
-        return f'{match.group(1).strip()}, {match.group(2).strip()}'
-
-    if match := normal_word_pattern.match(word):
-        return match.group(1).strip()
+    return pd.read_csv(WORDLIST_CLEANED_CSV_PATH)
 
-    if '(Pl.)' in word:
-        return word.split('(Pl.)')[0].strip()
 
-    if '(D' in word:
-        return word.split('(D')[0].strip()
+def run(df: pd.DataFrame) -> pd.DataFrame:
+    """Split examples and determine the audio and search text of words."""
+    logger.info('Preprocessing CSV')
 
-    if '(A' in word:
-        return word.split('(A')[0].strip()
-
-    if '(CH' in word:
-        return word.split('(CH')[0].strip()
-
-    if '/' in word:
-        return word.split('/')[0].strip()
-
-    if word.startswith('-'):
-        return word.lstrip('-')
-
-    return word
-
-
-df['word_audio'] = df['word'].apply(determine_audio_text)
-
-just_word_pattern = re.compile(r'(der|die|das)\s([\wÄÖÜäöü\-]+)')
-
-
-def determine_word_search(word: str) -> str:
-    """Extract the word that needs to be translated."""
-    if match := just_word_pattern.match(word):
-        return match.group(2).strip()
-
-    if word.startswith('sich etwas'):
-        return word.split('sich etwas')[1].strip()
+    df = apply_incrementally(
+        '05_preprocess_csv',
+        df,
+        preprocess_in_shards,
+        columns=['word', 'examples', 'word_audio', 'word_search'],
+    )
 
-    if word.startswith('sich'):
-        return word.split('sich')[1].strip()
+    logger.info('Successfully preprocessed CSV')
+    return df
 
-    if word.startswith('jdn.'):
-        return word.split('jdn.')[1].strip()
 
-    if ',' in word:
-        return word.split(',')[0].strip()
+def write_output(df: pd.DataFrame) -> None:
+    """Save the preprocessed wordlist."""
+    write_preprocessed_wordlist(df)
+    logger.info(
+        'Saved preprocessed JSONL wordlist at '
+        f'{WORDLIST_PREPROCESSED_JSONL_PATH}'
+    )
+    logger.info(
+        f'Exported preprocessed CSV wordlist to {WORDLIST_PREPROCESSED_CSV_PATH}'
+    )
 
-    return word
 
+def main() -> None:
+    """Preprocess the cleaned CSV wordlist file."""
+    run_step('05_preprocess_csv', read_input, run, write_output)
 
-df['word_search'] = df['word_audio'].apply(determine_word_search)
 
-df.to_csv(WORDLIST_PREPROCESSED_CSV_PATH, index=False)
-logger.info('Successfully preprocessed CSV')
-logger.info(
-    f'Saved preprocessed CSV wordlist at {WORDLIST_PREPROCESSED_CSV_PATH}'
-)
+if __name__ == '__main__':
+    main()
@@ -1,63 +1,178 @@
-"""Create audio files for DE word and DE examples."""
+"""Create audio files for DE word and DE examples.
+
+Audio is kept in a content-addressed store, so every distinct utterance
+is synthesized once. The synthesis is spread over a pool of processes,
+configured through environment variables:
+    AUDIO_WORKERS             Number of worker processes
+    AUDIO_THREADS_PER_WORKER  CPU threads (and pinned cores) per worker
+    AUDIO_BATCH_SIZE          Utterances sent to a worker at once
+"""
 
-import ast
-import io
 import os
-from contextlib import redirect_stdout
+import wave
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import torch
-from rich.progress import track
-from TTS.api import TTS
+from utils.audio_store import (
+    audio_hash,
+    audio_store_path,
+    save_audio_manifest,
+)
 from utils.constants import (
     AUDIO_RECORDINGS_DIR_PATH,
-    WORDLIST_PREPROCESSED_CSV_PATH,
+    AUDIO_STORE_DIR_PATH,
+    JOB_QUEUE_PATH,
+    TTS_MODEL_NAME,
 )
-from utils.logger import logger
+from utils.job_queue import DONE, FAILED, JobQueue
+from utils.logger import logger, run_step
+from utils.wordlist import WordlistRow, iter_rows, read_preprocessed_rows
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def read_input() -> list[WordlistRow]:
+    """Read the preprocessed wordlist, without loading pandas."""
+    return read_preprocessed_rows()
+
+
+def is_complete_wav(path: str) -> bool:
+    """Check whether a WAV file holds all the audio its header announces.
+
+    Files created before the job queue may have been cut short.
+    """
+    try:
+        with wave.open(path, 'rb') as file:
+            frames = file.getnframes()
+            frame_size = file.getsampwidth() * file.getnchannels()
+            return frames > 0 and (
+                len(file.readframes(frames)) == frames * frame_size
+            )
+    except (OSError, EOFError, wave.Error):
+        return False
+
+
+def run(wordlist: 'pd.DataFrame | list[WordlistRow]') -> None:
+    """Create the audio files for every word and its examples.
+
+    The distinct utterances are items of a job queue, so an interrupted
+    run resumes where it stopped.
+    """
+    logger.info('Creating audio')
+
+    os.makedirs(AUDIO_STORE_DIR_PATH, exist_ok=True)
+
+    queue = JobQueue(JOB_QUEUE_PATH, '06_create_audio')
+    states = queue.states()
+
+    manifest: dict[str, dict] = {}
+    # Distinct utterances that aren't in the store yet.
+    missing: dict[str, str] = {}
+    # Complete files created before the job queue.
+    verified: set[str] = set()
+    for row in iter_rows(wordlist):
+        word_hash = audio_hash(row.word_audio)
+        examples_hashes = [audio_hash(example) for example in row.examples]
+        manifest[row.word] = {'word': word_hash, 'examples': examples_hashes}
+
+        # Files from before the store was introduced.
+        path_to_audio_dir = os.path.join(AUDIO_RECORDINGS_DIR_PATH, row.word)
+        utterances = [
+            (row.word_audio, word_hash, 'word.wav'),
+            *(
+                (example, example_hash, f'example{idx + 1}.wav')
+                for idx, (example, example_hash) in enumerate(
+                    zip(row.examples, examples_hashes)
+                )
+            ),
+        ]
+        for text, hash_, legacy_file_name in utterances:
+            if hash_ in missing or hash_ in verified:
+                continue
 
-if not os.path.exists(WORDLIST_PREPROCESSED_CSV_PATH):
-    logger.error(
-        'Cleaned wordlist CSV file not found. Did you run "05_preprocess_csv.py"?'
+            store_path = audio_store_path(hash_)
+            if states.get(hash_) == DONE:
+                if os.path.exists(store_path):
+                    continue
+            elif hash_ not in states:
+                if is_complete_wav(store_path):
+                    verified.add(hash_)
+                    continue
+
+                legacy_path = os.path.join(path_to_audio_dir, legacy_file_name)
+                if is_complete_wav(legacy_path):
+                    os.replace(legacy_path, store_path)
+                    verified.add(hash_)
+                    continue
+
+            missing[hash_] = text
+
+    queue.retain(
+        {
+            hash_
+            for hashes in manifest.values()
+            for hash_ in [hashes['word'], *hashes['examples']]
+        }
     )
-    logger.error(f'{WORDLIST_PREPROCESSED_CSV_PATH} does not exist')
-    raise SystemExit('Aborting')
-
-logger.info('Creating audio')
-
-stdout_capture = io.StringIO()
-with redirect_stdout(stdout_capture):
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    tts = TTS(
-        model_name='tts_models/de/thorsten/tacotron2-DDC', progress_bar=False
-    ).to(device)
-
-df = pd.read_csv(WORDLIST_PREPROCESSED_CSV_PATH)
-
-for row in track(
-    df.itertuples(),
-    total=df.shape[0],
-    description='Creating audio...',
-    update_period=10,
-    auto_refresh=False,
-):
-    path_to_audio_dir = os.path.join(AUDIO_RECORDINGS_DIR_PATH, row.word)
-    if not os.path.exists(path_to_audio_dir):
-        os.makedirs(path_to_audio_dir)
-
-    path_to_word_audio_file = os.path.join(path_to_audio_dir, 'word.wav')
-    if not os.path.exists(path_to_word_audio_file):
-        tts.tts_to_file(text=row.word_audio, file_path=path_to_word_audio_file)
-
-    examples: list[str] = ast.literal_eval(row.examples)
-    for idx, example in enumerate(examples):
-        path_to_example_audio_file = os.path.join(
-            path_to_audio_dir, f'example{idx + 1}.wav'
+    queue.finish(list(verified))
+    if missing:
+        # numpy and the TTS model are only loaded when there's work.
+        from utils.synthesis import Job, synthesize
+
+        threads_per_worker = int(os.environ.get('AUDIO_THREADS_PER_WORKER', 1))
+        workers = int(
+            os.environ.get(
+                'AUDIO_WORKERS', max(1, os.cpu_count() // threads_per_worker)
+            )
         )
-        if not os.path.exists(path_to_example_audio_file):
-            with redirect_stdout(stdout_capture):
-                tts.tts_to_file(
-                    text=example, file_path=path_to_example_audio_file
-                )
+        batch_size = int(os.environ.get('AUDIO_BATCH_SIZE', 16))
+        logger.info(
+            f'Synthesizing {len(missing)} utterances with {workers} workers '
+            f'of {threads_per_worker} threads'
+        )
+        queue.add(list(missing))
+
+        def path_hash(path: str) -> str:
+            """Hash of the utterance of a file of the store."""
+            return os.path.splitext(os.path.basename(path))[0]
+
+        def synthesize_hashes(hashes: list[str]) -> None:
+            """Synthesize the utterances into the store."""
+            jobs: list[Job] = [
+                (missing[hash_], audio_store_path(hash_)) for hash_ in hashes
+            ]
+            synthesize(
+                jobs,
+                model_name=TTS_MODEL_NAME,
+                workers=workers,
+                threads_per_worker=threads_per_worker,
+                batch_size=batch_size,
+                on_written=lambda path: queue.finish([path_hash(path)]),
+                on_failed=lambda paths, error: queue.fail(
+                    [path_hash(path) for path in paths], error
+                ),
+            )
+
+        queue.drain(synthesize_hashes)
+    else:
+        logger.info('All audio files already exist')
+
+    failed_utterances = queue.counts()[FAILED]
+    queue.close()
+    if failed_utterances:
+        logger.error(f'Failed to synthesize {failed_utterances} utterances')
+        raise SystemExit('Aborting')
+
+    save_audio_manifest(manifest)
+
+    logger.info('Successfully created audio files')
+    logger.info(f'Saved audio files at {AUDIO_STORE_DIR_PATH}')
+
+
+def main() -> None:
+    """Create audio files for the preprocessed wordlist."""
+    run_step('06_create_audio', read_input, run)
+
 
-logger.info('Successfully created audio files')
-logger.info(f'Saved audio files at {AUDIO_RECORDINGS_DIR_PATH}')
+if __name__ == '__main__':
+    main()
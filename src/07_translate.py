@@ -1,165 +1,308 @@
-"""Translate from DE to BG using Selenium & DeepL."""
+"""Translate from DE to BG using DeepL.
+
+Translated segments are kept in a translation memory and reused across
+words and runs. The backend is chosen through environment variables:
+    TRANSLATION_BACKEND      'browser' (default, Selenium) or 'http'
+    TRANSLATION_API_URL      URL of the DeepL compatible HTTP API
+    DEEPL_AUTH_KEY           Key for the HTTP API
+    TRANSLATION_CONCURRENCY  Number of requests in flight (for the browser
+                             backend, the number of browser windows)
+    TRANSLATION_RATE_LIMIT   Maximum number of requests per second
+"""
 
-import ast
 import os
-import random
-from time import sleep
-
-import pandas as pd
-from rich.progress import track
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.wait import WebDriverWait
+from typing import TYPE_CHECKING
+
 from utils.constants import (
+    JOB_QUEUE_PATH,
+    TRANSLATION_API_URL,
+    TRANSLATION_MEMORY_PATH,
+    TRANSLATION_SOURCE_LANG,
+    TRANSLATION_TARGET_LANG,
     TRANSLATIONS_DIR_PATH,
-    WORDLIST_PREPROCESSED_CSV_PATH,
 )
-from utils.logger import logger
+from utils.job_queue import FAILED, JobQueue, atomic_open
+from utils.logger import logger, metrics, run_step
+from utils.translation.backend import TranslationBackend
+from utils.translation.engine import translate_entries
+from utils.translation.memory import TranslationMemory, segment_hash
+from utils.wordlist import WordlistRow, iter_rows, read_preprocessed_rows
 
-if not os.path.exists(WORDLIST_PREPROCESSED_CSV_PATH):
-    logger.error(
-        'Cleaned wordlist CSV file not found. Did you run "05_preprocess_csv.py"?'
-    )
-    logger.error(f'{WORDLIST_PREPROCESSED_CSV_PATH} does not exist')
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Default concurrency and requests per second of each backend.
+BACKEND_DEFAULTS = {
+    'browser': (1, 0.1),
+    'http': (4, 2.0),
+}
+
+
+def create_backend(name: str, concurrency: int) -> TranslationBackend:
+    """Create the translation backend with the given name."""
+    if name == 'http':
+        from utils.translation.http_backend import HttpBackend
+
+        return HttpBackend(
+            url=os.environ.get('TRANSLATION_API_URL', TRANSLATION_API_URL),
+            auth_key=os.environ.get('DEEPL_AUTH_KEY'),
+            source_lang=TRANSLATION_SOURCE_LANG,
+            target_lang=TRANSLATION_TARGET_LANG,
+        )
+
+    if name == 'browser':
+        # Selenium is only needed for this backend.
+        from utils.translation.browser_backend import BrowserBackend
+
+        return BrowserBackend(sessions=concurrency)
+
+    logger.error(f'Unknown translation backend "{name}"')
     raise SystemExit('Aborting')
 
-logger.info('Translating words and examples')
 
-df = pd.read_csv(WORDLIST_PREPROCESSED_CSV_PATH)
+def translation_path(word: str) -> str:
+    """Path of the saved translation of a word."""
+    return os.path.join(TRANSLATIONS_DIR_PATH, word, 'translation.txt')
+
+
+def format_translation(translations: list[str]) -> str:
+    """Format the translations of a word and its examples for saving."""
+    # The file should look like:
+    # Раздел
+    # ---
+    # Моля, прочетете втория раздел.
+    # ---
+    # Some other example, etc...
+    contents = f'{translations[0]}\n'
+    for translation in translations[1:]:
+        contents += f'---\n{translation}\n'
+    return contents
 
-driver = webdriver.Chrome()
-wait = WebDriverWait(driver, 10)
 
+def save_translation(word: str, translations: list[str]) -> None:
+    """Save the translation of a word and its examples."""
+    os.makedirs(os.path.dirname(translation_path(word)), exist_ok=True)
+    with atomic_open(translation_path(word), 'w', encoding='utf-8') as file:
+        file.write(format_translation(translations))
 
-def prepare_for_translation() -> None:
-    """Prepare DeepL for translation - set up source and target language."""
-    driver.get('https://www.deepl.com/translator')
-    sleep(3)
 
-    accept_cookies = wait.until(
-        ec.visibility_of_element_located(
-            (By.XPATH, '/html/body/div[1]/div[1]/div[1]/div/div[3]/button[2]')
-        )
+def read_translation(word: str) -> str | None:
+    """Read the saved translation of a word, None if there is none."""
+    try:
+        with open(translation_path(word), 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def parse_translation(contents: str) -> list[str]:
+    """Split the contents of a translation file into its translations.
+
+    Files of the original scraper hold the text of the web page, which
+    has no trailing newline.
+    """
+    return contents.rstrip('\n').split('\n---\n')
+
+
+def complete_translations(word: str, texts: list[str]) -> list[str] | None:
+    """Get the saved translations of a word, if there is one per text.
+
+    Translations saved before the job queue may have been cut short.
+    """
+    contents = read_translation(word)
+    if contents is None:
+        return None
+
+    translations = parse_translation(contents)
+    return translations if len(translations) == len(texts) else None
+
+
+def read_input() -> list[WordlistRow]:
+    """Read the preprocessed wordlist, without loading pandas."""
+    return read_preprocessed_rows()
+
+
+def run(wordlist: 'pd.DataFrame | list[WordlistRow]') -> None:
+    """Translate every word and its examples that isn't translated yet.
+
+    Segments - the word to search for and each example - already in the
+    translation memory are reused, only the others are sent to the
+    backend, once each. The words are items of a job queue, so an
+    interrupted run resumes where it stopped.
+    """
+    logger.info('Translating words and examples')
+
+    queue = JobQueue(JOB_QUEUE_PATH, '07_translate')
+    states = queue.states()
+    memory = TranslationMemory(
+        TRANSLATION_MEMORY_PATH,
+        TRANSLATION_SOURCE_LANG,
+        TRANSLATION_TARGET_LANG,
     )
-    accept_cookies.click()
 
-    extension_suggestion_close = wait.until(
-        ec.visibility_of_element_located(
-            (
-                By.XPATH,
-                '/html/body/div[1]/div[1]/div[2]/div/div[1]/div/main/div[3]/div/div/div[2]/button',
-            )
+    # The word to search for first, followed by all examples.
+    word_texts: dict[str, list[str]] = {}
+    for row in iter_rows(wordlist):
+        word_texts.setdefault(row.word, [row.word_search, *row.examples])
+    queue.retain(set(word_texts))
+
+    known = memory.lookup(
+        list(
+            {
+                segment_hash(text)
+                for texts in word_texts.values()
+                for text in texts
+            }
         )
     )
-    extension_suggestion_close.click()
 
-    translate_from_button = driver.find_element(
-        By.XPATH,
-        '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div/div[2]/div/div/div[1]/section/div/div[1]/div/div[1]/div/div[1]/span/span/span/button/span/div/div/span/span',
-    )
-    translate_from_button.click()
+    # Words still to translate, with their texts.
+    entries: dict[str, list[str]] = {}
+    # Words whose saved translations match their current texts.
+    finished: list[str] = []
+    rebuilt = 0
+    for word, texts in word_texts.items():
+        hashes = [segment_hash(text) for text in texts]
+        if all(text_hash in known for text_hash in hashes):
+            # The saved file may be of texts since edited, e.g. reordered.
+            translations = [known[text_hash] for text_hash in hashes]
+            saved = read_translation(word)
+            if saved is None or parse_translation(saved) != translations:
+                save_translation(word, translations)
+                rebuilt += 1
+            finished.append(word)
+            continue
 
-    translate_from_input = wait.until(
-        ec.visibility_of_element_located(
-            (
-                By.XPATH,
-                '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div/div[2]/div/div/div[1]/section/div/div[1]/div/div[1]/div/div[1]/div/div/div[1]/div/input',
-            )
+        saved = None if word in states else complete_translations(word, texts)
+        if saved is not None:
+            # Saved before the translation memory, which learns it now.
+            for text, translation in zip(texts, saved):
+                memory.store(text, translation)
+            finished.append(word)
+            continue
+
+        entries[word] = texts
+
+    queue.finish(finished)
+    if rebuilt:
+        logger.info(
+            f'Rebuilt the translations of {rebuilt} edited words '
+            'from the translation memory'
         )
+    metrics.count('rebuilt_translations', rebuilt)
+    if not entries:
+        memory.close()
+        queue.close()
+        logger.info('All words are already translated')
+        return
+    queue.add(list(entries))
+
+    # Only needed when there's something to translate.
+    from rich.progress import Progress
+
+    backend_name = os.environ.get('TRANSLATION_BACKEND', 'browser')
+    default_concurrency, default_rate = BACKEND_DEFAULTS.get(
+        backend_name, (1, 1.0)
     )
-    translate_from_input.click()
-    sleep(2)
-    translate_from_input.send_keys('German')
-    sleep(2)
-    translate_from_input.send_keys(Keys.RETURN)
-    sleep(2)
-
-    translate_to_button = driver.find_element(
-        By.XPATH,
-        '//*[@id="headlessui-popover-button-34"]/span/div/div/span/span',
+    concurrency = int(
+        os.environ.get('TRANSLATION_CONCURRENCY', default_concurrency)
     )
-    translate_to_button.click()
+    rate = float(os.environ.get('TRANSLATION_RATE_LIMIT', default_rate))
+    # Created once a segment isn't in the translation memory.
+    backend: TranslationBackend | None = None
 
-    translate_to_input = wait.until(
-        ec.visibility_of_element_located(
-            (
-                By.XPATH,
-                '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div/div[2]/div/div/div[1]/section/div/div[1]/div/div[3]/div[1]/div[1]/div/div/div[1]/div/input',
-            )
+    def translate_words(words: list[str]) -> None:
+        """Save the translations of the words, translating new segments."""
+        nonlocal backend
+
+        # Unique segments and the words waiting for each of them.
+        segments: dict[str, str] = {}
+        waiting_words: dict[str, list[str]] = {}
+        entry_hashes: dict[str, list[str]] = {}
+        for word in words:
+            entry_hashes[word] = [segment_hash(text) for text in entries[word]]
+            for text, text_hash in zip(entries[word], entry_hashes[word]):
+                segments.setdefault(text_hash, text)
+                waiting_words.setdefault(text_hash, []).append(word)
+
+        known = memory.lookup(list(segments))
+        missing = {
+            text_hash: [text]
+            for text_hash, text in segments.items()
+            if text_hash not in known
+        }
+        logger.info(
+            f'Reusing {len(known)} of {len(segments)} segments '
+            'from the translation memory'
         )
-    )
-    translate_to_input.click()
-    sleep(2)
-    translate_to_input.send_keys('Bulgarian')
-    sleep(2)
-    translate_to_input.send_keys(Keys.RETURN)
-    sleep(2)
-
-
-def get_translation(to_translate: str) -> str:
-    """Get translation for a piece of text."""
-    input_textbox = driver.find_element(
-        By.XPATH,
-        '//*[@id="textareasContainer"]/div[1]/section/div/div[1]/d-textarea',
-    )
-    input_textbox.click()
-    sleep(1)
-    input_textbox.send_keys(to_translate)
-    sleep(5)
-    output_textbox = driver.find_element(
-        By.XPATH,
-        '/html/body/div[1]/div[1]/div[2]/div/div[1]/div/main/div[2]/nav/div/div[2]/div/div/div[1]/section/div/div[2]/div[3]/section/div[1]/d-textarea/div',
-    )
-    translation = output_textbox.text
+        metrics.count('translation_memory_hits', len(known))
+        metrics.count('translation_memory_misses', len(missing))
 
-    input_textbox.send_keys(Keys.CONTROL + 'a')
-    input_textbox.send_keys(Keys.DELETE)
+        def save_if_complete(word: str) -> None:
+            if all(text_hash in known for text_hash in entry_hashes[word]):
+                save_translation(
+                    word, [known[text_hash] for text_hash in entry_hashes[word]]
+                )
+                queue.finish([word])
+                progress.advance(task)
 
-    return translation
+        # Words whose segments are all known are saved right away.
+        for word in words:
+            save_if_complete(word)
 
+        if not missing:
+            return
 
-is_prepared_for_translation = False
+        if backend is None:
+            backend = create_backend(backend_name, concurrency)
 
-for row in track(
-    df.itertuples(),
-    total=df.shape[0],
-    description='Scraping...',
-    update_period=12,
-    auto_refresh=False,
-):
-    path_to_translation_dir = os.path.join(TRANSLATIONS_DIR_PATH, row.word)
-    if not os.path.exists(path_to_translation_dir):
-        os.mkdir(path_to_translation_dir)
+        def on_translated(text_hash: str, translations: list[str]) -> None:
+            memory.store(segments[text_hash], translations[0])
+            known[text_hash] = translations[0]
+            for word in waiting_words[text_hash]:
+                save_if_complete(word)
 
-    path_to_translation_txt = os.path.join(
-        path_to_translation_dir, 'translation.txt'
-    )
-    if os.path.exists(path_to_translation_txt):
-        continue
+        failed = set(
+            translate_entries(
+                missing,
+                backend,
+                concurrency=concurrency,
+                requests_per_second=rate,
+                on_translated=on_translated,
+            )
+        )
+        queue.fail(
+            [
+                word
+                for word in words
+                if any(text_hash in failed for text_hash in entry_hashes[word])
+            ],
+            'Failed to translate a segment',
+        )
 
-    if not is_prepared_for_translation:
-        prepare_for_translation()
-        is_prepared_for_translation = True
+    try:
+        with Progress() as progress:
+            task = progress.add_task('Translating...', total=len(entries))
+            queue.drain(translate_words)
+    finally:
+        if backend is not None:
+            backend.close()
+        memory.close()
 
-    text_to_translate = f'{row.word_search}\n'
-    examples: list[str] = ast.literal_eval(row.examples)
-    for idx, example in enumerate(examples):
-        text_to_translate += f'---\n{example}\n'
+    failed_words = queue.counts()[FAILED]
+    queue.close()
+    if failed_words:
+        logger.error(f'Failed to translate {failed_words} words')
+        raise SystemExit('Aborting')
+
+    logger.info('Successfully translated words and examples')
+    logger.info(f'Saved translation files at {TRANSLATIONS_DIR_PATH}')
 
-    # Text_to_translate string should look like:
-    # Abschnitt
-    # ---
-    # Lesen Sie bitte den zweiten Abschnitt.
-    # ---
-    # Some other example, etc...
 
-    result = get_translation(text_to_translate)
-    with open(path_to_translation_txt, 'w', encoding='utf-8') as file:
-        file.write(result)
+def main() -> None:
+    """Translate the preprocessed wordlist."""
+    run_step('07_translate', read_input, run)
 
-    sleep(random.randint(8, 12))
 
-logger.info('Successfully scraped translations')
-logger.info(f'Saved translation files at {TRANSLATIONS_DIR_PATH}')
+if __name__ == '__main__':
+    main()
@@ -3,116 +3,153 @@
 Prepare JSON file for deck generation.
 """
 
-import ast
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
-from utils.constants import (
-    DECK_DATA_JSON_PATH,
-    TRANSLATIONS_DIR_PATH,
-    WORDLIST_PREPROCESSED_CSV_PATH,
-)
-from utils.logger import logger
-
-if not os.path.exists(WORDLIST_PREPROCESSED_CSV_PATH):
-    logger.error(
-        'Preprocessed wordlist CSV file not found. Did you run "05_preprocess_csv.py"?'
-    )
-    logger.error(f'{WORDLIST_PREPROCESSED_CSV_PATH} does not exist')
-    raise SystemExit('Aborting')
-
-logger.info('Postprocessing CSV')
-
-df = pd.read_csv(WORDLIST_PREPROCESSED_CSV_PATH)
 
-# Assert that all translations are in place.
-for row in df.itertuples():
-    if not os.path.exists(
-        os.path.join(TRANSLATIONS_DIR_PATH, row.word, 'translation.txt')
-    ):
-        logger.error(f'Translation TXT file for word {row.word} does not exist')
-        logger.error('Try running "07_translate.py"')
-        raise SystemExit('Aborting')
+from utils.constants import DECK_DATA_JSONL_PATH, TRANSLATIONS_DIR_PATH
+from utils.deck_data import load_index, read_objects, write_deck_data
+from utils.logger import logger, metrics, run_step
+from utils.row_cache import load_rows, row_key, store_rows
+from utils.wordlist import read_preprocessed_wordlist
 
 
-def extract_word_translation(word: str) -> str:
-    """Extract word translation from saved DeepL response."""
+def read_translation(word: str) -> str | None:
+    """Read the saved DeepL response for a word, None if it's missing."""
     path_to_translation_txt = os.path.join(
         TRANSLATIONS_DIR_PATH,
         word,
         'translation.txt',
     )
 
-    with open(path_to_translation_txt, 'r', encoding='utf-8') as file:
-        contents = file.read()
-
-    split_contents = contents.split('---')
-    # First item is a word
-    word_translation = split_contents[0].strip()
-    return str([word_translation])
-
-
-df['word_translation'] = df['word'].apply(extract_word_translation)
-
-
-def extract_examples_translations(word: str) -> str:
-    """Extract examples translations from saved DeepL response."""
-    path_to_translation_txt = os.path.join(
-        TRANSLATIONS_DIR_PATH,
-        word,
-        'translation.txt',
+    try:
+        with open(path_to_translation_txt, 'r', encoding='utf-8') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def read_translations(words: list[str]) -> dict[str, str | None]:
+    """Read the saved DeepL responses of the words on a pool of threads.
+
+    Every file is opened once. POSTPROCESS_READ_THREADS sets the number
+    of threads, which mostly wait on the file system.
+    """
+    threads = os.environ.get('POSTPROCESS_READ_THREADS')
+    with ThreadPoolExecutor(
+        max_workers=int(threads) if threads else None
+    ) as pool:
+        return dict(zip(words, pool.map(read_translation, words)))
+
+
+def parse_translation(contents: str) -> tuple[str, list[str]]:
+    """Split a saved DeepL response into the word and examples translations."""
+    # First item is a word, everything else is examples.
+    word_translation = contents.split('---')[0].strip()
+    examples_translations = [
+        example.strip() for example in contents.split('---\n')[1:]
+    ]
+    return word_translation, examples_translations
+
+
+def read_input() -> pd.DataFrame:
+    """Read the preprocessed wordlist."""
+    return read_preprocessed_wordlist()
+
+
+def run(df: pd.DataFrame) -> list[dict]:
+    """Combine words, examples and translations into deck data."""
+    logger.info('Postprocessing CSV')
+
+    translations = read_translations(list(dict.fromkeys(df['word'])))
+    metrics.count('translation_files', len(translations))
+
+    # Assert that all translations are in place.
+    for word, contents in translations.items():
+        if contents is None:
+            logger.error(f'Translation TXT file for word {word} does not exist')
+            logger.error('Try running "07_translate.py"')
+            raise SystemExit('Aborting')
+
+    # Get the objects that have been manually verified, looking up only
+    # those in the deck data.
+    index = load_index()
+    manually_verified_words = {
+        entry.word_de for entry in index if entry.manually_verified
+    }
+    # The last object of a word wins.
+    word_to_entry = {entry.word_de: entry for entry in index}
+    verified_entries = [word_to_entry[word] for word in manually_verified_words]
+    word_to_object = {
+        obj['word_de']: obj for obj in read_objects(verified_entries)
+    }
+
+    # Objects of words that haven't changed since the last run are reused.
+    keys = {}
+    for row in df.itertuples():
+        if row.word not in manually_verified_words:
+            keys[row.Index] = row_key(
+                row.word, row.examples, translations[row.word]
+            )
+    cached_objects = load_rows('08_postprocess_csv', list(keys.values()))
+    # Identical rows share a key, so count the rows, not the keys.
+    misses = sum(key not in cached_objects for key in keys.values())
+    logger.info(
+        f'Reusing {len(keys) - misses} cached objects, '
+        f'building {misses} objects'
     )
+    metrics.count('row_cache_hits', len(keys) - misses)
+    metrics.count('row_cache_misses', misses)
+
+    # Prepare JSON data.
+    data = []
+    new_objects = {}
+    for row in df.itertuples():
+        # If word has already been manually verified, don't touch it.
+        if row.word in manually_verified_words:
+            data.append(word_to_object[row.word])
+            continue
+
+        key = keys[row.Index]
+        if key in cached_objects:
+            data.append(cached_objects[key])
+            continue
+
+        word_bg, examples_bg = parse_translation(translations[row.word])
+        obj = {
+            'manually_verified': False,
+            'word_de': row.word,
+            'word_bg': [word_bg],
+            'examples': [
+                {'example_de': de, 'example_bg': bg}
+                for de, bg in zip(row.examples, examples_bg)
+            ],
+        }
+        new_objects[key] = obj
+        data.append(obj)
 
-    with open(path_to_translation_txt, 'r', encoding='utf-8') as file:
-        contents = file.read()
-
-    split_contents = contents.split('---\n')
-    translated_examples = []
-    # First item is word, everything else is examples
-    for example in split_contents[1:]:
-        translated_examples.append(example.strip())
-
-    return str(translated_examples)
-
+    store_rows('08_postprocess_csv', new_objects)
 
-df['examples_translations'] = df['word'].apply(extract_examples_translations)
+    logger.info('Successfully postprocessed CSV')
+    return data
 
-# Get list of objects that have been manually verified.
-manually_verified_words = set()
-word_to_object = dict()
-if os.path.exists(DECK_DATA_JSON_PATH):
-    with open(DECK_DATA_JSON_PATH, 'r', encoding='utf-8') as file:
-        objects = json.load(file)
 
-    for obj in objects:
-        word_to_object[obj['word_de']] = obj
-        if obj['manually_verified']:
-            manually_verified_words.add(obj['word_de'])
+def write_output(data: list[dict]) -> None:
+    """Save the deck data, rewriting only the objects that changed."""
+    written = write_deck_data(data)
+    metrics.count('written_objects', written)
 
-# Prepare JSON file.
-data = []
-for row in df.itertuples():
-    # If word has already been manually verified, don't touch it.
-    if row.word in manually_verified_words:
-        data.append(word_to_object[row.word])
-        continue
+    logger.info(
+        f'Saved deck data at {DECK_DATA_JSONL_PATH}, '
+        f'wrote {written} of {len(data)} objects'
+    )
 
-    examples_de = ast.literal_eval(row.examples)
-    examples_bg = ast.literal_eval(row.examples_translations)
-    examples_list = []
-    for de, bg in zip(examples_de, examples_bg):
-        examples_list.append({'example_de': de, 'example_bg': bg})
 
-    data.append(
-        {
-            'manually_verified': False,
-            'word_de': row.word,
-            'word_bg': ast.literal_eval(row.word_translation),
-            'examples': examples_list,
-        }
-    )
+def main() -> None:
+    """Postprocess the preprocessed wordlist and its translations."""
+    run_step('08_postprocess_csv', read_input, run, write_output)
 
 
-with open(DECK_DATA_JSON_PATH, 'w', encoding='utf-8') as file:
-    json.dump(data, file, ensure_ascii=False, indent=4)
+if __name__ == '__main__':
+    main()
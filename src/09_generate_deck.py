@@ -1,132 +1,120 @@
-"""Generate the anki deck from the post-processed list."""
+"""Generate the anki deck package from the post-processed deck data."""
 
-import ast
 import os
-import re
-import sys
 
-import pandas as pd
 from rich.progress import track
-from utils.constants import ANKI_DECK_TXT_PATH, POSTPROCESSED_WORDLIST_CSV_PATH
-from utils.logger import logger
-
-if not os.path.exists(POSTPROCESSED_WORDLIST_CSV_PATH):
-    logger.error(f'{POSTPROCESSED_WORDLIST_CSV_PATH} not found')
-    sys.exit()
-
-logger.info('Generating deck')
-
-df = pd.read_csv(POSTPROCESSED_WORDLIST_CSV_PATH)
-
-escaped_double_quote = '\\"'
-separator = '|'
-headers = f"""\
-#separator:{separator}
-#html:true\n\n"""
-
-# Use a list for contents and do ''.join(contents) later.
-# This is for performance reasons. String concatenation gets slow here.
-contents = [headers]
-
-
-def build_gender_square(gender: str) -> str:
-    """Create HTML for a small 16x16 square with a color representing the gender of a word."""
-    gender_to_color_mapping = {
-        'der': '#4D94FF',  # Blue
-        'die': '#FF66B2',  # Pink
-        'das': '#808080',  # Gray
-        'pl': '#66FF99',  # Green
-    }
-    color = gender_to_color_mapping[gender]
-    result = f"""\
-<span
-    style='
-         display: inline-block;
-         width: 16px;
-         height: 16px;
-         margin-right: 5px;
-         background-color: {color};'>
-</span>
-"""
-    result = result.replace('\n', '')
-    result = re.sub(r'\s+', ' ', result)
-    return result
-
-
-def build_front_side(word: str, word_hash: str) -> str:
-    """Build the front side of a card."""
-    gender_square = ''
-    gendered_word_pattern = re.compile(r'(der|die|das)\s[\wÄÖÜäöü\-]+')
-    if match := gendered_word_pattern.match(word):
-        gender_square = build_gender_square(gender=match.group(1))
-
-    word = word.replace('(CH', '(🇨🇭')
-    word = word.replace('(D', '(🇩🇪')
-    word = word.replace('(A', '(🇦🇹')
-
-    result = f"""\
-"<div
-    style='font-size: 16px;'>
-    {gender_square}{word} [sound:{word_hash}.wav]
-</div>\""""
-    result = result.replace('\n', '')
-    result = re.sub(r'\s+', ' ', result)
-    return result
-
-
-def build_back_side(
-    examples: list[str], word_translation: str, example_translation: list[str]
-) -> str:
-    """Build the back side of a card."""
-    word_translation = '<br>'.join(ast.literal_eval(word_translation))
-    back_side = [
-        '"',
-        f"""\
-<div
-    style='font-size: 16px;'>
-    {word_translation}
-</div>   
-""",
-        '<br>',
-    ]
-    for idx in range(len(examples)):
-        back_side.append(f"""\
-<div
-    style='font-size: 16px;'>
-    🇩🇪 {examples[idx].replace('"', escaped_double_quote)}
-    <br>
-    🇧🇬 {example_translation[idx].replace('"', escaped_double_quote)}
-</div>
-<br>
-""")
-    back_side.append('"')
-    result = ''.join(back_side)
-    result = result.replace('\n', '')
-    result = re.sub(r'\s+', ' ', result)
-    return result
-
-
-for _, row in track(
-    df.iterrows(),
-    total=df.shape[0],
-    description='Generating deck...',
-    update_period=10,
-    auto_refresh=False,
-):
-    contents.append(
-        build_front_side(word=row['word'], word_hash=row['word_hash'])
+
+from utils.apkg import ApkgWriter, Note, Template
+from utils.audio_store import audio_store_path, load_audio_manifest
+from utils.cards import (
+    CARD_TYPES,
+    FIELD_NAMES,
+    render_back,
+    render_cloze,
+    render_front,
+    render_translation,
+)
+from utils.constants import (
+    ANKI_DECK_APKG_PATH,
+    ANKI_DECK_NAME,
+    ANKI_MODEL_NAME,
+)
+from utils.deck_data import iter_deck_data
+from utils.logger import logger, run_step
+from utils.media import audio_format, package_audio
+
+# Card types of the deck, see CARD_TYPES in utils/cards.py.
+DEFAULT_CARD_TYPES = 'de_bg'
+
+
+def selected_templates() -> list[Template]:
+    """Get the templates of the card types set by DECK_CARD_TYPES."""
+    names = os.environ.get('DECK_CARD_TYPES', DEFAULT_CARD_TYPES).split(',')
+    unknown = set(names) - set(CARD_TYPES)
+    if unknown:
+        logger.error(f'Unknown card types: {", ".join(sorted(unknown))}')
+        logger.error(f'Choose from: {", ".join(CARD_TYPES)}')
+        raise SystemExit('Aborting')
+
+    return [template for name, template in CARD_TYPES.items() if name in names]
+
+
+def read_input() -> list[dict]:
+    """Read the deck data."""
+    return list(iter_deck_data())
+
+
+def run(data: list[dict]) -> list[Note]:
+    """Build a note, with the files of its audio, for every word."""
+    logger.info('Generating deck')
+
+    # Audio files are named by the hash of their contents.
+    audio_manifest = load_audio_manifest()
+    word_audio = {}
+    for obj in data:
+        word_hash = audio_manifest.get(obj['word_de'], {}).get('word')
+        if word_hash and os.path.exists(audio_store_path(word_hash)):
+            word_audio[obj['word_de']] = audio_store_path(word_hash)
+    packaged_audio = package_audio(
+        sorted(set(word_audio.values())), audio_format()
     )
-    contents.append(separator)
-    contents.append(
-        build_back_side(
-            examples=ast.literal_eval(row['example']),
-            word_translation=row['word_translation'],
-            example_translation=ast.literal_eval(row['example_translation']),
+
+    notes = []
+    # Some words appear more than once, with different examples.
+    occurrences: dict[str, int] = {}
+    for obj in track(
+        data,
+        total=len(data),
+        description='Generating deck...',
+    ):
+        audio_path = packaged_audio.get(word_audio.get(obj['word_de']))
+
+        occurrence = occurrences.get(obj['word_de'], 0) + 1
+        occurrences[obj['word_de']] = occurrence
+        key = obj['word_de']
+        if occurrence > 1:
+            key = f'{key}#{occurrence}'
+
+        examples = [(e['example_de'], e['example_bg']) for e in obj['examples']]
+        notes.append(
+            Note(
+                key=key,
+                fields=[
+                    render_front(
+                        word=obj['word_de'],
+                        sound_file=audio_path and os.path.basename(audio_path),
+                    ),
+                    render_back(obj['word_bg'], examples),
+                    render_translation(obj['word_bg']),
+                    render_cloze(obj['word_de'], examples),
+                ],
+                media=[audio_path] if audio_path else [],
+            )
         )
-    )
-    contents.append('\n\n\n')
 
-with open(ANKI_DECK_TXT_PATH, 'w') as file:
-    file.write(''.join(contents))
+    return notes
+
+
+def write_output(notes: list[Note]) -> None:
+    """Save the anki deck package."""
+    with ApkgWriter(
+        ANKI_DECK_APKG_PATH,
+        deck_name=ANKI_DECK_NAME,
+        model_name=ANKI_MODEL_NAME,
+        field_names=FIELD_NAMES,
+        templates=list(CARD_TYPES.values()),
+        card_templates=selected_templates(),
+    ) as writer:
+        for note in notes:
+            writer.add(note)
+
+    logger.info(f'Saved anki deck at {ANKI_DECK_APKG_PATH}')
+
+
+def main() -> None:
+    """Generate the anki deck from the deck data JSON."""
+    run_step('09_generate_deck', read_input, run, write_output)
+
 
-logger.info(f'Saved anki deck at {ANKI_DECK_TXT_PATH}')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""Benchmark the steps of the pipeline on scaled copies of the wordlist.
+
+Every step runs in a process of its own, in a scratch data directory
+seeded with its inputs - the checkpoints in data/ repeated 1, 10 or 100
+times, so the rows are realistic. The translation and audio backends
+aren't used: every word gets a placeholder translation file and no
+audio. The wall time, peak RSS and rows per second of every step are
+saved to benchmark/results.json and compared with the baseline saved by
+--save-baseline, failing if a step got slower than the tolerance allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from pipeline import STAGES, Stage
+from utils.constants import (
+    AUDIO_MANIFEST_PATH,
+    BENCHMARK_BASELINE_PATH,
+    BENCHMARK_DIR_PATH,
+    BENCHMARK_RESULTS_PATH,
+    DATA_DIR_PATH,
+    DECK_DATA_JSONL_PATH,
+    PAGE_BREAK,
+    SRC_DIR_PATH,
+    TRANSLATIONS_DIR_PATH,
+    WORDLIST_CLEANED_CSV_PATH,
+    WORDLIST_CLEANED_TXT_PATH,
+    WORDLIST_CSV_PATH,
+    WORDLIST_PREPROCESSED_JSONL_PATH,
+    WORDLIST_PREPROCESSED_TXT_PATH,
+    WORDLIST_TXT_PATH,
+)
+from utils.logger import logger
+
+DEFAULT_STAGES = '01,02,03,04,05,08,09'
+# Steps that only wait for their backends. Their outputs are stubbed.
+BACKEND_STAGES = ['06_create_audio', '07_translate']
+DEFAULT_SCALES = '1,10,100'
+# Slowdown relative to the baseline that counts as a regression.
+DEFAULT_TOLERANCE = 0.25
+# Smaller differences in wall time are noise.
+MIN_REGRESSION_SECONDS = 0.2
+
+# Creates the scaled copy of an input - source path, target path, scale.
+Scaler = Callable[[str, str, int], None]
+
+
+def repeat_file(separator: str = '') -> Scaler:
+    """Make a scaler repeating a file, the copies joined by separator."""
+
+    def scale_file(source_path: str, target_path: str, scale: int) -> None:
+        with open(source_path, 'rb') as file:
+            contents = file.read()
+        with open(target_path, 'wb') as file:
+            file.write(separator.encode('utf-8').join([contents] * scale))
+
+    return scale_file
+
+
+def repeat_csv(source_path: str, target_path: str, scale: int) -> None:
+    """Repeat the rows of a CSV file, keeping a single header."""
+    with open(source_path, 'rb') as file:
+        header = file.readline()
+        rows = file.read()
+    with open(target_path, 'wb') as file:
+        file.write(header + rows * scale)
+
+
+def stub_translations(source_path: str, target_path: str, _: int) -> None:
+    """Save a placeholder translation of every word and its examples.
+
+    The copies of a word share its translation, so the files don't
+    depend on the scale.
+    """
+    with open(WORDLIST_PREPROCESSED_JSONL_PATH, 'r', encoding='utf-8') as file:
+        records = [json.loads(line) for line in file]
+
+    for record in records:
+        # Same layout as the files of 07_translate.py.
+        contents = f'BG {record["word"]}\n'
+        for example in record['examples']:
+            contents += f'---\nBG {example}\n'
+
+        path = os.path.join(target_path, record['word'])
+        os.makedirs(path, exist_ok=True)
+        with open(
+            os.path.join(path, 'translation.txt'), 'w', encoding='utf-8'
+        ) as file:
+            file.write(contents)
+
+
+def no_audio(source_path: str, target_path: str, _: int) -> None:
+    """Leave out the audio, as if none had been synthesized."""
+
+
+# How every input of the benchmarked steps is created.
+SCALERS: dict[str, Scaler] = {
+    WORDLIST_TXT_PATH: repeat_file(),
+    # A page break starts the first page of the next copy.
+    WORDLIST_CLEANED_TXT_PATH: repeat_file(f'\n{PAGE_BREAK}'),
+    WORDLIST_PREPROCESSED_TXT_PATH: repeat_file('\n\n'),
+    WORDLIST_CSV_PATH: repeat_csv,
+    WORDLIST_CLEANED_CSV_PATH: repeat_csv,
+    WORDLIST_PREPROCESSED_JSONL_PATH: repeat_file(),
+    TRANSLATIONS_DIR_PATH: stub_translations,
+    DECK_DATA_JSONL_PATH: repeat_file(),
+    AUDIO_MANIFEST_PATH: no_audio,
+}
+
+
+def select_benchmarked_stages(numbers: list[str]) -> list[Stage]:
+    """Select the steps by their numbers, e.g. ['01', '05']."""
+    stages = [
+        stage
+        for stage in STAGES
+        if any(stage.name.startswith(number) for number in numbers)
+    ]
+    unknown = [
+        number
+        for number in numbers
+        if not any(stage.name.startswith(number) for stage in STAGES)
+    ]
+    if unknown:
+        logger.error(f'Unknown steps: {", ".join(unknown)}')
+        raise SystemExit('Aborting')
+
+    for stage in stages:
+        if stage.name in BACKEND_STAGES:
+            logger.error(f'Step {stage.name} cannot be benchmarked')
+            logger.error('It only calls its translation or TTS backend')
+            raise SystemExit('Aborting')
+        for path in stage.inputs:
+            if path not in SCALERS:
+                logger.error(f'Step {stage.name} cannot be benchmarked')
+                logger.error(f'No way to create its input {path}')
+                raise SystemExit('Aborting')
+    return stages
+
+
+def count_rows() -> int:
+    """Count the words of the wordlist at scale 1."""
+    with open(WORDLIST_PREPROCESSED_JSONL_PATH, 'rb') as file:
+        return sum(1 for line in file if line.strip())
+
+
+def scratch_path(path: str, data_dir: str) -> str:
+    """Path of a file of data/ in the scratch data directory."""
+    return os.path.join(data_dir, os.path.relpath(path, DATA_DIR_PATH))
+
+
+def run_stage(stage: Stage, data_dir: str) -> tuple[float, int]:
+    """Run a step in a process of its own, in the scratch directory.
+
+    Returns the wall time in seconds and the peak RSS in bytes of the
+    biggest process - the step, or one of its workers.
+    """
+    log_path = os.path.join(data_dir, f'{stage.name}.log')
+    env = {
+        **os.environ,
+        'DATA_DIR': data_dir,
+        # No audio is synthesized, so there is nothing to transcode.
+        'DECK_AUDIO_FORMAT': 'wav',
+    }
+    with open(log_path, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(SRC_DIR_PATH, f'{stage.name}.py')],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    # Let the process object know the process is gone.
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        with open(log_path, 'r', encoding='utf-8') as log:
+            output = log.read().splitlines()
+        logger.error(f'{stage.name} failed with:')
+        for line in output[-20:]:
+            logger.error(line)
+        raise SystemExit('Aborting')
+
+    # Kilobytes on Linux, bytes on macOS.
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return seconds, peak_rss
+
+
+def benchmark_scale(stages: list[Stage], scale: int, rows: int) -> dict:
+    """Benchmark the steps on the wordlist repeated scale times."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as data_dir:
+        for stage in stages:
+            for path in stage.inputs:
+                target_path = scratch_path(path, data_dir)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                if os.path.isdir(target_path):
+                    shutil.rmtree(target_path)
+                SCALERS[path](path, target_path, scale)
+
+            seconds, peak_rss = run_stage(stage, data_dir)
+            results[stage.name] = {
+                'rows': rows * scale,
+                'seconds': round(seconds, 3),
+                'peak_rss_mb': round(peak_rss / 2**20, 1),
+                'rows_per_second': round(rows * scale / seconds),
+            }
+            logger.info(
+                f'{stage.name:>20} {scale:>4}x: {seconds:8.2f} s, '
+                f'{peak_rss / 2**20:7.1f} MB, '
+                f'{rows * scale / seconds:>10,.0f} rows/s'
+            )
+    return results
+
+
+def find_regressions(
+    results: dict, baseline: dict, tolerance: float
+) -> list[str]:
+    """Compare the results with the baseline, describing the regressions.
+
+    Only the steps and scales measured in both are compared.
+    """
+    regressions = []
+    for scale, stages in results['scales'].items():
+        for name, result in stages.items():
+            base = baseline['scales'].get(scale, {}).get(name)
+            if base is None:
+                continue
+
+            change = result['seconds'] / base['seconds'] - 1
+            logger.info(
+                f'{name:>20} {scale:>4}x: {base["seconds"]:8.2f} s -> '
+                f'{result["seconds"]:8.2f} s ({change:+.0%}), '
+                f'{base["peak_rss_mb"]:7.1f} MB -> '
+                f'{result["peak_rss_mb"]:7.1f} MB'
+            )
+            if (
+                change > tolerance
+                and result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS
+            ):
+                regressions.append(
+                    f'{name} at {scale}x is {change:.0%} slower '
+                    f'({base["seconds"]:.2f} s -> {result["seconds"]:.2f} s)'
+                )
+    return regressions
+
+
+def save_json(path: str, data: dict) -> None:
+    """Save the benchmark results."""
+    os.makedirs(BENCHMARK_DIR_PATH, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=4)
+        file.write('\n')
+
+
+def main() -> None:
+    """Parse the command line arguments and run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--steps',
+        default=DEFAULT_STAGES,
+        help=f'Comma-separated numbers of the steps, by default '
+        f'{DEFAULT_STAGES}',
+    )
+    parser.add_argument(
+        '--scales',
+        default=DEFAULT_SCALES,
+        help=f'Comma-separated sizes of the wordlist, by default '
+        f'{DEFAULT_SCALES}',
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='Slowdown relative to the baseline that fails the benchmark, '
+        f'by default {DEFAULT_TOLERANCE}',
+    )
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='Save the results as the baseline, instead of comparing',
+    )
+    args = parser.parse_args()
+
+    stages = select_benchmarked_stages(args.steps.split(','))
+    scales = [int(scale) for scale in args.scales.split(',')]
+    rows = count_rows()
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'scales': {},
+    }
+    for scale in scales:
+        logger.info(f'Benchmarking {rows * scale} rows ({scale}x)')
+        results['scales'][str(scale)] = benchmark_scale(stages, scale, rows)
+
+    save_json(BENCHMARK_RESULTS_PATH, results)
+    logger.info(f'Saved benchmark results at {BENCHMARK_RESULTS_PATH}')
+
+    if args.save_baseline:
+        save_json(BENCHMARK_BASELINE_PATH, results)
+        logger.info(f'Saved benchmark baseline at {BENCHMARK_BASELINE_PATH}')
+        return
+
+    if not os.path.exists(BENCHMARK_BASELINE_PATH):
+        logger.info(
+            'No baseline to compare with, save one with --save-baseline'
+        )
+        return
+
+    with open(BENCHMARK_BASELINE_PATH, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        for regression in regressions:
+            logger.error(regression)
+        raise SystemExit('Aborting')
+
+    logger.info('No step got slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""Run the whole pipeline in a single process.
+
+Every step is imported as a module and its output is handed in-memory
+to the next step. The intermediate files in data/ are only checkpoints
+- they are written after each step, unless disabled, and are read only
+when the pipeline is started from the middle.
+
+Steps whose code, constants, input files and settings in the environment
+haven't changed since their last successful run are skipped, similar to
+make but based on content hashes instead of modification times.
+
+A step whose run() returns an iterator streams its output - the next step
+consumes it while it's produced, and the checkpoint is written alongside
+by a background thread.
+"""
+
+import argparse
+import importlib
+import os
+import queue
+import threading
+from collections.abc import Callable, Generator, Iterable, Iterator
+from dataclasses import dataclass, field
+from types import ModuleType
+from typing import Any
+
+from utils.build_cache import load_manifest, save_manifest, stage_fingerprint
+from utils.constants import (
+    ANKI_DECK_APKG_PATH,
+    AUDIO_MANIFEST_PATH,
+    AUDIO_STORE_DIR_PATH,
+    DECK_DATA_JSONL_PATH,
+    TRANSLATIONS_DIR_PATH,
+    WORDLIST_CLEANED_CSV_PATH,
+    WORDLIST_CLEANED_TXT_PATH,
+    WORDLIST_CSV_PATH,
+    WORDLIST_PREPROCESSED_CSV_PATH,
+    WORDLIST_PREPROCESSED_JSONL_PATH,
+    WORDLIST_PREPROCESSED_TXT_PATH,
+    WORDLIST_TXT_PATH,
+)
+from utils.logger import count_rows, instrument, logger, metrics
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A single step of the pipeline."""
+
+    # Name of the script, without the extension.
+    name: str
+    # Step whose output is consumed. If None, the input is read from disk.
+    upstream: str | None
+    # Files and directories the step reads.
+    inputs: list[str]
+    # Files and directories the step writes.
+    outputs: list[str]
+    # Environment variables that change what the step writes.
+    env: list[str] = field(default_factory=list)
+
+
+STAGES: list[Stage] = [
+    Stage(
+        '01_clean_txt',
+        None,
+        [WORDLIST_TXT_PATH],
+        [WORDLIST_CLEANED_TXT_PATH],
+    ),
+    Stage(
+        '02_preprocess_txt',
+        '01_clean_txt',
+        [WORDLIST_CLEANED_TXT_PATH],
+        [WORDLIST_PREPROCESSED_TXT_PATH],
+    ),
+    Stage(
+        '03_parse_txt',
+        '02_preprocess_txt',
+        [WORDLIST_PREPROCESSED_TXT_PATH],
+        [WORDLIST_CSV_PATH],
+    ),
+    Stage(
+        '04_clean_csv',
+        '03_parse_txt',
+        [WORDLIST_CSV_PATH],
+        [WORDLIST_CLEANED_CSV_PATH],
+    ),
+    Stage(
+        '05_preprocess_csv',
+        '04_clean_csv',
+        [WORDLIST_CLEANED_CSV_PATH],
+        [WORDLIST_PREPROCESSED_JSONL_PATH, WORDLIST_PREPROCESSED_CSV_PATH],
+    ),
+    Stage(
+        '07_translate',
+        '05_preprocess_csv',
+        [WORDLIST_PREPROCESSED_JSONL_PATH],
+        [TRANSLATIONS_DIR_PATH],
+    ),
+    Stage(
+        '06_create_audio',
+        '05_preprocess_csv',
+        [WORDLIST_PREPROCESSED_JSONL_PATH],
+        [AUDIO_STORE_DIR_PATH, AUDIO_MANIFEST_PATH],
+    ),
+    Stage(
+        '08_postprocess_csv',
+        '05_preprocess_csv',
+        [WORDLIST_PREPROCESSED_JSONL_PATH, TRANSLATIONS_DIR_PATH],
+        [DECK_DATA_JSONL_PATH],
+    ),
+    Stage(
+        '09_generate_deck',
+        '08_postprocess_csv',
+        [DECK_DATA_JSONL_PATH, AUDIO_MANIFEST_PATH],
+        [ANKI_DECK_APKG_PATH],
+        ['DECK_CARD_TYPES', 'DECK_AUDIO_FORMAT'],
+    ),
+]
+
+
+def select_stages(first: str, last: str) -> list[Stage]:
+    """Select the steps between the ones starting with first and last."""
+    names = [stage.name for stage in STAGES]
+    try:
+        start = next(i for i, n in enumerate(names) if n.startswith(first))
+        end = next(i for i, n in enumerate(names) if n.startswith(last))
+    except StopIteration:
+        logger.error(f'Unknown step range {first}..{last}')
+        raise SystemExit('Aborting')
+
+    return STAGES[start : end + 1]
+
+
+# Ends the items of a checkpoint whose stream wasn't consumed to the end.
+STREAM_ABORTED = object()
+
+
+class StreamAbortedError(Exception):
+    """The step consuming a stream failed before its end."""
+
+
+def stream_to_checkpoint(
+    items: Iterator, write_output: Callable[[Iterable], None]
+) -> Iterator:
+    """Pass the items on, while write_output() saves them in a thread.
+
+    The items are handed over through a bounded queue, so the checkpoint
+    never holds more than a few of them in memory.
+    """
+    pending: queue.Queue = queue.Queue(maxsize=1024)
+
+    def queued_items() -> Iterator:
+        while (item := pending.get()) is not None:
+            if item is STREAM_ABORTED:
+                raise StreamAbortedError
+            yield item
+
+    def write_checkpoint() -> None:
+        try:
+            write_output(queued_items())
+        except StreamAbortedError:
+            logger.info('Discarded the partial checkpoint of a failed step')
+
+    writer = threading.Thread(target=write_checkpoint)
+    writer.start()
+    is_complete = False
+    try:
+        for item in items:
+            pending.put(item)
+            yield item
+        is_complete = True
+    finally:
+        # write_output() writes to a temporary file, which is only renamed
+        # into place when the items end without an error.
+        pending.put(None if is_complete else STREAM_ABORTED)
+        writer.join()
+
+
+def run_pipeline(
+    first: str = '01',
+    last: str = '09',
+    checkpoints: bool = True,
+    force: bool = False,
+) -> None:
+    """Run the selected steps, passing outputs in-memory between them.
+
+    The build cache is only used when checkpoints are written, as the
+    fingerprints are computed from the files on disk.
+    """
+    stages = select_stages(first, last)
+    use_cache = checkpoints and not force
+    manifest = load_manifest() if checkpoints else {}
+    outputs: dict[str, Any] = {}
+
+    # Streamed outputs whose checkpoints are still being written, with
+    # their steps and fingerprints, if already known.
+    streams: dict[str, tuple[Iterator, Stage, str | None]] = {}
+
+    def finish_streams() -> None:
+        """Consume what's left of the streams and record their steps."""
+        for name, (stream, stage, fingerprint) in streams.items():
+            for _ in stream:
+                pass
+            if checkpoints:
+                manifest[name] = fingerprint or stage_fingerprint(
+                    stage.name, stage.inputs, stage.env
+                )
+                save_manifest(manifest)
+        streams.clear()
+
+    try:
+        for idx, stage in enumerate(stages):
+            # The input of a step consuming a stream is still being written,
+            # so its fingerprint is only known once it has run.
+            is_streamed = stage.upstream in streams
+
+            fingerprint = None
+            if checkpoints and not is_streamed:
+                fingerprint = stage_fingerprint(
+                    stage.name, stage.inputs, stage.env
+                )
+
+            is_up_to_date = manifest.get(stage.name) == fingerprint and all(
+                os.path.exists(path) for path in stage.outputs
+            )
+            if use_cache and not is_streamed and is_up_to_date:
+                logger.info(f'Skipping {stage.name}, it is up to date')
+                continue
+
+            with instrument(stage.name):
+                with metrics.phase('import'):
+                    module: ModuleType = importlib.import_module(stage.name)
+
+                if stage.upstream in outputs:
+                    data = outputs[stage.upstream]
+                else:
+                    with metrics.phase('read'):
+                        data = module.read_input()
+                with metrics.phase('transform'):
+                    output = module.run(data)
+                count_rows(output, data)
+
+                is_last_stage = idx == len(stages) - 1
+                writes_output = hasattr(module, 'write_output') and (
+                    checkpoints or is_last_stage
+                )
+                # The work of a streaming step is done, and counted, by the
+                # step consuming its output.
+                if isinstance(output, Iterator) and not is_last_stage:
+                    if writes_output:
+                        output = stream_to_checkpoint(
+                            output, module.write_output
+                        )
+                    streams[stage.name] = (output, stage, fingerprint)
+                    outputs[stage.name] = output
+                    continue
+
+                outputs[stage.name] = output
+                if writes_output:
+                    with metrics.phase('write'):
+                        module.write_output(output)
+
+                # The streams consumed by this step are complete now.
+                finish_streams()
+                if checkpoints:
+                    manifest[stage.name] = fingerprint or stage_fingerprint(
+                        stage.name, stage.inputs, stage.env
+                    )
+                    save_manifest(manifest)
+
+    except BaseException:
+        # Stop writing the checkpoints of streams that won't be finished.
+        for stream, _, _ in streams.values():
+            if isinstance(stream, Generator):
+                stream.close()
+        raise
+
+    finish_streams()
+
+
+def main() -> None:
+    """Parse the command line arguments and run the pipeline."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--from',
+        dest='first',
+        default='01',
+        help='Number of the first step to run, e.g. 03',
+    )
+    parser.add_argument(
+        '--to',
+        dest='last',
+        default='09',
+        help='Number of the last step to run, e.g. 05',
+    )
+    parser.add_argument(
+        '--no-checkpoints',
+        dest='checkpoints',
+        action='store_false',
+        help='Do not write intermediate files to data/ and skip no step',
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Run the steps even if they are up to date',
+    )
+    args = parser.parse_args()
+
+    run_pipeline(
+        first=args.first,
+        last=args.last,
+        checkpoints=args.checkpoints,
+        force=args.force,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+"""Writer of Anki deck packages (.apkg).
+
+A package is a zip archive holding the collection - an SQLite database
+with the notes, cards, note type and deck - the media files, named by
+their position, and a JSON map from those positions to the real file
+names. Notes and cards get ids derived from a stable key, so importing
+a newer package updates the existing cards instead of duplicating them.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass, field
+from types import TracebackType
+
+# Schema of the collection, version 11, understood by all Anki versions.
+SCHEMA = """
+CREATE TABLE col (
+    id integer primary key,
+    crt integer not null,
+    mod integer not null,
+    scm integer not null,
+    ver integer not null,
+    dty integer not null,
+    usn integer not null,
+    ls integer not null,
+    conf text not null,
+    models text not null,
+    decks text not null,
+    dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key,
+    guid text not null,
+    mid integer not null,
+    mod integer not null,
+    usn integer not null,
+    tags text not null,
+    flds text not null,
+    sfld integer not null,
+    csum integer not null,
+    flags integer not null,
+    data text not null
+);
+CREATE TABLE cards (
+    id integer primary key,
+    nid integer not null,
+    did integer not null,
+    ord integer not null,
+    mod integer not null,
+    usn integer not null,
+    type integer not null,
+    queue integer not null,
+    due integer not null,
+    ivl integer not null,
+    factor integer not null,
+    reps integer not null,
+    lapses integer not null,
+    left integer not null,
+    odue integer not null,
+    odid integer not null,
+    flags integer not null,
+    data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key,
+    cid integer not null,
+    usn integer not null,
+    ease integer not null,
+    ivl integer not null,
+    lastIvl integer not null,
+    factor integer not null,
+    time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (
+    usn integer not null,
+    oid integer not null,
+    type integer not null
+);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+# Options group of the deck, Anki's defaults.
+DECK_CONFIG = {
+    'id': 1,
+    'name': 'Default',
+    'mod': 0,
+    'usn': 0,
+    'dyn': False,
+    'maxTaken': 60,
+    'timer': 0,
+    'autoplay': True,
+    'replayq': True,
+    'new': {
+        'bury': True,
+        'delays': [1, 10],
+        'initialFactor': 2500,
+        'ints': [1, 4, 7],
+        'order': 1,
+        'perDay': 20,
+        'separate': True,
+    },
+    'rev': {
+        'bury': True,
+        'ease4': 1.3,
+        'fuzz': 0.05,
+        'ivlFct': 1,
+        'maxIvl': 36500,
+        'minSpace': 1,
+        'perDay': 100,
+    },
+    'lapse': {
+        'delays': [10],
+        'leechAction': 0,
+        'leechFails': 8,
+        'minInt': 1,
+        'mult': 0,
+    },
+}
+
+CARD_CSS = """\
+.card {
+    font-family: arial;
+    font-size: 20px;
+    text-align: center;
+    color: black;
+    background-color: white;
+}
+"""
+
+# Separates the fields of a note in the collection.
+FIELD_SEPARATOR = '\x1f'
+
+html_tag_pattern = re.compile(r'<[^>]*>')
+# References to fields in templates, e.g. '{{Front}}' or '{{text:Front}}'.
+field_reference_pattern = re.compile(r'{{(?:[^}:]*:)?([^}]+)}}')
+
+
+@dataclass(frozen=True)
+class Template:
+    """A card type of the note type - the sides shown for every note."""
+
+    name: str
+    front: str
+    back: str
+
+
+@dataclass
+class Note:
+    """A note and the media files it refers to."""
+
+    # Identifies the note across builds, e.g. the DE word.
+    key: str
+    fields: list[str]
+    # Paths of the media files, referred to by their file name.
+    media: list[str] = field(default_factory=list)
+
+
+def stable_id(*parts: str) -> int:
+    """Derive a positive id, that fits in a JSON number, from the parts."""
+    digest = hashlib.sha256('\x00'.join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 11
+
+
+def strip_html(text: str) -> str:
+    """Remove the HTML tags, as Anki does for sorting and duplicate checks."""
+    return html_tag_pattern.sub('', text).strip()
+
+
+def field_checksum(text: str) -> int:
+    """Checksum of the first field, used by Anki to find duplicates."""
+    return int(
+        hashlib.sha1(strip_html(text).encode('utf-8')).hexdigest()[:8], 16
+    )
+
+
+class ApkgWriter:
+    """Write notes straight into a package, one at a time.
+
+    The notes go into the collection as they are added. The media files
+    are streamed from where they are into the archive on close, without
+    being copied anywhere first. The package replaces the file at path
+    only once it's complete.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        deck_name: str,
+        model_name: str,
+        field_names: list[str],
+        templates: list[Template],
+        card_templates: list[Template] | None = None,
+        css: str = CARD_CSS,
+    ):
+        """Create an empty collection with the given deck and note type.
+
+        The notes only get cards of card_templates, by default of all
+        templates. The others are still part of the note type, so that
+        its id and the ids of the cards don't depend on the choice.
+        """
+        self.path = path
+        self.now = int(time.time())
+        self.deck_id = stable_id('deck', deck_name)
+        self.model_id = stable_id('model', model_name)
+        self.templates = templates
+        self.card_templates = set(
+            templates if card_templates is None else card_templates
+        )
+        # Fields on the front of every template, all of which must be
+        # filled in for a note to get a card of it.
+        self.required_fields = [
+            [
+                field_names.index(name)
+                for name in field_reference_pattern.findall(template.front)
+                if name in field_names
+            ]
+            for template in templates
+        ]
+        self.media: dict[str, str] = {}
+        self.position = 0
+
+        fd, self.collection_path = tempfile.mkstemp(suffix='.anki2')
+        os.close(fd)
+        self.connection = sqlite3.connect(self.collection_path)
+        self.connection.executescript(SCHEMA)
+        self.write_collection(deck_name, model_name, field_names, css)
+
+    def write_collection(
+        self, deck_name: str, model_name: str, field_names: list[str], css: str
+    ) -> None:
+        """Write the single row describing the deck and the note type."""
+        now_ms = self.now * 1000
+        model = {
+            'id': self.model_id,
+            'name': model_name,
+            'type': 0,
+            'mod': self.now,
+            'usn': -1,
+            'sortf': 0,
+            'did': self.deck_id,
+            'tmpls': [
+                {
+                    'name': template.name,
+                    'ord': ord_,
+                    'qfmt': template.front,
+                    'afmt': template.back,
+                    'did': None,
+                    'bqfmt': '',
+                    'bafmt': '',
+                }
+                for ord_, template in enumerate(self.templates)
+            ],
+            'flds': [
+                {
+                    'name': name,
+                    'ord': ord_,
+                    'sticky': False,
+                    'rtl': False,
+                    'font': 'Arial',
+                    'size': 20,
+                    'media': [],
+                }
+                for ord_, name in enumerate(field_names)
+            ],
+            'css': css,
+            'latexPre': '',
+            'latexPost': '',
+            'latexsvg': False,
+            'req': [
+                [ord_, 'all', required]
+                for ord_, required in enumerate(self.required_fields)
+            ],
+            'tags': [],
+            'vers': [],
+        }
+        deck_defaults = {
+            'collapsed': False,
+            'browserCollapsed': False,
+            'conf': 1,
+            'desc': '',
+            'dyn': 0,
+            'extendNew': 10,
+            'extendRev': 50,
+            'lrnToday': [0, 0],
+            'newToday': [0, 0],
+            'revToday': [0, 0],
+            'timeToday': [0, 0],
+            'mod': self.now,
+            'usn': -1,
+        }
+        decks = {
+            '1': {**deck_defaults, 'id': 1, 'name': 'Default'},
+            str(self.deck_id): {
+                **deck_defaults,
+                'id': self.deck_id,
+                'name': deck_name,
+            },
+        }
+        conf = {
+            'activeDecks': [self.deck_id],
+            'curDeck': self.deck_id,
+            'curModel': str(self.model_id),
+            'addToCur': True,
+            'collapseTime': 1200,
+            'dueCounts': True,
+            'estTimes': True,
+            'newBury': True,
+            'newSpread': 0,
+            'nextPos': 1,
+            'sortBackwards': False,
+            'sortType': 'noteFld',
+            'timeLim': 0,
+        }
+        self.connection.execute(
+            'INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, ?)',
+            (
+                self.now,
+                now_ms,
+                now_ms,
+                json.dumps(conf),
+                json.dumps({str(self.model_id): model}),
+                json.dumps(decks),
+                json.dumps({'1': DECK_CONFIG}),
+                json.dumps({}),
+            ),
+        )
+
+    def add(self, note: Note) -> None:
+        """Add the note with a card for each template it fills in."""
+        note_id = stable_id('note', note.key)
+        self.connection.execute(
+            'INSERT INTO notes VALUES (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, ?)',
+            (
+                note_id,
+                # Anki matches the notes of a package to existing ones by
+                # their guid.
+                str(note_id),
+                self.model_id,
+                self.now,
+                '',
+                FIELD_SEPARATOR.join(note.fields),
+                strip_html(note.fields[0]),
+                field_checksum(note.fields[0]),
+                '',
+            ),
+        )
+        self.connection.executemany(
+            'INSERT INTO cards VALUES '
+            '(?, ?, ?, ?, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, ?)',
+            (
+                (
+                    stable_id('card', note.key, template.name),
+                    note_id,
+                    self.deck_id,
+                    ord_,
+                    self.now,
+                    self.position,
+                    '',
+                )
+                for ord_, (template, required) in enumerate(
+                    zip(self.templates, self.required_fields)
+                )
+                if template in self.card_templates
+                and all(note.fields[idx] for idx in required)
+            ),
+        )
+        self.position += 1
+
+        for media_path in note.media:
+            self.media.setdefault(os.path.basename(media_path), media_path)
+
+    def close(self) -> None:
+        """Pack the collection and the media into the package."""
+        self.connection.commit()
+        self.connection.close()
+
+        tmp_path = f'{self.path}.tmp'
+        try:
+            with zipfile.ZipFile(
+                tmp_path, 'w', compression=zipfile.ZIP_DEFLATED
+            ) as archive:
+                archive.write(self.collection_path, 'collection.anki2')
+                media_map = {}
+                for idx, (name, media_path) in enumerate(self.media.items()):
+                    archive.write(media_path, str(idx))
+                    media_map[str(idx)] = name
+                archive.writestr('media', json.dumps(media_map))
+            os.replace(tmp_path, self.path)
+        finally:
+            os.remove(self.collection_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def __enter__(self) -> 'ApkgWriter':
+        """Use the writer as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Write the package when leaving the context, unless it failed."""
+        if exc_type is None:
+            self.close()
+            return
+
+        self.connection.close()
+        os.remove(self.collection_path)
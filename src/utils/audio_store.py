@@ -0,0 +1,52 @@
+"""Content-addressed store of the synthesized audio.
+
+Every audio file is named by a hash of the normalized text, the model
+and the synthesis settings, so an utterance shared by many words, or
+moved to another word or position, is synthesized only once. The
+manifest maps each word to the audio of the word and of its examples.
+"""
+
+import hashlib
+import json
+import os
+
+from utils.constants import (
+    AUDIO_MANIFEST_PATH,
+    AUDIO_STORE_DIR_PATH,
+    TTS_MODEL_NAME,
+    TTS_SETTINGS,
+)
+from utils.text import normalize
+
+
+def audio_hash(text: str) -> str:
+    """Hash the text together with everything that affects its audio."""
+    key = json.dumps(
+        [normalize(text), TTS_MODEL_NAME, TTS_SETTINGS],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def audio_store_path(hash_: str) -> str:
+    """Path of the audio file with the given hash."""
+    return os.path.join(AUDIO_STORE_DIR_PATH, f'{hash_}.wav')
+
+
+def load_audio_manifest() -> dict[str, dict]:
+    """Load the mapping of words to the hashes of their audio files.
+
+    Every word maps to {'word': hash, 'examples': [hash, ...]}.
+    """
+    if not os.path.exists(AUDIO_MANIFEST_PATH):
+        return {}
+
+    with open(AUDIO_MANIFEST_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_audio_manifest(manifest: dict[str, dict]) -> None:
+    """Save the mapping of words to the hashes of their audio files."""
+    with open(AUDIO_MANIFEST_PATH, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=4)
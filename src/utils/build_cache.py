@@ -0,0 +1,153 @@
+"""Content-hash fingerprints of the pipeline steps.
+
+A step is up to date when the hash of its code, the constants it uses,
+the contents of its input files and the settings it reads from the
+environment matches the fingerprint recorded in the build manifest
+after its last successful run.
+"""
+
+import ast
+import hashlib
+import json
+import os
+from functools import cache
+
+import utils.constants
+from utils.constants import BUILD_MANIFEST_PATH, ROOT_DIR_PATH, SRC_DIR_PATH
+
+
+def hash_path(path: str) -> str:
+    """Hash the contents of a file or of all files in a directory."""
+    sha = hashlib.sha256()
+    if os.path.isfile(path):
+        with open(path, 'rb') as file:
+            sha.update(file.read())
+    elif os.path.isdir(path):
+        for dir_path, dir_names, file_names in os.walk(path):
+            # Walk in a deterministic order.
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                sha.update(os.path.relpath(file_path, path).encode('utf-8'))
+                sha.update(hash_path(file_path).encode('utf-8'))
+    else:
+        sha.update(b'missing')
+
+    return sha.hexdigest()
+
+
+@cache
+def parse_source(source_path: str) -> tuple[list[str], set[str]]:
+    """Find the utils modules a source file imports and the constants.
+
+    Returns the paths of the modules and the names imported from
+    utils.constants. The code doesn't change while the pipeline runs, so
+    every file is parsed once, however many steps import it.
+    """
+    with open(source_path, 'r', encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+
+    dependency_paths = []
+    constants = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ImportFrom) or not node.module:
+            continue
+        if not node.module.startswith('utils.'):
+            continue
+
+        if node.module == 'utils.constants':
+            constants.update(alias.name for alias in node.names)
+
+        dependency_path = os.path.join(SRC_DIR_PATH, *node.module.split('.'))
+        dependency_paths.append(f'{dependency_path}.py')
+
+    return dependency_paths, constants
+
+
+@cache
+def hash_source(source_path: str) -> str:
+    """Hash a source file, once per process."""
+    return hash_path(source_path)
+
+
+def find_code_dependencies(
+    source_path: str, found: dict[str, set[str]] | None = None
+) -> dict[str, set[str]]:
+    """Find the source files a script depends on.
+
+    Returns a mapping of every source file - the script and the utils
+    modules it imports, recursively - to the names imported from
+    utils.constants.
+    """
+    found = {} if found is None else found
+    if source_path in found:
+        return found
+
+    dependency_paths, constants = parse_source(source_path)
+    found[source_path] = set(constants)
+    for dependency_path in dependency_paths:
+        find_code_dependencies(dependency_path, found)
+
+    return found
+
+
+def hash_constant(value: object) -> str:
+    """Represent a constant so that it's independent of the checkout path.
+
+    Files in the source directory, such as configuration, are part of the
+    code, so they are represented by their contents too.
+    """
+    if (
+        isinstance(value, str)
+        and value.startswith(SRC_DIR_PATH)
+        and os.path.isfile(value)
+    ):
+        return f'{os.path.relpath(value, ROOT_DIR_PATH)}@{hash_path(value)}'
+    if isinstance(value, str) and value.startswith(ROOT_DIR_PATH):
+        return os.path.relpath(value, ROOT_DIR_PATH)
+    return repr(value)
+
+
+def stage_fingerprint(
+    script_name: str, input_paths: list[str], env: list[str] | None = None
+) -> str:
+    """Compute the fingerprint of a step from its code and its inputs.
+
+    env names the environment variables that change the output of the
+    step, their values are part of the fingerprint.
+    """
+    sha = hashlib.sha256()
+
+    dependencies = find_code_dependencies(
+        os.path.join(SRC_DIR_PATH, f'{script_name}.py')
+    )
+    for source_path in sorted(dependencies):
+        sha.update(os.path.relpath(source_path, SRC_DIR_PATH).encode('utf-8'))
+        sha.update(hash_source(source_path).encode('utf-8'))
+        for name in sorted(dependencies[source_path]):
+            value = getattr(utils.constants, name)
+            sha.update(f'{name}={hash_constant(value)}'.encode('utf-8'))
+
+    for input_path in input_paths:
+        sha.update(hash_constant(input_path).encode('utf-8'))
+        sha.update(hash_path(input_path).encode('utf-8'))
+
+    for name in env or []:
+        sha.update(f'${name}={os.environ.get(name)!r}'.encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+def load_manifest() -> dict[str, str]:
+    """Load the fingerprints of the last successful run of every step."""
+    if not os.path.exists(BUILD_MANIFEST_PATH):
+        return {}
+
+    with open(BUILD_MANIFEST_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_manifest(manifest: dict[str, str]) -> None:
+    """Save the fingerprints of the steps."""
+    with open(BUILD_MANIFEST_PATH, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
@@ -0,0 +1,251 @@
+"""Rendering of the HTML fields of the notes.
+
+The templates are written over several lines to stay readable, and are
+minified once at import - newlines removed and runs of whitespace
+collapsed into a single space. Rendering joins the literal parts of a
+template with the values of its fields, minified the same way, so a
+note is rendered in a single pass, without running any regex over the
+whole card.
+
+The card types of the deck are in CARD_TYPES. A card is only added for
+the notes whose fields on its front aren't empty, e.g. a cloze card for
+the words found in one of their examples.
+"""
+
+import re
+from string import Formatter
+
+from utils.apkg import Template
+
+whitespace_pattern = re.compile(r'\s+')
+gendered_word_pattern = re.compile(r'(der|die|das)\s[\wÄÖÜäöü\-]+')
+# Parenthesized notes of a word, e.g. '(Pl.)' or '(sich)'.
+word_note_pattern = re.compile(r'\(.*?\)')
+article_pattern = re.compile(r'^(der|die|das)\s+')
+word_token_pattern = re.compile(r'\w+')
+
+# Hides the word in a cloze example.
+CLOZE_BLANK = '[...]'
+
+
+def minify(html: str) -> str:
+    """Remove newlines and collapse whitespace, as in a minified card."""
+    # Whitespace other than the space isn't printable, so most values
+    # are already minified.
+    if html.isprintable() and '  ' not in html:
+        return html
+    return whitespace_pattern.sub(' ', html.replace('\n', ''))
+
+
+class CardTemplate:
+    """An HTML template with named fields, minified once."""
+
+    def __init__(self, source: str):
+        """Split the minified source into literal parts and fields."""
+        self.parts = [
+            (literal, field)
+            for literal, field, _, _ in Formatter().parse(minify(source))
+        ]
+
+    def render(self, **values: str) -> str:
+        """Fill in the fields, collapsing whitespace where parts meet."""
+        filled = [
+            (literal, minify(values[field]) if field is not None else None)
+            for literal, field in self.parts
+        ]
+        # Only empty values and values starting or ending with a space
+        # can put two spaces next to each other.
+        if all(
+            value is None or (value and value[0] != ' ' and value[-1] != ' ')
+            for _, value in filled
+        ):
+            return ''.join(literal + (value or '') for literal, value in filled)
+
+        pieces: list[str] = []
+        for literal, value in filled:
+            append_collapsed(pieces, literal)
+            if value is not None:
+                append_collapsed(pieces, value)
+        return ''.join(pieces)
+
+
+def append_collapsed(pieces: list[str], text: str) -> None:
+    """Append minified text, dropping a space following another one."""
+    if pieces and text.startswith(' ') and pieces[-1].endswith(' '):
+        text = text[1:]
+    if text:
+        pieces.append(text)
+
+
+GENDER_COLORS = {
+    'der': '#4D94FF',  # Blue
+    'die': '#FF66B2',  # Pink
+    'das': '#808080',  # Gray
+    'pl': '#66FF99',  # Green
+}
+
+# Small 16x16 squares with a color representing the gender of a word.
+GENDER_SQUARES = {
+    gender: minify(f"""\
+<span
+    style='
+         display: inline-block;
+         width: 16px;
+         height: 16px;
+         margin-right: 5px;
+         background-color: {color};'>
+</span>
+""")
+    for gender, color in GENDER_COLORS.items()
+}
+
+WORD_TEMPLATE = CardTemplate("""\
+<div
+    style='font-size: 16px;'>
+    {gender_square}{word}{sound}
+</div>""")
+
+TRANSLATION_TEMPLATE = CardTemplate("""\
+<div
+    style='font-size: 16px;'>
+    {word_translation}
+</div>
+""")
+
+EXAMPLE_TEMPLATE = CardTemplate("""\
+<div
+    style='font-size: 16px;'>
+    🇩🇪 {example}
+    <br>
+    🇧🇬 {example_translation}
+</div>
+<br>
+""")
+
+# Fields of the notes, in order.
+FIELD_NAMES = ['Front', 'Back', 'Translation', 'Cloze']
+
+# Card types that can be part of the deck, by name.
+CARD_TYPES = {
+    'de_bg': Template(
+        name='DE -> BG',
+        front='{{Front}}',
+        back='{{FrontSide}}<hr id=answer>{{Back}}',
+    ),
+    'bg_de': Template(
+        name='BG -> DE',
+        front='{{Translation}}',
+        back='{{FrontSide}}<hr id=answer>{{Front}}',
+    ),
+    'cloze': Template(
+        name='Cloze',
+        front='{{Cloze}}',
+        back='{{FrontSide}}<hr id=answer>{{Front}}<br>{{Back}}',
+    ),
+}
+
+
+def render_front(word: str, sound_file: str | None) -> str:
+    """Render the DE word, with its gender and audio.
+
+    The audio of the word is left out if it hasn't been created.
+    """
+    gender_square = ''
+    if match := gendered_word_pattern.match(word):
+        gender_square = GENDER_SQUARES[match.group(1)]
+
+    word = word.replace('(CH', '(🇨🇭')
+    word = word.replace('(D', '(🇩🇪')
+    word = word.replace('(A', '(🇦🇹')
+
+    return WORD_TEMPLATE.render(
+        gender_square=gender_square,
+        word=word,
+        sound=f' [sound:{sound_file}]' if sound_file else '',
+    )
+
+
+def render_translation(word_translation: list[str]) -> str:
+    """Render the BG translations of the word."""
+    return TRANSLATION_TEMPLATE.render(
+        word_translation='<br>'.join(word_translation)
+    )
+
+
+def render_back(
+    word_translation: list[str],
+    examples: list[tuple[str, str]],
+) -> str:
+    """Render the translations, and the examples with theirs."""
+    return ''.join(
+        [
+            render_translation(word_translation),
+            ' <br>',
+            *(
+                EXAMPLE_TEMPLATE.render(
+                    example=example, example_translation=translation
+                )
+                for example, translation in examples
+            ),
+        ]
+    )
+
+
+def cloze_forms(word: str) -> list[list[str]]:
+    """Forms of the word to look for in the examples, e.g. the plural.
+
+    Every form is given as its lowercase words.
+    """
+    forms = []
+    for form in word_note_pattern.sub('', word).split(','):
+        form = article_pattern.sub('', form.strip())
+        # Forms such as '-n' or '¨-e' are endings, not words.
+        if form and form[0].isalpha():
+            forms.append(word_token_pattern.findall(form.casefold()))
+    return forms
+
+
+def hide_forms(example: str, forms: list[list[str]]) -> str | None:
+    """Hide the forms in the example, None if it contains none of them.
+
+    A form matches a run of whole words, ignoring case and punctuation.
+    """
+    tokens = list(word_token_pattern.finditer(example))
+    words = [token[0].casefold() for token in tokens]
+
+    pieces = []
+    end = 0
+    idx = 0
+    while idx < len(words):
+        for form in forms:
+            if words[idx : idx + len(form)] == form:
+                pieces.append(example[end : tokens[idx].start()])
+                pieces.append(CLOZE_BLANK)
+                end = tokens[idx + len(form) - 1].end()
+                idx += len(form)
+                break
+        else:
+            idx += 1
+
+    if not pieces:
+        return None
+    return ''.join([*pieces, example[end:]])
+
+
+def render_cloze(word: str, examples: list[tuple[str, str]]) -> str:
+    """Render the first example containing the word, with it hidden.
+
+    Returns an empty string, so no cloze card is added, if no example
+    contains any form of the word.
+    """
+    forms = cloze_forms(word)
+    if not forms:
+        return ''
+
+    for example, translation in examples:
+        hidden = hide_forms(example, forms)
+        if hidden is not None:
+            return EXAMPLE_TEMPLATE.render(
+                example=hidden, example_translation=translation
+            )
+    return ''
@@ -0,0 +1,74 @@
+"""Detection and splitting of the columns of fixed-width text pages.
+
+A page is turned into a matrix of characters, one row per line, padded
+with spaces. A column starts where two spaces are followed by a letter,
+and counting these starts for every character position gives the
+profile of the page. The gutter between two columns is the position with
+the most starts within the window where that gutter is expected.
+"""
+
+import numpy as np
+
+# First and last (exclusive) character position a gutter is searched in.
+Window = tuple[int, int]
+
+
+def char_matrix(lines: list[str], width: int) -> np.ndarray:
+    """Stack the lines into a matrix of code points, padded with spaces."""
+    padded = ''.join(line.ljust(width)[:width] for line in lines)
+    return np.frombuffer(padded.encode('utf-32-le'), dtype=np.uint32).reshape(
+        len(lines), width
+    )
+
+
+def column_starts(matrix: np.ndarray) -> np.ndarray:
+    """Mark the spaces preceded by a space and followed by a letter."""
+    codes, inverse = np.unique(matrix, return_inverse=True)
+    is_alpha = np.array([chr(code).isalpha() for code in codes])
+    is_alpha = is_alpha[inverse.reshape(matrix.shape)]
+    is_space = matrix == ord(' ')
+
+    starts = np.zeros(matrix.shape, dtype=bool)
+    starts[:, 1:-1] = is_space[:, :-2] & is_space[:, 1:-1] & is_alpha[:, 2:]
+    return starts
+
+
+def find_gutters(
+    lines: list[str], windows: list[Window], min_length: int = 0
+) -> list[int]:
+    """Find the gutter in each of the windows.
+
+    Only lines at least min_length characters long are considered. Ties
+    go to the position found first, reading the page line by line. A
+    window without any column start has no gutter.
+    """
+    long_lines = [line for line in lines if len(line) >= min_length]
+    if not long_lines:
+        return []
+
+    width = max(end for _, end in windows) + 1
+    starts = column_starts(char_matrix(long_lines, width))
+    profile = starts.sum(axis=0)
+    # Line of the first start at every position.
+    first_line = np.where(starts.any(axis=0), starts.argmax(axis=0), len(lines))
+
+    gutters = []
+    for start, end in windows:
+        window = profile[start:end]
+        if not window.any():
+            continue
+        candidates = np.flatnonzero(window == window.max()) + start
+        gutters.append(int(min(candidates, key=lambda i: (first_line[i], i))))
+    return gutters
+
+
+def split_columns(lines: list[str], gutters: list[int]) -> list[list[str]]:
+    """Split the lines at the gutters, dropping the gutter character.
+
+    Lines ending before a gutter get empty lines in the columns past it.
+    """
+    starts = [0, *(gutter + 1 for gutter in gutters)]
+    ends = [*gutters, None]
+    return [
+        [line[start:end] for line in lines] for start, end in zip(starts, ends)
+    ]
@@ -9,11 +9,33 @@ PAGE_BREAK = '\x0c'
 ROOT_DIR_PATH = os.path.abspath(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
 )
-DATA_DIR_PATH = os.path.join(ROOT_DIR_PATH, 'data')
+# DATA_DIR moves all inputs and outputs, e.g. to a scratch directory.
+DATA_DIR_PATH = os.path.abspath(
+    os.environ.get('DATA_DIR', os.path.join(ROOT_DIR_PATH, 'data'))
+)
+SRC_DIR_PATH = os.path.join(ROOT_DIR_PATH, 'src')
+
+# utils/logger.py, summaries of the metrics and profiles of the steps.
+METRICS_DIR_PATH = os.path.join(DATA_DIR_PATH, '.metrics')
+
+# pipeline.py
+BUILD_MANIFEST_PATH = os.path.join(DATA_DIR_PATH, '.build_manifest.json')
+
+# 04_clean_csv.py, 05_preprocess_csv.py and 08_postprocess_csv.py
+ROW_CACHE_PATH = os.path.join(DATA_DIR_PATH, '.row_cache.sqlite')
+
+# benchmark.py
+BENCHMARK_DIR_PATH = os.path.join(ROOT_DIR_PATH, 'benchmark')
+BENCHMARK_RESULTS_PATH = os.path.join(BENCHMARK_DIR_PATH, 'results.json')
+BENCHMARK_BASELINE_PATH = os.path.join(BENCHMARK_DIR_PATH, 'baseline.json')
 
 # 00_convert_pdf_to_text.py
 WORDLIST_PDF_PATH = os.path.join(DATA_DIR_PATH, '00_Wordlist.pdf')
 WORDLIST_TXT_PATH = os.path.join(DATA_DIR_PATH, '00_Wordlist_Raw.txt')
+# Text of the pages with its page, column, line and x-offset.
+WORDLIST_RECORDS_JSONL_PATH = os.path.join(
+    DATA_DIR_PATH, '00_Wordlist_Records.jsonl'
+)
 
 # 01_clean_txt.py
 WORDLIST_CLEANED_TXT_PATH = os.path.join(
@@ -34,18 +56,47 @@ WORDLIST_CLEANED_CSV_PATH = os.path.join(
 )
 
 # 05_preprocess_csv.py
+PREPROCESSING_RULES_PATH = os.path.join(
+    SRC_DIR_PATH, 'config', 'preprocessing_rules.toml'
+)
+WORDLIST_PREPROCESSED_JSONL_PATH = os.path.join(
+    DATA_DIR_PATH, '05_Wordlist_Preprocessed.jsonl'
+)
+# Export-only view of the JSONL file. Not read by any script.
 WORDLIST_PREPROCESSED_CSV_PATH = os.path.join(
     DATA_DIR_PATH, '05_Wordlist_Preprocessed.csv'
 )
 
+# 06_create_audio.py and 07_translate.py, states of their items.
+JOB_QUEUE_PATH = os.path.join(DATA_DIR_PATH, '.job_queue.sqlite')
+
 # 06_create_audio.py
 AUDIO_RECORDINGS_DIR_PATH = os.path.join(DATA_DIR_PATH, '06_audio')
+# Content-addressed audio files, named by the hash of text and settings.
+AUDIO_STORE_DIR_PATH = os.path.join(AUDIO_RECORDINGS_DIR_PATH, 'store')
+# Maps every word to the audio files of the word and its examples.
+AUDIO_MANIFEST_PATH = os.path.join(AUDIO_RECORDINGS_DIR_PATH, 'manifest.json')
+# Audio of the deck, transcoded from the store.
+AUDIO_PACKAGED_DIR_PATH = os.path.join(AUDIO_RECORDINGS_DIR_PATH, 'packaged')
+TTS_MODEL_NAME = 'tts_models/de/thorsten/tacotron2-DDC'
+# Anything else that changes the synthesized audio.
+TTS_SETTINGS = {'vocoder': 'default', 'format': 'wav-pcm16-peak-normalized'}
 
 # 07_translate.py
 TRANSLATIONS_DIR_PATH = os.path.join(DATA_DIR_PATH, '07_translations')
+TRANSLATION_SOURCE_LANG = 'DE'
+TRANSLATION_TARGET_LANG = 'BG'
+TRANSLATION_API_URL = 'https://api-free.deepl.com/v2/translate'
+TRANSLATION_MEMORY_PATH = os.path.join(
+    DATA_DIR_PATH, '07_Translation_Memory.sqlite'
+)
 
 # 08_postprocess_csv.py
-DECK_DATA_JSON_PATH = os.path.join(DATA_DIR_PATH, '08_Deck_Data.json')
+DECK_DATA_JSONL_PATH = os.path.join(DATA_DIR_PATH, '08_Deck_Data.jsonl')
+# Derived from the JSONL file, rebuilt whenever it's missing or stale.
+DECK_DATA_INDEX_PATH = os.path.join(DATA_DIR_PATH, '.deck_data_index.json')
 
 # 09_generate_deck.py
-ANKI_DECK_TXT_PATH = os.path.join(DATA_DIR_PATH, 'Anki_Deck.txt')
+ANKI_DECK_APKG_PATH = os.path.join(DATA_DIR_PATH, 'Anki_Deck.apkg')
+ANKI_DECK_NAME = 'BG-DE Goethe-Zertifikat B1'
+ANKI_MODEL_NAME = 'BG-DE Goethe-Zertifikat B1 Basic'
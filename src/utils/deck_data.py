@@ -0,0 +1,235 @@
+"""Storage of the deck data - the words, examples and their translations.
+
+The deck data is kept as JSON Lines, one object per word in the order of
+the deck, so that a word can be verified and corrected by hand on its
+own line. Every line is padded with spaces to a multiple of SLOT_SIZE
+bytes, leaving room for the object to grow in place.
+
+An index next to the file holds the offset, length and hash of every
+line, the word and whether it has been manually verified. Objects are
+looked up by word without reading the rest of the file, and saving the
+deck data only rewrites the lines whose objects changed. A line is moved
+only when its object outgrows its slot, and then the lines after it
+move too, written into a copy of the file that replaces it once
+complete. The index is rebuilt from the file whenever the file was
+changed by anything else, e.g. by hand.
+"""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import astuple, dataclass
+from typing import BinaryIO
+
+from utils.constants import DECK_DATA_INDEX_PATH, DECK_DATA_JSONL_PATH
+from utils.job_queue import atomic_open
+from utils.logger import logger
+
+# Lines are padded to a multiple of this many bytes.
+SLOT_SIZE = 64
+
+
+@dataclass
+class IndexEntry:
+    """Where the object of a word is stored."""
+
+    word_de: str
+    manually_verified: bool
+    offset: int
+    # Length of the line in bytes, including padding and newline.
+    length: int
+    # Hash of the serialized object, without the padding.
+    digest: str
+
+
+def serialize(obj: dict) -> bytes:
+    """Serialize an object to a line without padding and newline."""
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def object_digest(serialized: bytes) -> str:
+    """Hash a serialized object."""
+    return hashlib.blake2b(serialized, digest_size=8).hexdigest()
+
+
+def pad(serialized: bytes, length: int | None = None) -> bytes:
+    """Pad a serialized object to a line of the given or a fresh slot."""
+    if length is None:
+        length = -(-(len(serialized) + 1) // SLOT_SIZE) * SLOT_SIZE
+    return serialized + b' ' * (length - len(serialized) - 1) + b'\n'
+
+
+def file_stamp() -> list[int]:
+    """Size and modification time of the deck data file."""
+    stat = os.stat(DECK_DATA_JSONL_PATH)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_index() -> list[IndexEntry]:
+    """Index the lines of the deck data file by reading all of them."""
+    index = []
+    offset = 0
+    with open(DECK_DATA_JSONL_PATH, 'rb') as file:
+        for line in file:
+            serialized = line.rstrip()
+            if serialized:
+                obj = json.loads(serialized)
+                index.append(
+                    IndexEntry(
+                        word_de=obj['word_de'],
+                        manually_verified=obj['manually_verified'],
+                        offset=offset,
+                        length=len(line),
+                        digest=object_digest(serialized),
+                    )
+                )
+            offset += len(line)
+    return index
+
+
+def save_index(index: list[IndexEntry]) -> None:
+    """Save the index along with the state of the file it describes."""
+    with atomic_open(DECK_DATA_INDEX_PATH, 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'stamp': file_stamp(),
+                'entries': [astuple(entry) for entry in index],
+            },
+            file,
+            ensure_ascii=False,
+        )
+
+
+def load_index() -> list[IndexEntry]:
+    """Load the index of the deck data, rebuilding it if it's stale.
+
+    Returns an empty index if there's no deck data yet.
+    """
+    if not os.path.exists(DECK_DATA_JSONL_PATH):
+        return []
+
+    if os.path.exists(DECK_DATA_INDEX_PATH):
+        with open(DECK_DATA_INDEX_PATH, 'r', encoding='utf-8') as file:
+            saved = json.load(file)
+        if saved['stamp'] == file_stamp():
+            return [IndexEntry(*entry) for entry in saved['entries']]
+
+    logger.info('Indexing deck data')
+    index = build_index()
+    save_index(index)
+    return index
+
+
+def read_objects(entries: list[IndexEntry]) -> list[dict]:
+    """Read the objects of the index entries, seeking to each of them."""
+    if not entries:
+        # There may be no deck data yet.
+        return []
+
+    objects = []
+    with open(DECK_DATA_JSONL_PATH, 'rb') as file:
+        for entry in entries:
+            file.seek(entry.offset)
+            objects.append(json.loads(file.read(entry.length)))
+    return objects
+
+
+def iter_deck_data() -> Iterator[dict]:
+    """Read the objects of the deck data one by one, in the deck's order."""
+    if not os.path.exists(DECK_DATA_JSONL_PATH):
+        logger.error(
+            'Deck data JSONL file not found. '
+            'Did you run "08_postprocess_csv.py"?'
+        )
+        logger.error(f'{DECK_DATA_JSONL_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    with open(DECK_DATA_JSONL_PATH, 'rb') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_in_place(
+    file: BinaryIO,
+    index: list[IndexEntry],
+    objects: list[dict],
+    serialized: list[bytes],
+    in_place: list[int],
+) -> None:
+    """Write the objects at the positions in_place into their old slots."""
+    for idx in in_place:
+        entry = index[idx]
+        file.seek(entry.offset)
+        file.write(pad(serialized[idx], entry.length))
+        entry.word_de = objects[idx]['word_de']
+        entry.manually_verified = objects[idx]['manually_verified']
+        entry.digest = object_digest(serialized[idx])
+
+
+def write_deck_data(objects: list[dict]) -> int:
+    """Save the deck data, rewriting only the lines that changed.
+
+    Changed objects that fit into the slots of their old lines are
+    written in place. From the first object that doesn't, or that is
+    new, the rest of the file is rewritten - into a copy that replaces
+    the file once complete, as it holds the only copy of the manually
+    verified words. The index is saved once the file is on disk. Returns
+    the number of lines written.
+    """
+    old_index = load_index()
+    serialized = [serialize(obj) for obj in objects]
+
+    in_place = []
+    # Position of the first line from which the file is rewritten.
+    tail_start = min(len(old_index), len(serialized))
+    for idx, (entry, text) in enumerate(zip(old_index, serialized)):
+        if entry.digest == object_digest(text):
+            continue
+        if len(text) < entry.length:
+            in_place.append(idx)
+        else:
+            tail_start = idx
+            break
+
+    index = old_index[:tail_start]
+    if tail_start < len(old_index):
+        offset = old_index[tail_start].offset
+    elif old_index:
+        offset = old_index[-1].offset + old_index[-1].length
+    else:
+        offset = 0
+
+    if tail_start == len(old_index) == len(serialized) and os.path.exists(
+        DECK_DATA_JSONL_PATH
+    ):
+        with open(DECK_DATA_JSONL_PATH, 'r+b') as file:
+            write_in_place(file, index, objects, serialized, in_place)
+            file.flush()
+            os.fsync(file.fileno())
+    else:
+        with atomic_open(DECK_DATA_JSONL_PATH, 'wb') as file:
+            if offset:
+                # The lines before the tail are kept.
+                with open(DECK_DATA_JSONL_PATH, 'rb') as old_file:
+                    file.write(old_file.read(offset))
+            write_in_place(file, index, objects, serialized, in_place)
+
+            file.seek(offset)
+            for obj, text in zip(objects[tail_start:], serialized[tail_start:]):
+                line = pad(text)
+                file.write(line)
+                index.append(
+                    IndexEntry(
+                        word_de=obj['word_de'],
+                        manually_verified=obj['manually_verified'],
+                        offset=offset,
+                        length=len(line),
+                        digest=object_digest(text),
+                    )
+                )
+                offset += len(line)
+
+    save_index(index)
+    return len(in_place) + len(objects) - tail_start
@@ -0,0 +1,222 @@
+"""Durable queue of the items of the long-running steps.
+
+06_create_audio.py and 07_translate.py keep the state of every item -
+an utterance or a word - in SQLite: pending, in progress, done or
+failed. An item is done only once its output is complete, as outputs are
+written to a temporary file that is renamed into place. An interrupted
+run resumes with the items that weren't done, without trusting anything
+they left behind. Failed items are retried with exponential backoff, at
+most MAX_ATTEMPTS times per run.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import IO
+
+from utils.logger import logger, metrics
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+# Attempts at an item in a single run.
+MAX_ATTEMPTS = 5
+# Seconds before the first retry of an item, doubled for every other.
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+@contextmanager
+def atomic_open(
+    path: str, mode: str = 'w', encoding: str | None = None
+) -> Iterator[IO]:
+    """Open a temporary file that replaces path once completely written.
+
+    If writing fails, or the process dies, path is left as it was.
+    """
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, mode, encoding=encoding) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before retrying an item that failed attempts times."""
+    return min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** (attempts - 1))
+
+
+class JobQueue:
+    """States of the items of a step, kept in SQLite.
+
+    Every change is committed right away, so the queue survives a crash
+    at any point. Safe to use from several threads.
+    """
+
+    def __init__(self, path: str, name: str):
+        """Open the queue of the step, resuming the last run.
+
+        Items left in progress or failed by it are pending again, with
+        all of their attempts.
+        """
+        self.name = name
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Commits survive a crash of the process without waiting for the
+        # disk. A power cut can only lose the last of them, whose items
+        # are then done again.
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'queue TEXT, key TEXT, state TEXT, attempts INTEGER, '
+                'retry_at REAL, error TEXT, PRIMARY KEY (queue, key))'
+            )
+            cursor = self.connection.execute(
+                'UPDATE jobs SET state = ?, attempts = 0, retry_at = 0 '
+                'WHERE queue = ? AND state != ?',
+                (PENDING, name, DONE),
+            )
+        if cursor.rowcount:
+            logger.info(f'Resuming {cursor.rowcount} unfinished items')
+
+    def states(self) -> dict[str, str]:
+        """Get the state of every item the queue knows."""
+        with self.lock:
+            cursor = self.connection.execute(
+                'SELECT key, state FROM jobs WHERE queue = ?', (self.name,)
+            )
+            return dict(cursor.fetchall())
+
+    def set_state(self, keys: list[str], state: str) -> None:
+        """Set the state of the items, adding the ones that are new."""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO jobs VALUES (?, ?, ?, 0, 0, NULL) '
+                'ON CONFLICT (queue, key) DO UPDATE SET '
+                'state = excluded.state, error = NULL',
+                [(self.name, key, state) for key in keys],
+            )
+
+    def retain(self, keys: set[str]) -> None:
+        """Forget the items that aren't among keys, e.g. of removed words.
+
+        Otherwise items left unfinished by an earlier run would be
+        processed, though they aren't part of the input anymore.
+        """
+        stale = set(self.states()) - keys
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'DELETE FROM jobs WHERE queue = ? AND key = ?',
+                [(self.name, key) for key in stale],
+            )
+        if stale:
+            logger.info(f'Forgetting {len(stale)} items no longer needed')
+
+    def add(self, keys: list[str]) -> None:
+        """Queue the items, from their first attempt."""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, 0, 0, NULL)',
+                [(self.name, key, PENDING) for key in keys],
+            )
+
+    def finish(self, keys: list[str]) -> None:
+        """Mark the items as done, their outputs complete."""
+        self.set_state(keys, DONE)
+
+    def fail(self, keys: list[str], error: str) -> None:
+        """Count a failed attempt at the items, scheduling their retries.
+
+        Items out of attempts are failed for the rest of the run.
+        """
+        metrics.count('failed_attempts', len(keys))
+        with self.lock, self.connection:
+            for key in keys:
+                (attempts,) = self.connection.execute(
+                    'SELECT attempts FROM jobs WHERE queue = ? AND key = ?',
+                    (self.name, key),
+                ).fetchone()
+                attempts += 1
+                if attempts < MAX_ATTEMPTS:
+                    state, retry_at = PENDING, time.time() + backoff(attempts)
+                else:
+                    state, retry_at = FAILED, 0
+                self.connection.execute(
+                    'UPDATE jobs SET state = ?, attempts = ?, retry_at = ?, '
+                    'error = ? WHERE queue = ? AND key = ?',
+                    (state, attempts, retry_at, error, self.name, key),
+                )
+
+    def due(self) -> list[str]:
+        """Get the pending items, except those waiting for a retry."""
+        with self.lock:
+            cursor = self.connection.execute(
+                'SELECT key FROM jobs '
+                'WHERE queue = ? AND state = ? AND retry_at <= ?',
+                (self.name, PENDING, time.time()),
+            )
+            return [key for (key,) in cursor]
+
+    def next_retry(self) -> float | None:
+        """Get the time of the next retry, None if nothing is pending."""
+        with self.lock:
+            (retry_at,) = self.connection.execute(
+                'SELECT MIN(retry_at) FROM jobs WHERE queue = ? AND state = ?',
+                (self.name, PENDING),
+            ).fetchone()
+            return retry_at
+
+    def counts(self) -> Counter[str]:
+        """Count the items in every state."""
+        with self.lock:
+            cursor = self.connection.execute(
+                'SELECT state, COUNT(*) FROM jobs WHERE queue = ? '
+                'GROUP BY state',
+                (self.name,),
+            )
+            return Counter(dict(cursor.fetchall()))
+
+    def drain(self, process: Callable[[list[str]], None]) -> None:
+        """Process the pending items, until none is left.
+
+        process is given the items that are due and has to finish or
+        fail every one of them. Items it leaves in progress count as a
+        failed attempt, instead of being neither retried nor reported.
+        Failed items come back once their backoff is over.
+        """
+        while True:
+            keys = self.due()
+            if keys:
+                self.set_state(keys, IN_PROGRESS)
+                process(keys)
+                states = self.states()
+                leftover = [key for key in keys if states[key] == IN_PROGRESS]
+                if leftover:
+                    logger.error(f'{len(leftover)} items were left unfinished')
+                    self.fail(leftover, 'Neither finished nor failed')
+                continue
+
+            retry_at = self.next_retry()
+            if retry_at is None:
+                return
+            delay = max(0.0, retry_at - time.time())
+            logger.info(f'Retrying failed items in {delay:.0f} s')
+            time.sleep(delay)
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        self.connection.close()
@@ -1,6 +1,33 @@
-"""Universal logger for all scripts."""
+"""Universal logger and instrumentation for all scripts.
 
+While a step runs, it records the time spent in its phases - read,
+transform and write - and counters such as rows, cache hits or seconds
+of synthesized audio. When it finishes, a summary with its peak memory
+is logged and saved as JSON in data/.metrics/.
+
+PROFILE_STEPS, a comma-separated list of step numbers or 'all', runs
+the steps under cProfile, or under a sampling profiler if PROFILER is
+'sampling'. The profiles are saved next to the summaries and their
+hottest functions are logged.
+"""
+
+import cProfile
+import io
+import json
 import logging.config
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator, Sized
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any
+
+from utils.constants import METRICS_DIR_PATH
 
 config = {
     'version': 1,
@@ -20,3 +47,248 @@ config = {
 logging.config.dictConfig(config=config)
 
 logger = logging.getLogger('universal_logger')
+
+# Seconds between two samples of the sampling profiler.
+SAMPLING_INTERVAL = 0.005
+# Number of functions of a profile that are logged.
+PROFILE_TOP = 15
+
+
+class Metrics:
+    """Phase timers and counters of the running step."""
+
+    def __init__(self) -> None:
+        """Start with no phases and counters."""
+        self.phases: Counter[str] = Counter()
+        self.counters: Counter[str] = Counter()
+
+    def reset(self) -> None:
+        """Forget the phases and counters of the previous step."""
+        self.phases.clear()
+        self.counters.clear()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the step, adding up its repetitions."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def count(self, name: str, amount: float = 1) -> None:
+        """Add an amount, e.g. of rows or cache hits, to a counter."""
+        self.counters[name] += amount
+
+
+# Metrics of the step running in this process. Counts made in worker
+# processes are lost, unless passed back and counted here.
+metrics = Metrics()
+
+
+class SamplingProfiler:
+    """Sample the call stack of a thread at a fixed interval.
+
+    Unlike cProfile, it doesn't slow down every function call, so the
+    proportions of a profile stay close to those of a normal run.
+    """
+
+    def __init__(self) -> None:
+        """Prepare to sample the calling thread."""
+        self.thread_id = threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self) -> None:
+        """Count the stacks of the thread until stopped."""
+        while not self.stopped.wait(SAMPLING_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            calls = []
+            while frame is not None:
+                code = frame.f_code
+                calls.append(
+                    f'{code.co_name} '
+                    f'({os.path.basename(code.co_filename)}:'
+                    f'{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(calls))] += 1
+
+    def enable(self) -> None:
+        """Start sampling."""
+        self.sampler.start()
+
+    def disable(self) -> None:
+        """Stop sampling."""
+        self.stopped.set()
+        self.sampler.join()
+
+    def dump_stats(self, path: str) -> None:
+        """Save the samples as folded stacks, as read by flamegraph.pl."""
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, samples in self.stacks.most_common():
+                file.write(f'{stack} {samples}\n')
+
+    def top(self) -> list[str]:
+        """Describe the functions most samples were taken in."""
+        functions: Counter[str] = Counter()
+        for stack, samples in self.stacks.items():
+            functions[stack.rsplit(';', 1)[-1]] += samples
+        total = max(1, sum(functions.values()))
+        return [
+            f'{samples / total:6.1%} {function}'
+            for function, samples in functions.most_common(PROFILE_TOP)
+        ]
+
+
+Profiler = cProfile.Profile | SamplingProfiler
+
+
+def is_profiled(step: str) -> bool:
+    """Check whether PROFILE_STEPS selects the step."""
+    selected = os.environ.get('PROFILE_STEPS', '')
+    return selected == 'all' or any(
+        number and step.startswith(number) for number in selected.split(',')
+    )
+
+
+def start_profiler(step: str) -> Profiler | None:
+    """Start the profiler chosen by PROFILER, if the step is profiled."""
+    if not is_profiled(step):
+        return None
+
+    name = os.environ.get('PROFILER', 'cprofile')
+    if name == 'sampling':
+        profiler = SamplingProfiler()
+    elif name == 'cprofile':
+        profiler = cProfile.Profile()
+    else:
+        logger.error(f'Unknown profiler {name}, choose cprofile or sampling')
+        raise SystemExit('Aborting')
+
+    profiler.enable()
+    return profiler
+
+
+def save_profile(step: str, profiler: Profiler) -> str:
+    """Save the profile and log its hottest functions, returning its path."""
+    os.makedirs(METRICS_DIR_PATH, exist_ok=True)
+    if isinstance(profiler, SamplingProfiler):
+        path = os.path.join(METRICS_DIR_PATH, f'{step}.folded')
+        top = profiler.top()
+    else:
+        path = os.path.join(METRICS_DIR_PATH, f'{step}.prof')
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+        top = [line for line in output.getvalue().splitlines() if line.strip()]
+
+    profiler.dump_stats(path)
+    logger.info(f'Saved profile of {step} at {path}')
+    for line in top:
+        logger.info(line)
+    return path
+
+
+def peak_memory() -> dict[str, float]:
+    """Peak RSS in MB of this process and of its finished children.
+
+    When steps run in a single process, the peak is that of all steps
+    so far.
+    """
+    # Kilobytes on Linux, bytes on macOS.
+    unit = 2**20 if sys.platform == 'darwin' else 2**10
+    return {
+        'peak_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1
+        ),
+        'peak_children_rss_mb': round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1
+        ),
+    }
+
+
+def save_summary(
+    step: str, started: datetime, seconds: float, profile_path: str | None
+) -> None:
+    """Log the metrics of the step and save them as JSON."""
+    summary = {
+        'step': step,
+        'started': started.isoformat(timespec='seconds'),
+        'seconds': round(seconds, 3),
+        'phases': {name: round(s, 3) for name, s in metrics.phases.items()},
+        'counters': {
+            name: round(value, 3) for name, value in metrics.counters.items()
+        },
+        **peak_memory(),
+        'profile': profile_path,
+    }
+
+    phases = ', '.join(
+        f'{name} {s:.2f} s' for name, s in metrics.phases.items()
+    )
+    logger.info(
+        f'{step} took {seconds:.2f} s ({phases}), '
+        f'peak RSS {summary["peak_rss_mb"]} MB'
+    )
+    if summary['counters']:
+        logger.info(
+            ', '.join(
+                f'{name}={value}' for name, value in summary['counters'].items()
+            )
+        )
+
+    os.makedirs(METRICS_DIR_PATH, exist_ok=True)
+    with open(
+        os.path.join(METRICS_DIR_PATH, f'{step}.json'), 'w', encoding='utf-8'
+    ) as file:
+        json.dump(summary, file, indent=4)
+
+
+@contextmanager
+def instrument(step: str) -> Iterator[Metrics]:
+    """Record the metrics of a step, saving their summary if it succeeds."""
+    metrics.reset()
+    started = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    profiler = start_profiler(step)
+    profile_path = None
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_path = save_profile(step, profiler)
+
+    save_summary(step, started, time.perf_counter() - start, profile_path)
+
+
+def count_rows(output: object, data: object) -> None:
+    """Count the rows of the output, or of the input of steps without one."""
+    for rows in [output, data]:
+        if isinstance(rows, Sized) and not isinstance(rows, str):
+            metrics.count('rows', len(rows))
+            return
+
+
+def run_step(
+    step: str,
+    read_input: Callable[[], Any],
+    run: Callable[[Any], Any],
+    write_output: Callable[[Any], None] | None = None,
+) -> None:
+    """Run a step on its own, timing its phases.
+
+    The work of a step that streams its output is done while it's being
+    written, so it's counted in the write phase.
+    """
+    with instrument(step):
+        with metrics.phase('read'):
+            data = read_input()
+        with metrics.phase('transform'):
+            output = run(data)
+        count_rows(output, data)
+        if write_output is not None:
+            with metrics.phase('write'):
+                write_output(output)
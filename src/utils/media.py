@@ -0,0 +1,179 @@
+"""Packaging of the audio for the deck.
+
+The WAV files of the audio store are transcoded by ffmpeg into a
+compressed format - silence trimmed at both ends, loudness normalized
+to EBU R128 and encoded to MP3 or Opus - which makes the deck a fraction
+of its size. The transcoded files are cached, named by a hash of the
+name of their source, which is itself a hash of everything that
+determines its audio, and of the encoding settings. Unchanged clips are
+therefore never transcoded twice.
+
+DECK_AUDIO_FORMAT chooses the format. By default, 'wav', the files of
+the store are packaged as they are, so ffmpeg is only needed when a
+compressed format is chosen. MEDIA_WORKERS sets how many ffmpeg
+processes run at once, by default one per CPU core.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from utils.constants import AUDIO_PACKAGED_DIR_PATH
+from utils.logger import logger, metrics
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """Encoding settings of a compressed audio format."""
+
+    extension: str
+    ffmpeg_args: tuple[str, ...]
+
+
+# Remove the silence at the start, then at the end by reversing the clip,
+# and normalize the loudness.
+AUDIO_FILTERS = ','.join(
+    [
+        'silenceremove=start_periods=1:start_threshold=-50dB',
+        'areverse',
+        'silenceremove=start_periods=1:start_threshold=-50dB',
+        'areverse',
+        'loudnorm=I=-16:TP=-1.5:LRA=11',
+    ]
+)
+
+AUDIO_FORMATS = {
+    'mp3': AudioFormat('mp3', ('-c:a', 'libmp3lame', '-q:a', '5', '-f', 'mp3')),
+    # Anki plays Opus in an Ogg container.
+    'opus': AudioFormat('ogg', ('-c:a', 'libopus', '-b:a', '32k', '-f', 'ogg')),
+}
+
+# Keeps the files of the audio store as they are.
+UNCOMPRESSED = 'wav'
+DEFAULT_AUDIO_FORMAT = UNCOMPRESSED
+
+
+def audio_format() -> str:
+    """Get the format of the packaged audio."""
+    name = os.environ.get('DECK_AUDIO_FORMAT', DEFAULT_AUDIO_FORMAT)
+    if name != UNCOMPRESSED and name not in AUDIO_FORMATS:
+        logger.error(f'Unknown audio format {name}')
+        logger.error(
+            f'Choose from: {", ".join([UNCOMPRESSED, *AUDIO_FORMATS])}'
+        )
+        raise SystemExit('Aborting')
+    return name
+
+
+def packaged_path(source_path: str, audio_format: AudioFormat) -> str:
+    """Path of the transcoded audio of a source file."""
+    key = json.dumps(
+        [os.path.basename(source_path), AUDIO_FILTERS, audio_format.ffmpeg_args]
+    )
+    hash_ = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(
+        AUDIO_PACKAGED_DIR_PATH, f'{hash_}.{audio_format.extension}'
+    )
+
+
+def transcode(
+    ffmpeg: str, source_path: str, target_path: str, audio_format: AudioFormat
+) -> str | None:
+    """Transcode a file, returning ffmpeg's error if it fails.
+
+    The target only appears once it's complete.
+    """
+    tmp_path = f'{target_path}.tmp'
+    result = subprocess.run(
+        [
+            ffmpeg,
+            '-nostdin',
+            '-loglevel',
+            'error',
+            '-y',
+            '-i',
+            source_path,
+            '-af',
+            AUDIO_FILTERS,
+            *audio_format.ffmpeg_args,
+            tmp_path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return result.stderr.strip() or f'exit code {result.returncode}'
+
+    os.replace(tmp_path, target_path)
+    return None
+
+
+def total_size(paths: list[str]) -> int:
+    """Total size of the files in bytes."""
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def package_audio(source_paths: list[str], name: str) -> dict[str, str]:
+    """Transcode the audio files to the format, unless already cached.
+
+    Returns the path of the packaged file of every source file.
+    """
+    if name == UNCOMPRESSED or not source_paths:
+        return {path: path for path in source_paths}
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        logger.error('ffmpeg not found, it is needed for transcoding audio')
+        logger.error(
+            f'Install it, or unset DECK_AUDIO_FORMAT to package {UNCOMPRESSED}'
+        )
+        raise SystemExit('Aborting')
+
+    audio_format = AUDIO_FORMATS[name]
+    targets = {path: packaged_path(path, audio_format) for path in source_paths}
+    missing = [
+        (source, target)
+        for source, target in targets.items()
+        if not os.path.exists(target)
+    ]
+    logger.info(
+        f'Reusing {len(targets) - len(missing)} transcoded audio files, '
+        f'transcoding {len(missing)}'
+    )
+    metrics.count('transcode_cache_hits', len(targets) - len(missing))
+    metrics.count('transcode_cache_misses', len(missing))
+
+    if missing:
+        os.makedirs(AUDIO_PACKAGED_DIR_PATH, exist_ok=True)
+        workers = int(os.environ.get('MEDIA_WORKERS', os.cpu_count()))
+        # The threads only wait for the ffmpeg processes doing the work.
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            errors = pool.map(
+                lambda item: transcode(ffmpeg, *item, audio_format), missing
+            )
+            failed = [
+                (source, error)
+                for (source, _), error in zip(missing, errors)
+                if error is not None
+            ]
+        for source, error in failed[:10]:
+            logger.error(f'Transcoding {source} failed: {error}')
+        if failed:
+            logger.error(f'Transcoding {len(failed)} audio files failed')
+            raise SystemExit('Aborting')
+
+    before = total_size(list(targets))
+    after = total_size(list(targets.values()))
+    metrics.count('audio_bytes_before_transcoding', before)
+    metrics.count('audio_bytes_after_transcoding', after)
+    logger.info(
+        f'Audio takes {after / 1e6:.1f} MB as {name}, '
+        f'{before / 1e6:.1f} MB as WAV ({after / max(before, 1):.0%})'
+    )
+    return targets
@@ -0,0 +1,243 @@
+"""Layout recovery of PDF pages from the coordinates of their words.
+
+Every page is read by a worker process of its own pool. The running
+headers and footers and the chapter headings, set in other sizes above
+and below the body text, are dropped. The other words of a page are
+grouped into physical lines by their vertical overlap, and into columns
+by the gutters - vertical bands no word crosses. A line of a column is
+split further into segments wherever the words are far apart or a word
+starts at a tab stop - an x many segments start at - e.g. between a word
+and its examples. Each segment becomes a record:
+    {'page': 16, 'column': 0, 'line': 3, 'x': 0.0, 'y': 84.6, 'text': ...}
+where x is the offset from the left edge of the column and line counts
+the lines of the column. The page is also rendered as fixed-width text,
+similar to `pdftotext -layout`, with a margin of LEFT_MARGIN characters
+before the first column, as 01_clean_txt.py expects.
+"""
+
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# x0, y0, x1, y1 and text of a word, in points.
+Word = tuple[float, float, float, float, str]
+
+# Minimum width of an empty vertical band separating two columns.
+MIN_GUTTER_WIDTH = 20.0
+# Share of the height of the shorter of two words they have to overlap
+# vertically by to be on the same line.
+MIN_LINE_OVERLAP = 0.5
+# Gap between two words, in widths of a character, starting a new segment.
+SEGMENT_GAP_CHARS = 2.0
+# Segments that have to start at an x for it to be a tab stop.
+MIN_TAB_STOP_SEGMENTS = 4
+# Characters before the first column of the rendered text.
+LEFT_MARGIN = 8
+
+# Document opened by the current worker process.
+document = None
+
+
+def init_worker(pdf_path: str) -> None:
+    """Open the document once per worker."""
+    global document
+
+    # PyMuPDF is only needed for extracting the text of the PDF.
+    import pymupdf
+
+    document = pymupdf.open(pdf_path)
+
+
+def find_column_edges(words: list[Word], page_width: float) -> list[float]:
+    """Find the left edges of the columns from the gutters between them."""
+    coverage = np.zeros(int(page_width) + 2, dtype=np.int32)
+    for x0, _, x1, _, _ in words:
+        coverage[int(x0) : int(x1) + 1] += 1
+
+    occupied = np.flatnonzero(coverage)
+
+    # Empty bands between the first and the last occupied point.
+    gaps = np.diff(occupied)
+    gutter_idx = np.flatnonzero(gaps > MIN_GUTTER_WIDTH)
+    return [
+        float(occupied[0]),
+        *(float(occupied[idx + 1]) for idx in gutter_idx),
+    ]
+
+
+def find_tab_stops(lines: list[list[Word]], max_gap: float) -> set[int]:
+    """Find the x, rounded to a point, many segments start at.
+
+    Only the words starting a line or following a gap wider than max_gap
+    are counted, not ones that follow e.g. the same first word.
+    """
+    starts = Counter(
+        round(word[0])
+        for line in lines
+        for previous, word in zip([None, *line], line)
+        if previous is None or word[0] - previous[2] > max_gap
+    )
+    return {x for x, count in starts.items() if count >= MIN_TAB_STOP_SEGMENTS}
+
+
+def find_body(words: list[Word]) -> list[Word]:
+    """Drop the words above and below the body text of the page.
+
+    The body text is set in the most common size, so the words of that
+    height span it.
+    """
+    heights = [round(y1 - y0) for _, y0, _, y1, _ in words]
+    [(body_height, _)] = Counter(heights).most_common(1)
+    top = min(w[1] for w, h in zip(words, heights) if h == body_height)
+    bottom = max(w[3] for w, h in zip(words, heights) if h == body_height)
+    return [word for word in words if word[3] > top and word[1] < bottom]
+
+
+def group_lines(words: list[Word]) -> list[list[Word]]:
+    """Group the words into physical lines, ordered top to bottom.
+
+    Words of different sizes or slightly raised ones, such as an example
+    next to its word, have different baselines but overlap vertically.
+    A line is compared by its first word, so lines don't chain together.
+    """
+    lines: list[list[Word]] = []
+    for word in sorted(words, key=lambda word: (word[1] + word[3], word[0])):
+        if lines:
+            first = lines[-1][0]
+            overlap = min(word[3], first[3]) - max(word[1], first[1])
+            shorter = min(word[3] - word[1], first[3] - first[1])
+            if overlap >= MIN_LINE_OVERLAP * shorter:
+                lines[-1].append(word)
+                continue
+        lines.append([word])
+
+    for line in lines:
+        line.sort(key=lambda word: word[0])
+    return lines
+
+
+def split_segments(
+    line: list[Word],
+    column_edges: list[float],
+    tab_stops: set[int],
+    max_gap: float,
+) -> list[tuple[int, list[Word]]]:
+    """Split a physical line into segments, each within a single column.
+
+    A lone word at a tab stop, such as the hanging number of an example,
+    stays in the segment of the word after it.
+    """
+    segments: list[tuple[int, list[Word]]] = []
+    for word in line:
+        column = int(np.searchsorted(column_edges, word[0], 'right')) - 1
+        if not segments or segments[-1][0] != column:
+            segments.append((column, [word]))
+            continue
+
+        segment = segments[-1][1]
+        hanging = len(segment) == 1 and round(segment[0][0]) in tab_stops
+        if word[0] - segment[-1][2] <= max_gap and (
+            hanging or round(word[0]) not in tab_stops
+        ):
+            segment.append(word)
+        else:
+            segments.append((column, [word]))
+    return segments
+
+
+def render_line(
+    segments: list[list[Word]], left_edge: float, char_width: float
+) -> str:
+    """Render the segments of a physical line as fixed-width text.
+
+    left_edge is the left edge of the first column, in points. As the
+    font is proportional, a segment can run into the place of the next
+    one, which is then moved right, to keep the two spaces the steps
+    after 01_clean_txt.py split the columns at.
+    """
+    text = ''
+    for segment in segments:
+        offset = round((segment[0][0] - left_edge) / char_width)
+        padding = LEFT_MARGIN + offset - len(text)
+        text += ' ' * max(2 if text else 0, padding)
+        text += ' '.join(word[4] for word in segment)
+    return text
+
+
+def extract_page(page_number: int) -> tuple[list[dict], str]:
+    """Extract the records and the fixed-width text of a page.
+
+    page_number is one-based, as in PDF viewers.
+    """
+    page = document[page_number - 1]
+    words: list[Word] = [
+        (x0, y0, x1, y1, text)
+        for x0, y0, x1, y1, text, *_ in page.get_text('words')
+    ]
+    if not words:
+        return [], ''
+
+    words = find_body(words)
+    char_width = float(
+        np.median([(w[2] - w[0]) / len(w[4]) for w in words if w[4]])
+    )
+    column_edges = find_column_edges(words, page.rect.width)
+    lines = group_lines(words)
+    tab_stops = find_tab_stops(lines, SEGMENT_GAP_CHARS * char_width)
+
+    records = []
+    rendered = []
+    column_lines = [0] * len(column_edges)
+    # Blank lines stand for the vertical space between the lines.
+    baselines = [float(np.median([word[3] for word in line])) for line in lines]
+    line_height = float(np.median(np.diff(baselines))) if len(lines) > 1 else 1
+    previous_baseline = baselines[0]
+    for line, baseline in zip(lines, baselines):
+        segments = split_segments(
+            line, column_edges, tab_stops, SEGMENT_GAP_CHARS * char_width
+        )
+        for column, segment in segments:
+            records.append(
+                {
+                    'page': page_number,
+                    'column': column,
+                    'line': column_lines[column],
+                    'x': round(segment[0][0] - column_edges[column], 1),
+                    'y': round(baseline, 1),
+                    'text': ' '.join(word[4] for word in segment),
+                }
+            )
+        for column in {column for column, _ in segments}:
+            column_lines[column] += 1
+
+        skipped = round((baseline - previous_baseline) / line_height) - 1
+        rendered.extend([''] * max(0, skipped))
+        rendered.append(
+            render_line(
+                [segment for _, segment in segments],
+                column_edges[0],
+                char_width,
+            )
+        )
+        previous_baseline = baseline
+
+    records.sort(key=lambda r: (r['column'], r['line'], r['x']))
+    return records, '\n'.join(rendered) + '\n'
+
+
+def extract_pages(
+    pdf_path: str, first_page: int, last_page: int, workers: int | None = None
+) -> list[tuple[list[dict], str]]:
+    """Extract the pages from first_page to last_page, inclusive."""
+    page_numbers = range(first_page, last_page + 1)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(page_numbers)),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(pdf_path,),
+    ) as pool:
+        return list(pool.map(extract_page, page_numbers, chunksize=4))
@@ -0,0 +1,104 @@
+"""Per-row cache of derived values.
+
+Rows are keyed by a hash of their input values. Cached values are only
+valid for the version of the step's code that computed them, so any
+change to the script or the utils it uses invalidates them. Rows that
+are not part of the current wordlist are kept, so several wordlists can
+share the cache.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections.abc import Callable
+from contextlib import closing
+
+import pandas as pd
+
+from utils.build_cache import stage_fingerprint
+from utils.constants import ROW_CACHE_PATH
+from utils.logger import logger, metrics
+
+
+def row_key(*values: object) -> str:
+    """Hash the input values of a row."""
+    serialized = json.dumps(values, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def connect() -> sqlite3.Connection:
+    """Open the row cache, creating it if necessary."""
+    connection = sqlite3.connect(ROW_CACHE_PATH)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS rows ('
+        'stage TEXT, code TEXT, key TEXT, value TEXT, '
+        'PRIMARY KEY (stage, key))'
+    )
+    return connection
+
+
+def load_rows(stage: str, keys: list[str]) -> dict[str, object]:
+    """Load the cached values of the given rows for the current code."""
+    code = stage_fingerprint(stage, [])
+    with closing(connect()) as connection:
+        cursor = connection.execute(
+            'SELECT key, value FROM rows WHERE stage = ? AND code = ?',
+            (stage, code),
+        )
+        wanted = set(keys)
+        return {
+            key: json.loads(value) for key, value in cursor if key in wanted
+        }
+
+
+def store_rows(stage: str, rows: dict[str, object]) -> None:
+    """Store the values of the given rows for the current code."""
+    code = stage_fingerprint(stage, [])
+    with closing(connect()) as connection, connection:
+        # Values computed by older code are stale.
+        connection.execute(
+            'DELETE FROM rows WHERE stage = ? AND code != ?', (stage, code)
+        )
+        connection.executemany(
+            'INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)',
+            [
+                (stage, code, key, json.dumps(value, ensure_ascii=False))
+                for key, value in rows.items()
+            ],
+        )
+
+
+def apply_incrementally(
+    stage: str,
+    df: pd.DataFrame,
+    compute: Callable[[pd.DataFrame], pd.DataFrame],
+    columns: list[str],
+) -> pd.DataFrame:
+    """Apply compute only to the rows the step hasn't seen before.
+
+    The rows are keyed by all of their columns. The given columns of the
+    result of compute for the new rows are merged with the cached values
+    of the other rows, keeping the original order.
+    """
+    keys = [row_key(*row) for row in df.itertuples(index=False)]
+    cached = load_rows(stage, keys)
+
+    missing_mask = [key not in cached for key in keys]
+    missing_df = df[missing_mask]
+    logger.info(
+        f'Reusing {len(df) - len(missing_df)} cached rows, '
+        f'computing {len(missing_df)} rows'
+    )
+    metrics.count('row_cache_hits', len(df) - len(missing_df))
+    metrics.count('row_cache_misses', len(missing_df))
+
+    computed = {}
+    if not missing_df.empty:
+        computed_df = compute(missing_df)[columns]
+        missing_keys = [key for key, m in zip(keys, missing_mask) if m]
+        for key, row in zip(missing_keys, computed_df.itertuples(index=False)):
+            computed[key] = list(row)
+        store_rows(stage, computed)
+
+    values = [computed[key] if key in computed else cached[key] for key in keys]
+    return pd.DataFrame(values, columns=columns, index=df.index)
@@ -0,0 +1,173 @@
+"""Ordered text rules compiled into a single matcher.
+
+Every rule has a pattern matched at the start of a value and an output
+built from the named groups of the match. The patterns of a table are
+joined into one alternation, each one wrapped in a group named after its
+rule, so a single regex match per value finds the first rule that
+applies - the regex engine tries the alternatives in order. Values no
+rule matches are kept as they are. Adding a rule doesn't add a pass over
+the values.
+
+The tables are loaded from a TOML file, see
+config/preprocessing_rules.toml. Every table counts the values each of
+its rules matched and the time spent on them, matching and formatting.
+The time of matching a value is charged to the rule that matched it, and
+includes trying the rules before it, so a slow pattern also shows up in
+the rules after it.
+"""
+
+import re
+import time
+import tomllib
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import pandas as pd
+
+from utils.logger import logger
+
+# Counter key of the values no rule matched.
+NO_RULE = '(none)'
+
+# Named groups and their back-references, e.g. '(?P<word>' or '(?P=word)'.
+named_group_pattern = re.compile(r'\(\?P([<=])(\w+)')
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A pattern matched at the start of a value and its output."""
+
+    # A valid Python identifier, unique within the table.
+    name: str
+    pattern: str
+    # Format string of the result, using the named groups of pattern.
+    output: str = '{word}'
+    # Whether the groups are stripped of whitespace.
+    strip: bool = True
+    # Pairs of substrings replaced in the result, in order.
+    replace: list[list[str]] = field(default_factory=list)
+
+    def prefixed_pattern(self) -> str:
+        """Prefix the names of the groups, keeping them unique in a table."""
+        return named_group_pattern.sub(
+            lambda match: f'(?P{match[1]}{self.name}_{match[2]}',
+            self.pattern,
+        )
+
+    @cached_property
+    def group_names(self) -> list[str]:
+        """Names of the groups of the pattern, as used by output."""
+        return list(re.compile(self.pattern).groupindex)
+
+    @cached_property
+    def group_keys(self) -> list[str]:
+        """Names of the groups in the combined pattern of a table."""
+        return [f'{self.name}_{group}' for group in self.group_names]
+
+    def format_all(self, matches: list[re.Match]) -> list[str]:
+        """Build the outputs of matches of the rule in a combined pattern."""
+        columns = [
+            [match[key] or '' for match in matches] for key in self.group_keys
+        ]
+        if self.strip:
+            columns = [list(map(str.strip, column)) for column in columns]
+
+        if [f'{{{group}}}' for group in self.group_names] == [self.output]:
+            results = columns[0]
+        else:
+            results = [
+                self.output.format_map(dict(zip(self.group_names, values)))
+                for values in zip(*columns)
+            ] or [self.output.format_map({})] * len(matches)
+
+        for old, new in self.replace:
+            results = [result.replace(old, new) for result in results]
+        return results
+
+
+class RuleSet:
+    """Rules applied in order, the first matching rule winning."""
+
+    def __init__(self, name: str, rules: list[Rule]):
+        """Compile the patterns of the rules into one."""
+        self.name = name
+        self.rules = {rule.name: rule for rule in rules}
+        self.pattern = re.compile(
+            '|'.join(
+                f'(?P<{rule.name}>{rule.prefixed_pattern()})' for rule in rules
+            )
+        )
+        # Values matched by every rule and seconds spent on them, across
+        # all calls of apply_all.
+        self.hits: Counter[str] = Counter()
+        self.seconds: Counter[str] = Counter()
+
+    def apply_all(self, values: pd.Series) -> pd.Series:
+        """Transform every value with the first rule matching it."""
+        matches = []
+        by_rule: dict[str, list[int]] = {}
+        for idx, value in enumerate(values.tolist()):
+            # Every value is timed, to charge its rule with the matching.
+            start = time.perf_counter()
+            match = self.pattern.match(value)
+            seconds = time.perf_counter() - start
+
+            # The group of a rule encloses its other groups, so it closes
+            # last.
+            name = match.lastgroup if match else NO_RULE
+            matches.append(match)
+            by_rule.setdefault(name, []).append(idx)
+            self.seconds[name] += seconds
+
+        result = values.tolist()
+        for name, indices in by_rule.items():
+            self.hits[name] += len(indices)
+            if name == NO_RULE:
+                continue
+
+            start = time.perf_counter()
+            outputs = self.rules[name].format_all(
+                [matches[idx] for idx in indices]
+            )
+            for idx, output in zip(indices, outputs):
+                result[idx] = output
+            self.seconds[name] += time.perf_counter() - start
+
+        return pd.Series(result, index=values.index)
+
+    def reset_stats(self) -> None:
+        """Forget the hits and times counted so far."""
+        self.hits.clear()
+        self.seconds.clear()
+
+    def add_stats(self, hits: Counter[str], seconds: Counter[str]) -> None:
+        """Add hits and times counted elsewhere, e.g. in another process."""
+        self.hits.update(hits)
+        self.seconds.update(seconds)
+
+    def log_stats(self) -> None:
+        """Log the hits of every rule and the time spent on it."""
+        logger.info(
+            f'Rules of {self.name}, {self.seconds.total() * 1000:.1f} ms:'
+        )
+        for name in [*self.rules, NO_RULE]:
+            logger.info(
+                f'{name:>20}: {self.hits[name]:>7} hits, '
+                f'{self.seconds[name] * 1000:7.1f} ms'
+            )
+
+
+def load_rule_sets(path: str) -> dict[str, RuleSet]:
+    """Load and compile the tables of rules of a TOML file."""
+    with open(path, 'rb') as file:
+        tables = tomllib.load(file)
+
+    rule_sets = {}
+    for name, rules in tables.items():
+        try:
+            rule_sets[name] = RuleSet(name, [Rule(**rule) for rule in rules])
+        except (TypeError, re.error) as error:
+            logger.error(f'Invalid rules {name} in {path}: {error}')
+            raise SystemExit('Aborting') from error
+    return rule_sets
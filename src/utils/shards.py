@@ -0,0 +1,135 @@
+"""Parallel processing of the wordlist in independent shards.
+
+The wordlist is divided into the sections of the alphabet, headed by a
+line with a single letter, and no entry crosses their boundaries. The
+shards are processed by a pool of processes and the results are merged
+in the original order. Small inputs are processed in-process, where a
+pool would cost more than it saves. The number of processes is set
+through the SHARD_WORKERS environment variable, by default one per CPU
+core.
+"""
+
+import os
+import re
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, TypeVar
+
+import pandas as pd
+
+from utils.logger import logger, metrics
+
+T = TypeVar('T')
+
+# Lines with single letters A B C D E F G ...
+section_heading_pattern = re.compile(r'^[A-Z]$')
+
+# Inputs smaller than this, in lines or rows, aren't worth a pool.
+MIN_PARALLEL_SIZE = 50_000
+
+
+@dataclass
+class Shard:
+    """A part of the input that can be processed on its own."""
+
+    # Describes the shard in error messages, e.g. 'section B (lines 3-9)'.
+    label: str
+    data: Any
+    # Number of lines or rows.
+    size: int
+
+
+def section_shards(lines: list[str]) -> list[Shard]:
+    """Split the lines at the section headings.
+
+    The data of each shard is the number of its first line and its
+    lines, starting with the heading. Lines before the first heading
+    form a shard of their own.
+    """
+    starts = [
+        idx
+        for idx, line in enumerate(lines)
+        if section_heading_pattern.match(line.strip())
+    ]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    shards = []
+    for start, end in zip(starts, [*starts[1:], len(lines)]):
+        heading = lines[start].strip()
+        name = heading if section_heading_pattern.match(heading) else 'start'
+        shards.append(
+            Shard(
+                label=f'section {name} (lines {start + 1}-{end})',
+                data=(start + 1, lines[start:end]),
+                size=end - start,
+            )
+        )
+    return shards
+
+
+def row_shards(df: pd.DataFrame, count: int) -> list[Shard]:
+    """Split the rows into count contiguous shards of similar size."""
+    bounds = [len(df) * idx // count for idx in range(count + 1)]
+    return [
+        Shard(
+            label=f'rows {start + 1}-{end}',
+            data=df.iloc[start:end],
+            size=end - start,
+        )
+        for start, end in zip(bounds, bounds[1:])
+        if end > start
+    ]
+
+
+def worker_count() -> int:
+    """Get the number of processes to use."""
+    return int(os.environ.get('SHARD_WORKERS', os.cpu_count()))
+
+
+def result_of(shard: Shard, compute: Callable[[], T]) -> T:
+    """Return the result of the shard, naming the shard if it fails."""
+    try:
+        return compute()
+    except (Exception, SystemExit) as error:
+        logger.error(f'Processing {shard.label} failed: {error!r}')
+        raise SystemExit('Aborting') from error
+
+
+def map_shards(func: Callable[[Any], T], shards: list[Shard]) -> list[T]:
+    """Apply func to the data of every shard, returning results in order.
+
+    func has to be defined at the top level of a module, so that it can
+    be sent to the worker processes.
+    """
+    metrics.count('shards', len(shards))
+    workers = min(worker_count(), len(shards))
+    is_parallel = (
+        workers > 1 and sum(shard.size for shard in shards) >= MIN_PARALLEL_SIZE
+    )
+    if not is_parallel:
+        return [result_of(shard, partial(func, shard.data)) for shard in shards]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, shard.data) for shard in shards]
+        try:
+            return [
+                result_of(shard, future.result)
+                for shard, future in zip(shards, futures)
+            ]
+        except SystemExit:
+            pool.shutdown(cancel_futures=True)
+            raise
+
+
+def map_row_shards(
+    func: Callable[[pd.DataFrame], pd.DataFrame], df: pd.DataFrame
+) -> pd.DataFrame:
+    """Apply func to contiguous shards of the rows and concatenate them.
+
+    Rows are independent of each other, so any split gives the same
+    result as applying func to all rows at once.
+    """
+    return pd.concat(map_shards(func, row_shards(df, worker_count())))
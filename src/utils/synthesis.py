@@ -0,0 +1,209 @@
+"""Parallel text-to-speech synthesis.
+
+The utterances are sharded into batches and synthesized by a pool of
+worker processes, each loading its own model once and pinned to its own
+CPU cores. Every batch is a single round trip to a worker, and the
+synthesized audio is written to disk by a background thread in the main
+process while the workers carry on. Every file is reported once written,
+and every batch that fails is reported with its error, so that the
+caller can retry it.
+"""
+
+import io
+import multiprocessing
+import os
+import queue
+import threading
+import wave
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from multiprocessing.sharedctypes import Synchronized
+
+import numpy as np
+from rich.progress import track
+
+from utils.job_queue import atomic_open
+from utils.logger import logger, metrics
+
+# A text to synthesize and the path of the WAV file to write it to.
+Job = tuple[str, str]
+# Called with the path of a written file.
+OnWritten = Callable[[str], None]
+# Called with the paths of files that couldn't be created and the error.
+OnFailed = Callable[[list[str], str], None]
+
+# Seconds between checks that the writer thread is still running, while
+# waiting for room in its queue.
+WRITER_POLL_INTERVAL = 1.0
+
+# Model of the current worker process.
+tts = None
+
+
+def init_worker(
+    model_name: str, device: str, threads: int, counter: Synchronized
+) -> None:
+    """Pin the worker to its CPU cores and load the model."""
+    global tts
+
+    with counter.get_lock():
+        worker_idx = counter.value
+        counter.value += 1
+
+    # Give every worker its own cores, so they don't compete for them.
+    if hasattr(os, 'sched_setaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+        own_cores = cores[worker_idx * threads : (worker_idx + 1) * threads]
+        if own_cores:
+            os.sched_setaffinity(0, own_cores)
+
+    import torch
+    from TTS.api import TTS
+
+    torch.set_num_threads(threads)
+    with redirect_stdout(io.StringIO()):
+        tts = TTS(model_name=model_name, progress_bar=False).to(device)
+
+
+def synthesize_batch(jobs: list[Job]) -> list[tuple[str, np.ndarray, int]]:
+    """Synthesize a batch of utterances in the worker process."""
+    results = []
+    sample_rate = tts.synthesizer.output_sample_rate
+    for text, path in jobs:
+        with redirect_stdout(io.StringIO()):
+            wav = tts.tts(text=text)
+        results.append((path, np.asarray(wav, dtype=np.float32), sample_rate))
+
+    return results
+
+
+def write_wav(path: str, wav: np.ndarray, sample_rate: int) -> None:
+    """Write the audio as a 16-bit mono WAV file, normalizing its volume.
+
+    The file only appears once it's complete.
+    """
+    wav_norm = wav * (32767 / max(0.01, float(np.max(np.abs(wav)))))
+    with atomic_open(path, 'wb') as file, wave.open(file, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(wav_norm.astype(np.int16).tobytes())
+
+
+def writer_loop(
+    pending: queue.Queue,
+    on_written: OnWritten,
+    on_failed: OnFailed,
+    errors: list[BaseException],
+) -> None:
+    """Write the queued audio until None is received.
+
+    Audio that can't be written is reported as failed. An error that
+    stops the loop, e.g. of on_written, is kept in errors for the main
+    thread.
+    """
+    try:
+        while (item := pending.get()) is not None:
+            path = item[0]
+            try:
+                write_wav(*item)
+            except Exception as error:
+                on_failed([path], str(error))
+                continue
+            on_written(path)
+    except BaseException as error:
+        errors.append(error)
+
+
+def put_pending(
+    pending: queue.Queue, item: tuple | None, writer: threading.Thread
+) -> bool:
+    """Queue an item for the writer, False if the writer has stopped."""
+    while writer.is_alive():
+        try:
+            pending.put(item, timeout=WRITER_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def synthesize(
+    jobs: list[Job],
+    model_name: str,
+    workers: int,
+    threads_per_worker: int,
+    batch_size: int,
+    on_written: OnWritten,
+    on_failed: OnFailed,
+) -> None:
+    """Synthesize all jobs with a pool of worker processes.
+
+    on_written is called from the thread writing the files. If that
+    thread stops, e.g. as on_written fails, its error is raised here.
+    """
+    import torch
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    if device == 'cuda':
+        # A single process makes the best use of the GPU.
+        workers = 1
+
+    batches = [
+        jobs[start : start + batch_size]
+        for start in range(0, len(jobs), batch_size)
+    ]
+
+    pending: queue.Queue = queue.Queue(maxsize=4 * batch_size)
+    writer_errors: list[BaseException] = []
+    writer = threading.Thread(
+        target=writer_loop,
+        args=(pending, on_written, on_failed, writer_errors),
+    )
+    writer.start()
+
+    # Forking a process that has loaded torch isn't safe.
+    context = multiprocessing.get_context('spawn')
+    counter = context.Value('i', 0)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(model_name, device, threads_per_worker, counter),
+        ) as pool:
+            futures = {
+                pool.submit(synthesize_batch, batch): batch for batch in batches
+            }
+            for future in track(
+                as_completed(futures),
+                total=len(futures),
+                description='Creating audio...',
+                update_period=10,
+                auto_refresh=False,
+            ):
+                try:
+                    results = future.result()
+                except Exception as error:
+                    logger.error(f'Failed to synthesize a batch: {error}')
+                    on_failed([path for _, path in futures[future]], str(error))
+                    continue
+
+                for result in results:
+                    _, wav, sample_rate = result
+                    metrics.count('synthesized_utterances')
+                    metrics.count(
+                        'synthesized_audio_seconds', len(wav) / sample_rate
+                    )
+                    if not put_pending(pending, result, writer):
+                        pool.shutdown(cancel_futures=True)
+                        logger.error('Writing the audio failed')
+                        raise writer_errors[0]
+    finally:
+        put_pending(pending, None, writer)
+        writer.join()
+
+    if writer_errors:
+        logger.error('Writing the audio failed')
+        raise writer_errors[0]
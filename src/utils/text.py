@@ -0,0 +1,8 @@
+"""Helpers for comparing texts."""
+
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Normalize unicode and whitespace of a text."""
+    return unicodedata.normalize('NFC', ' '.join(text.split()))
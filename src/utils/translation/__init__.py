@@ -0,0 +1 @@
+"""Translation of words and examples through pluggable backends."""
@@ -0,0 +1,43 @@
+"""Interface every translation backend implements."""
+
+from abc import ABC, abstractmethod
+from types import TracebackType
+
+
+class TranslationError(Exception):
+    """Raised when a backend fails to translate a batch of texts."""
+
+
+class TranslationBackend(ABC):
+    """Translates batches of texts from one language to another.
+
+    Backends are called from worker threads, so translate() has to be
+    safe to call concurrently up to max_concurrency times.
+    """
+
+    # Maximum number of texts in a single request.
+    max_batch_size: int = 50
+    # Maximum number of characters in a single request.
+    max_batch_chars: int = 100_000
+    # Maximum number of requests in flight, None if unlimited.
+    max_concurrency: int | None = None
+
+    @abstractmethod
+    def translate(self, texts: list[str]) -> list[str]:
+        """Translate the texts, returning translations in the same order."""
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+    def __enter__(self) -> 'TranslationBackend':
+        """Use the backend as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Release the resources when leaving the context."""
+        self.close()
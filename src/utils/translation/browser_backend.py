@@ -0,0 +1,232 @@
+"""Backend driving the DeepL web translator through Selenium."""
+
+import queue
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support import expected_conditions as ec
+from selenium.webdriver.support.wait import WebDriverWait
+
+from utils.logger import logger
+from utils.translation.backend import TranslationBackend, TranslationError
+
+# Separates the texts of a batch in the text box. DeepL keeps it as-is.
+SEGMENT_SEPARATOR = '---'
+
+# Seconds to wait for any element or for the translation to appear.
+TIMEOUT = 30
+# Seconds the translation has to stay unchanged to be considered done.
+STABLE_PERIOD = 1.0
+
+ACCEPT_COOKIES_XPATH = '/html/body/div[1]/div[1]/div[1]/div/div[3]/button[2]'
+EXTENSION_SUGGESTION_CLOSE_XPATH = (
+    '/html/body/div[1]/div[1]/div[2]/div/div[1]/div/main/div[3]/div/div'
+    '/div[2]/button'
+)
+TRANSLATE_FROM_BUTTON_XPATH = (
+    '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div'
+    '/div[2]/div/div/div[1]/section/div/div[1]/div/div[1]/div/div[1]/span'
+    '/span/span/button/span/div/div/span/span'
+)
+TRANSLATE_FROM_INPUT_XPATH = (
+    '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div'
+    '/div[2]/div/div/div[1]/section/div/div[1]/div/div[1]/div/div[1]/div'
+    '/div/div[1]/div/input'
+)
+TRANSLATE_TO_BUTTON_XPATH = (
+    '//*[@id="headlessui-popover-button-34"]/span/div/div/span/span'
+)
+TRANSLATE_TO_INPUT_XPATH = (
+    '/html/body/div[1]/div[1]/div[2]/div[2]/div[1]/div/main/div[2]/nav/div'
+    '/div[2]/div/div/div[1]/section/div/div[1]/div/div[3]/div[1]/div[1]'
+    '/div/div/div[1]/div/input'
+)
+INPUT_TEXTBOX_XPATH = (
+    '//*[@id="textareasContainer"]/div[1]/section/div/div[1]/d-textarea'
+)
+OUTPUT_TEXTBOX_XPATH = (
+    '/html/body/div[1]/div[1]/div[2]/div/div[1]/div/main/div[2]/nav/div'
+    '/div[2]/div/div/div[1]/section/div/div[2]/div[3]/section/div[1]'
+    '/d-textarea/div'
+)
+
+
+class text_is_stable:  # noqa: N801
+    """Wait condition met once an element's text is non-empty and unchanged.
+
+    Named like the conditions in selenium's expected_conditions. The text
+    has to stay the same for STABLE_PERIOD seconds, as DeepL streams the
+    translation in parts.
+    """
+
+    def __init__(self, xpath: str):
+        """Watch the text of the element at xpath."""
+        self.xpath = xpath
+        self.last_text = ''
+        self.last_change = time.monotonic()
+
+    def __call__(self, driver: WebDriver) -> str | bool:
+        """Return the text if it's stable, False otherwise."""
+        text = driver.find_element(By.XPATH, self.xpath).text
+        now = time.monotonic()
+        if text != self.last_text:
+            self.last_text = text
+            self.last_change = now
+            return False
+
+        if text.strip() and now - self.last_change >= STABLE_PERIOD:
+            return text
+        return False
+
+
+def select_language(
+    wait: WebDriverWait, button: str, field: str, language: str
+) -> None:
+    """Pick a language in one of the language dropdowns."""
+    wait.until(ec.element_to_be_clickable((By.XPATH, button))).click()
+    language_input = wait.until(ec.element_to_be_clickable((By.XPATH, field)))
+    language_input.click()
+    language_input.send_keys(language)
+    language_input.send_keys(Keys.RETURN)
+    # The dropdown closes once the language is picked.
+    wait.until(ec.invisibility_of_element_located((By.XPATH, field)))
+
+
+def prepare_for_translation(driver: WebDriver) -> None:
+    """Prepare DeepL for translation - set up source and target language."""
+    wait = WebDriverWait(driver, TIMEOUT)
+    driver.get('https://www.deepl.com/translator')
+
+    wait.until(
+        ec.element_to_be_clickable((By.XPATH, ACCEPT_COOKIES_XPATH))
+    ).click()
+    wait.until(
+        ec.element_to_be_clickable((By.XPATH, EXTENSION_SUGGESTION_CLOSE_XPATH))
+    ).click()
+
+    select_language(
+        wait, TRANSLATE_FROM_BUTTON_XPATH, TRANSLATE_FROM_INPUT_XPATH, 'German'
+    )
+    select_language(
+        wait, TRANSLATE_TO_BUTTON_XPATH, TRANSLATE_TO_INPUT_XPATH, 'Bulgarian'
+    )
+
+
+def get_translation(driver: WebDriver, to_translate: str) -> str:
+    """Get translation for a piece of text."""
+    wait = WebDriverWait(driver, TIMEOUT, poll_frequency=0.2)
+
+    input_textbox = wait.until(
+        ec.element_to_be_clickable((By.XPATH, INPUT_TEXTBOX_XPATH))
+    )
+    input_textbox.click()
+    input_textbox.send_keys(to_translate)
+
+    translation = wait.until(text_is_stable(OUTPUT_TEXTBOX_XPATH))
+
+    input_textbox.send_keys(Keys.CONTROL + 'a')
+    input_textbox.send_keys(Keys.DELETE)
+    # Don't let the next text be mixed up with this translation.
+    wait.until(
+        lambda d: (
+            not d.find_element(By.XPATH, OUTPUT_TEXTBOX_XPATH).text.strip()
+        )
+    )
+
+    return translation
+
+
+class BrowserSession:
+    """A browser window prepared for translation once and then reused."""
+
+    def __init__(self, number: int):
+        """Create the session. The browser is opened on first use."""
+        self.number = number
+        self.driver: WebDriver | None = None
+
+    def translate(self, to_translate: str) -> str:
+        """Translate the text, opening the browser if necessary."""
+        if self.driver is None:
+            self.driver = webdriver.Chrome()
+            prepare_for_translation(self.driver)
+        return get_translation(self.driver, to_translate)
+
+    def close(self) -> None:
+        """Quit the browser, ignoring a session that's already broken."""
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+        self.driver = None
+
+
+class BrowserBackend(TranslationBackend):
+    """Translate texts by typing them into the DeepL web translator.
+
+    All texts of a batch are typed at once, separated by lines of
+    dashes, and the translation is split back at the separators. Each
+    worker uses its own browser session from a pool. A session that
+    breaks is restarted without affecting the others.
+    """
+
+    # The free web translator accepts at most 1500 characters.
+    max_batch_size = 30
+    max_batch_chars = 1500
+
+    def __init__(self, sessions: int = 1):
+        """Create a pool of the given number of browser sessions."""
+        self.max_concurrency = sessions
+        self.sessions = [BrowserSession(number) for number in range(sessions)]
+        self.idle_sessions: queue.Queue[BrowserSession] = queue.Queue()
+        for session in self.sessions:
+            self.idle_sessions.put(session)
+
+    def translate(self, texts: list[str]) -> list[str]:
+        """Translate the texts in a single go on an idle session."""
+        to_translate = f'\n{SEGMENT_SEPARATOR}\n'.join(texts) + '\n'
+
+        # Text to translate should look like:
+        # Abschnitt
+        # ---
+        # Lesen Sie bitte den zweiten Abschnitt.
+        # ---
+        # Some other example, etc...
+
+        session = self.idle_sessions.get()
+        try:
+            translation = session.translate(to_translate)
+        except WebDriverException:
+            logger.warning(
+                f'Browser session {session.number} failed, restarting it'
+            )
+            session.close()
+            try:
+                translation = session.translate(to_translate)
+            except WebDriverException as retry_error:
+                session.close()
+                raise TranslationError(
+                    f'Browser session {session.number} failed'
+                ) from retry_error
+        finally:
+            self.idle_sessions.put(session)
+
+        translations = [
+            text.strip() for text in translation.split(SEGMENT_SEPARATOR)
+        ]
+        if len(translations) != len(texts):
+            raise TranslationError(
+                f'Expected {len(texts)} translations, got {len(translations)}'
+            )
+
+        return translations
+
+    def close(self) -> None:
+        """Quit all browsers."""
+        for session in self.sessions:
+            session.close()
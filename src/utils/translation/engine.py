@@ -0,0 +1,141 @@
+"""Concurrent, rate-limited translation of many entries.
+
+Entries - a word and its examples - are packed into batches that fill a
+backend request as much as possible. A pool of async workers sends the
+batches, each request taking a token from a shared token bucket, so the
+throughput is bound by the rate limit and not by fixed waits.
+"""
+
+import asyncio
+import time
+from collections.abc import Callable
+
+from utils.logger import logger, metrics
+from utils.translation.backend import TranslationBackend
+
+# An entry is a key, e.g. the word, and the texts to translate.
+Batch = list[tuple[str, list[str]]]
+
+
+class TokenBucket:
+    """Limit the rate of requests, allowing short bursts."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """Allow rate tokens per second, at most capacity at once."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate,
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def pack_batches(
+    entries: dict[str, list[str]], max_size: int, max_chars: int
+) -> list[Batch]:
+    """Pack whole entries into batches within the request limits."""
+    batches: list[Batch] = []
+    batch: Batch = []
+    size = 0
+    chars = 0
+    for key, texts in entries.items():
+        entry_chars = sum(len(text) for text in texts)
+        if batch and (
+            size + len(texts) > max_size or chars + entry_chars > max_chars
+        ):
+            batches.append(batch)
+            batch, size, chars = [], 0, 0
+
+        # Entries exceeding the limits on their own get a batch anyway.
+        batch.append((key, texts))
+        size += len(texts)
+        chars += entry_chars
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+async def translate_entries_async(
+    entries: dict[str, list[str]],
+    backend: TranslationBackend,
+    concurrency: int,
+    requests_per_second: float,
+    on_translated: Callable[[str, list[str]], None],
+) -> list[str]:
+    """Translate the entries, calling on_translated for every one of them.
+
+    Returns the keys of the entries that failed to translate.
+    """
+    batches = pack_batches(
+        entries, backend.max_batch_size, backend.max_batch_chars
+    )
+    if backend.max_concurrency is not None:
+        concurrency = min(concurrency, backend.max_concurrency)
+    logger.info(
+        f'Translating {len(entries)} entries in {len(batches)} requests '
+        f'with {concurrency} workers'
+    )
+
+    queue: asyncio.Queue[Batch] = asyncio.Queue()
+    for batch in batches:
+        queue.put_nowait(batch)
+
+    bucket = TokenBucket(requests_per_second)
+    failed: list[str] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            batch = queue.get_nowait()
+            texts = [text for _, entry_texts in batch for text in entry_texts]
+
+            await bucket.acquire()
+            metrics.count('translation_requests')
+            metrics.count('translated_texts', len(texts))
+            try:
+                translations = await asyncio.to_thread(backend.translate, texts)
+            except Exception as error:
+                logger.error(f'Failed to translate a batch: {error}')
+                metrics.count('failed_translation_requests')
+                failed.extend(key for key, _ in batch)
+                continue
+
+            # Split the translations back into entries.
+            start = 0
+            for key, entry_texts in batch:
+                end = start + len(entry_texts)
+                on_translated(key, translations[start:end])
+                start = end
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return failed
+
+
+def translate_entries(
+    entries: dict[str, list[str]],
+    backend: TranslationBackend,
+    concurrency: int,
+    requests_per_second: float,
+    on_translated: Callable[[str, list[str]], None],
+) -> list[str]:
+    """Translate the entries, see translate_entries_async."""
+    return asyncio.run(
+        translate_entries_async(
+            entries, backend, concurrency, requests_per_second, on_translated
+        )
+    )
@@ -0,0 +1,66 @@
+"""Backend using an HTTP API compatible with DeepL's /v2/translate."""
+
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from utils.translation.backend import TranslationBackend, TranslationError
+
+
+class HttpBackend(TranslationBackend):
+    """Translate texts through a DeepL compatible HTTP API.
+
+    Many texts are sent in a single request, the API translates each of
+    them separately.
+    """
+
+    max_batch_size = 50
+    max_batch_chars = 100_000
+
+    def __init__(
+        self,
+        url: str,
+        auth_key: str | None,
+        source_lang: str,
+        target_lang: str,
+        timeout: float = 60,
+    ):
+        """Create a backend sending requests to the given URL."""
+        self.url = url
+        self.auth_key = auth_key
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.timeout = timeout
+
+    def translate(self, texts: list[str]) -> list[str]:
+        """Translate the texts with a single request."""
+        body = urllib.parse.urlencode(
+            [('text', text) for text in texts]
+            + [
+                ('source_lang', self.source_lang),
+                ('target_lang', self.target_lang),
+            ]
+        ).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST')
+        request.add_header('Content-Type', 'application/x-www-form-urlencoded')
+        if self.auth_key:
+            request.add_header(
+                'Authorization', f'DeepL-Auth-Key {self.auth_key}'
+            )
+
+        try:
+            with urllib.request.urlopen(
+                request, timeout=self.timeout
+            ) as response:
+                payload = json.load(response)
+        except (urllib.error.URLError, TimeoutError, ValueError) as error:
+            raise TranslationError(f'Request to {self.url} failed') from error
+
+        translations = [item['text'] for item in payload['translations']]
+        if len(translations) != len(texts):
+            raise TranslationError(
+                f'Expected {len(texts)} translations, got {len(translations)}'
+            )
+
+        return translations
@@ -0,0 +1,68 @@
+"""Persistent memory of translated segments.
+
+A segment is a single text - the word to search for or an example. The
+memory is keyed by a hash of the normalized segment and the language
+pair, so a segment is translated once no matter how many entries contain
+it, in which order, or in which run.
+"""
+
+import hashlib
+import sqlite3
+
+from utils.text import normalize
+
+
+def segment_hash(text: str) -> str:
+    """Hash the normalized segment."""
+    return hashlib.sha256(normalize(text).encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """SQLite store of segment translations for a language pair."""
+
+    def __init__(self, path: str, source_lang: str, target_lang: str):
+        """Open the memory at path, creating it if necessary."""
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            'source_hash TEXT, source_lang TEXT, target_lang TEXT, '
+            'source TEXT, translation TEXT, '
+            'PRIMARY KEY (source_hash, source_lang, target_lang))'
+        )
+
+    def lookup(self, hashes: list[str]) -> dict[str, str]:
+        """Return the known translations of the segments with these hashes."""
+        translations = {}
+        # Stay below SQLite's limit of variables per statement.
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start : start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor = self.connection.execute(
+                'SELECT source_hash, translation FROM segments '
+                'WHERE source_lang = ? AND target_lang = ? '
+                f'AND source_hash IN ({placeholders})',
+                (self.source_lang, self.target_lang, *chunk),
+            )
+            translations.update(cursor)
+
+        return translations
+
+    def store(self, text: str, translation: str) -> None:
+        """Remember the translation of a segment."""
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?)',
+                (
+                    segment_hash(text),
+                    self.source_lang,
+                    self.target_lang,
+                    normalize(text),
+                    translation,
+                ),
+            )
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        self.connection.close()
@@ -0,0 +1,88 @@
+"""Local stand-in for DeepL's /v2/translate endpoint.
+
+Translations are the source texts prefixed with the target language,
+e.g. '[BG] Abschnitt'. Meant for exercising the translation engine
+without a network connection or an API key:
+
+    python3 src/utils/translation/stub_server.py --port 8080
+
+and point 07_translate.py to it with the environment variables
+TRANSLATION_BACKEND=http and
+TRANSLATION_API_URL=http://127.0.0.1:8080/v2/translate
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answer translation requests with fake translations."""
+
+    # Seconds to wait before answering, to simulate a real API.
+    latency = 0.0
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Translate the texts of the form encoded body."""
+        length = int(self.headers.get('Content-Length', 0))
+        form = urllib.parse.parse_qs(
+            self.rfile.read(length).decode('utf-8'), keep_blank_values=True
+        )
+        target_lang = form.get('target_lang', ['BG'])[0]
+        translations = [
+            {'text': f'[{target_lang}] {text}'} for text in form.get('text', [])
+        ]
+
+        time.sleep(self.latency)
+
+        body = json.dumps(
+            {'translations': translations}, ensure_ascii=False
+        ).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Keep the output quiet."""
+
+
+def start_stub_server(
+    host: str = '127.0.0.1', port: int = 0, latency: float = 0.0
+) -> tuple[ThreadingHTTPServer, str]:
+    """Start the server in a background thread.
+
+    Returns the server, to shut it down, and the URL of the endpoint.
+    """
+    handler = type('Handler', (StubHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}/v2/translate'
+
+
+def main() -> None:
+    """Run the stub server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help='Seconds to wait before answering a request',
+    )
+    args = parser.parse_args()
+
+    handler = type('Handler', (StubHandler,), {'latency': args.latency})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
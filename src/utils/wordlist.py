@@ -0,0 +1,93 @@
+"""Storage of the preprocessed wordlist shared by the later scripts.
+
+The wordlist is kept as JSON Lines - one object per word - so that the
+examples are stored as native lists instead of stringified Python lists.
+
+The steps that only go through the words read it as rows, without
+importing pandas, so that they start quickly when there's nothing to do.
+"""
+
+import json
+import mmap
+import os
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, NamedTuple
+
+from utils.constants import (
+    WORDLIST_PREPROCESSED_CSV_PATH,
+    WORDLIST_PREPROCESSED_JSONL_PATH,
+)
+from utils.logger import logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columns of the preprocessed wordlist, in order.
+COLUMNS = ['word', 'examples', 'word_audio', 'word_search']
+
+
+class WordlistRow(NamedTuple):
+    """A word of the preprocessed wordlist."""
+
+    word: str
+    examples: list[str]
+    word_audio: str
+    word_search: str
+
+
+def read_preprocessed_records() -> list[dict]:
+    """Read the objects of the preprocessed JSONL wordlist."""
+    if not os.path.exists(WORDLIST_PREPROCESSED_JSONL_PATH):
+        logger.error(
+            'Preprocessed wordlist JSONL file not found. '
+            'Did you run "05_preprocess_csv.py"?'
+        )
+        logger.error(f'{WORDLIST_PREPROCESSED_JSONL_PATH} does not exist')
+        raise SystemExit('Aborting')
+
+    if os.path.getsize(WORDLIST_PREPROCESSED_JSONL_PATH) == 0:
+        return []
+
+    # Map the file instead of reading it into a second buffer.
+    with (
+        open(WORDLIST_PREPROCESSED_JSONL_PATH, 'rb') as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+    ):
+        return [json.loads(line) for line in iter(mapped.readline, b'')]
+
+
+def read_preprocessed_wordlist() -> 'pd.DataFrame':
+    """Read the preprocessed JSONL wordlist with examples as lists."""
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        read_preprocessed_records(), columns=COLUMNS
+    )
+
+
+def read_preprocessed_rows() -> list[WordlistRow]:
+    """Read the preprocessed JSONL wordlist as rows, without pandas."""
+    return [
+        WordlistRow(*(record[column] for column in COLUMNS))
+        for record in read_preprocessed_records()
+    ]
+
+
+def iter_rows(
+    wordlist: 'pd.DataFrame | list[WordlistRow]',
+) -> Iterator[WordlistRow]:
+    """Go through the words of the wordlist, a DataFrame or rows."""
+    if isinstance(wordlist, list):
+        return iter(wordlist)
+    return wordlist[COLUMNS].itertuples(index=False, name='WordlistRow')
+
+
+def write_preprocessed_wordlist(df: 'pd.DataFrame') -> None:
+    """Save the preprocessed wordlist as JSONL and export it as CSV."""
+    with open(WORDLIST_PREPROCESSED_JSONL_PATH, 'w', encoding='utf-8') as file:
+        for record in df[COLUMNS].to_dict(orient='records'):
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+
+    # The CSV file is only a human-readable view, no script reads it.
+    df.to_csv(WORDLIST_PREPROCESSED_CSV_PATH, index=False)
@@ -0,0 +1,70 @@
+"""Tests of the Anki deck packages written by utils/apkg.py."""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.apkg import ApkgWriter, Note  # noqa: E402
+from utils.cards import CARD_TYPES, FIELD_NAMES  # noqa: E402
+
+NOTE = Note(key='das Haus', fields=['Haus', 'къща', 'къща', 'Das [...].'])
+
+
+class CardIdTest(unittest.TestCase):
+    """Keeping the progress of the cards across builds."""
+
+    def setUp(self) -> None:
+        """Write the packages in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def build(self, card_types: list[str]) -> tuple[list, dict]:
+        """Build a package with the card types.
+
+        Returns the ids and ords of its cards, and the names of the
+        templates of every note type, by its id.
+        """
+        path = os.path.join(self.directory, f'{"_".join(card_types)}.apkg')
+        with ApkgWriter(
+            path,
+            deck_name='Deck',
+            model_name='Model',
+            field_names=FIELD_NAMES,
+            templates=list(CARD_TYPES.values()),
+            card_templates=[CARD_TYPES[name] for name in card_types],
+        ) as writer:
+            writer.add(NOTE)
+
+        collection_path = os.path.join(self.directory, 'collection.anki2')
+        with zipfile.ZipFile(path) as archive:
+            archive.extract('collection.anki2', self.directory)
+        connection = sqlite3.connect(collection_path)
+        cards = connection.execute('SELECT id, ord FROM cards').fetchall()
+        (models,) = connection.execute('SELECT models FROM col').fetchone()
+        connection.close()
+        os.remove(collection_path)
+        return sorted(cards), {
+            model_id: [template['name'] for template in model['tmpls']]
+            for model_id, model in json.loads(models).items()
+        }
+
+    def test_cards_keep_their_ids_across_card_types(self) -> None:
+        """A card type gets the same card, whatever else is chosen."""
+        de_bg, models = self.build(['de_bg'])
+        bg_de, other_models = self.build(['bg_de'])
+        both, _ = self.build(['de_bg', 'bg_de'])
+
+        self.assertEqual(sorted(de_bg + bg_de), both)
+        self.assertNotEqual(de_bg, bg_de)
+        self.assertEqual(models, other_models)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests of the deck data storage of utils/deck_data.py."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils import deck_data  # noqa: E402
+
+
+def word(idx: int, text: str = '') -> dict:
+    """Deck data of a word."""
+    return {'word_de': f'Wort {idx}', 'manually_verified': False, 'x': text}
+
+
+class WriteDeckDataTest(unittest.TestCase):
+    """Saving the deck data, the only copy of the verified words."""
+
+    def setUp(self) -> None:
+        """Keep the deck data and its index in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, file_name in (
+            ('DECK_DATA_JSONL_PATH', 'deck_data.jsonl'),
+            ('DECK_DATA_INDEX_PATH', 'deck_data_index.json'),
+        ):
+            patcher = mock.patch.object(
+                deck_data, name, os.path.join(directory.name, file_name)
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.objects = [word(idx) for idx in range(20)]
+        deck_data.write_deck_data(self.objects)
+
+    def test_failed_rewrite_keeps_the_file(self) -> None:
+        """The file is left as it was if rewriting its tail fails."""
+        grown = [*self.objects[:5], word(5, 'x' * 100), *self.objects[6:]]
+        pad = deck_data.pad
+        calls = 0
+
+        def pad_then_fail(serialized: bytes) -> bytes:
+            nonlocal calls
+            calls += 1
+            if calls > 3:
+                raise OSError('No space left on device')
+            return pad(serialized)
+
+        with mock.patch.object(deck_data, 'pad', pad_then_fail):
+            with self.assertRaises(OSError):
+                deck_data.write_deck_data(grown)
+
+        self.assertEqual(list(deck_data.iter_deck_data()), self.objects)
+        self.assertEqual(deck_data.load_index(), deck_data.build_index())
+
+    def test_rewrites_only_what_changed(self) -> None:
+        """Lines fitting their slots are written in place, others moved."""
+        self.objects[2] = word(2, 'x')
+        self.assertEqual(deck_data.write_deck_data(self.objects), 1)
+
+        self.objects[10] = word(10, 'x' * 100)
+        self.assertEqual(deck_data.write_deck_data(self.objects), 10)
+        self.assertEqual(list(deck_data.iter_deck_data()), self.objects)
+        self.assertEqual(deck_data.load_index(), deck_data.build_index())
+
+
+if __name__ == '__main__':
+    unittest.main()
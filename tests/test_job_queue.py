@@ -0,0 +1,78 @@
+"""Tests of the durable queue of 06_create_audio.py and 07_translate.py."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils import job_queue  # noqa: E402
+from utils.job_queue import DONE, FAILED, IN_PROGRESS, JobQueue  # noqa: E402
+
+
+class JobQueueTest(unittest.TestCase):
+    """Resuming the items of an interrupted run."""
+
+    def setUp(self) -> None:
+        """Create the queue in a temporary directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'queue.sqlite')
+
+    def crash_with(self, keys: list[str]) -> None:
+        """Leave the items in progress, as a crashed run would."""
+        queue = JobQueue(self.path, 'step')
+        queue.add(keys)
+        queue.set_state(keys, IN_PROGRESS)
+        queue.close()
+
+    def test_resumes_unfinished_items(self) -> None:
+        """Items left in progress are processed by the next run."""
+        self.crash_with(['kept', 'done'])
+        queue = JobQueue(self.path, 'step')
+        queue.finish(['done'])
+        processed = []
+
+        def process(keys: list[str]) -> None:
+            processed.extend(keys)
+            queue.finish(keys)
+
+        queue.drain(process)
+        self.assertEqual(processed, ['kept'])
+        self.assertEqual(queue.counts(), {DONE: 2})
+        queue.close()
+
+    def test_forgets_items_removed_from_the_input(self) -> None:
+        """Unfinished items of words removed since aren't processed."""
+        self.crash_with(['kept', 'removed'])
+        queue = JobQueue(self.path, 'step')
+        queue.retain({'kept'})
+        processed = []
+
+        def process(keys: list[str]) -> None:
+            processed.extend(keys)
+            queue.finish(keys)
+
+        queue.drain(process)
+        self.assertEqual(processed, ['kept'])
+        self.assertEqual(queue.states(), {'kept': DONE})
+        queue.close()
+
+    def test_retries_items_left_in_progress(self) -> None:
+        """Items process neither finished nor failed are attempted again."""
+        queue = JobQueue(self.path, 'step')
+        queue.add(['forgotten'])
+        processed = []
+
+        with mock.patch.object(job_queue, 'INITIAL_BACKOFF', 0.01):
+            queue.drain(processed.extend)
+
+        self.assertEqual(processed, ['forgotten'] * job_queue.MAX_ATTEMPTS)
+        self.assertEqual(queue.states(), {'forgotten': FAILED})
+        queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
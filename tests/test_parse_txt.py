@@ -0,0 +1,41 @@
+"""Tests of the parsing of the TXT wordlist by 03_parse_txt.py."""
+
+import importlib
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+parse_txt = importlib.import_module('03_parse_txt')
+
+LINES = [
+    'zwingen        1. Das Wetter zwang uns umzukehren.\n',
+    '\n',
+    'zwischen       1. Das Regal steht zwischen den Schränken.\n',
+    '               2. Zwischen 8 und 10 Uhr bin ich zu Hause.\n',
+]
+
+
+class ParseEntriesTest(unittest.TestCase):
+    """Parsing the lines into words and their examples."""
+
+    def test_yields_the_entry_at_the_end_of_input(self) -> None:
+        """The last entry isn't dropped without a blank line after it."""
+        entries = list(parse_txt.parse_entries(LINES))
+
+        self.assertEqual(
+            entries,
+            [
+                ('zwingen\n', '1. Das Wetter zwang uns umzukehren.\n'),
+                (
+                    'zwischen\n\n',
+                    '1. Das Regal steht zwischen den Schränken.\n'
+                    '2. Zwischen 8 und 10 Uhr bin ich zu Hause.\n',
+                ),
+            ],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
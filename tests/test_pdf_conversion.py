@@ -0,0 +1,59 @@
+"""Tests of the conversion of the wordlist PDF by 00_convert_pdf_to_txt.py."""
+
+import csv
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PDF_PATH = os.path.join(ROOT_DIR, 'data', '00_Wordlist.pdf')
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec('pymupdf') and os.path.exists(PDF_PATH),
+    'needs PyMuPDF and data/00_Wordlist.pdf',
+)
+class PdfConversionTest(unittest.TestCase):
+    """Parsing the text converted from the PDF, without manual edits."""
+
+    def run_step(self, data_dir: str, *args: str) -> None:
+        """Run a script of src in the data directory, failing on errors."""
+        process = subprocess.run(
+            [sys.executable, *args],
+            cwd=os.path.join(ROOT_DIR, 'src'),
+            env={**os.environ, 'DATA_DIR': data_dir},
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+
+    def test_converted_text_is_parsed(self) -> None:
+        """Steps 01 to 03 parse the words of every section."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.run_step(
+                data_dir, '00_convert_pdf_to_txt.py', '--pdf', PDF_PATH
+            )
+            self.run_step(data_dir, 'pipeline.py', '--from', '01', '--to', '03')
+
+            with open(
+                os.path.join(data_dir, '03_Wordlist_Raw.csv'), encoding='utf-8'
+            ) as file:
+                words = [row['word'] for row in csv.DictReader(file)]
+            with open(
+                os.path.join(data_dir, '02_Wordlist_Preprocessed.txt'),
+                encoding='utf-8',
+            ) as file:
+                headings = [line for line in file if len(line.strip()) == 1]
+
+        self.assertGreater(len(words), 2500)
+        self.assertEqual(
+            ''.join(line.strip() for line in headings),
+            'ABCDEFGHIJKLMNOPQRSTUVWZ',
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
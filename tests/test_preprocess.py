@@ -0,0 +1,35 @@
+"""Golden test of the preprocessing rules of 05_preprocess_csv.py."""
+
+import importlib
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.wordlist import COLUMNS  # noqa: E402
+
+preprocess = importlib.import_module('05_preprocess_csv')
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+CLEANED_CSV_PATH = os.path.join(DATA_DIR, '04_Wordlist_Cleaned.csv')
+GOLDEN_CSV_PATH = os.path.join(DATA_DIR, '05_Wordlist_Preprocessed.csv')
+
+
+class GoldenWordlistTest(unittest.TestCase):
+    """The rules give the checked-in preprocessed wordlist."""
+
+    def test_matches_the_golden_csv(self) -> None:
+        """Every row of the cleaned wordlist is preprocessed as before."""
+        df = pd.read_csv(CLEANED_CSV_PATH)
+        actual = preprocess.preprocess_rows(df)[COLUMNS].to_csv(index=False)
+        with open(GOLDEN_CSV_PATH, encoding='utf-8', newline='') as file:
+            expected = file.read()
+
+        self.assertEqual(actual.splitlines(), expected.splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
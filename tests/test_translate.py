@@ -0,0 +1,74 @@
+"""Tests of the reuse of saved translations by 07_translate.py."""
+
+import importlib
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.wordlist import WordlistRow  # noqa: E402
+
+translate = importlib.import_module('07_translate')
+
+ROW = WordlistRow(
+    word='die Abteilung, -en',
+    examples=['Ich arbeite in der Abteilung.', 'Die Abteilung ist neu.'],
+    word_audio='die Abteilung',
+    word_search='Abteilung',
+)
+# As saved by the original scraper, without a trailing newline.
+LEGACY_TRANSLATION = 'отдел\n---\nРаботя в отдела.\n---\nОтделът е нов.'
+
+
+class LegacyTranslationTest(unittest.TestCase):
+    """Translations saved before the job queue and translation memory."""
+
+    def setUp(self) -> None:
+        """Keep the translations, queue and memory in a temporary dir."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = {
+            'TRANSLATIONS_DIR_PATH': os.path.join(directory.name, '07'),
+            'JOB_QUEUE_PATH': os.path.join(directory.name, 'queue.sqlite'),
+            'TRANSLATION_MEMORY_PATH': os.path.join(
+                directory.name, 'memory.sqlite'
+            ),
+        }
+        for name, path in paths.items():
+            patcher = mock.patch.object(translate, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def save_legacy(self, contents: str) -> None:
+        """Save the translation of ROW as the original scraper did."""
+        path = translate.translation_path(ROW.word)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(contents)
+
+    def test_reuses_files_without_trailing_newline(self) -> None:
+        """Nothing is translated again, nor the file rewritten."""
+        self.save_legacy(LEGACY_TRANSLATION)
+
+        for _ in range(2):
+            with mock.patch.object(translate, 'create_backend') as create:
+                translate.run([ROW])
+            create.assert_not_called()
+
+        self.assertEqual(
+            translate.read_translation(ROW.word), LEGACY_TRANSLATION
+        )
+
+    def test_rejects_files_cut_short(self) -> None:
+        """A file missing the translation of an example is incomplete."""
+        self.save_legacy(LEGACY_TRANSLATION.rsplit('\n---\n', 1)[0])
+        texts = [ROW.word_search, *ROW.examples]
+
+        self.assertIsNone(translate.complete_translations(ROW.word, texts))
+
+
+if __name__ == '__main__':
+    unittest.main()
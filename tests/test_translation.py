@@ -0,0 +1,257 @@
+"""Tests of the HTTP translation backend against the stub server."""
+
+import importlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils import job_queue  # noqa: E402
+from utils.translation import stub_server  # noqa: E402
+from utils.translation.backend import TranslationError  # noqa: E402
+from utils.translation.engine import translate_entries  # noqa: E402
+from utils.translation.http_backend import HttpBackend  # noqa: E402
+from utils.wordlist import WordlistRow  # noqa: E402
+
+translate = importlib.import_module('07_translate')
+
+EXAMPLE = 'Ich arbeite in der Abteilung.'
+ROWS = [
+    WordlistRow(
+        word='die Abteilung, -en',
+        examples=[EXAMPLE, 'Die Abteilung ist neu.'],
+        word_audio='die Abteilung',
+        word_search='Abteilung',
+    ),
+    WordlistRow(
+        word='arbeiten',
+        examples=[EXAMPLE],
+        word_audio='arbeiten',
+        word_search='arbeiten',
+    ),
+]
+
+
+class RecordingHandler(stub_server.StubHandler):
+    """Record the requests, failing the first `failures` of them."""
+
+    requests: list[tuple[float, dict, str | None]]
+    failures = 0
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Record the form and the key of the request, then answer it."""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        form = urllib.parse.parse_qs(body.decode('utf-8'))
+        with self.lock:
+            self.requests.append(
+                (time.monotonic(), form, self.headers.get('Authorization'))
+            )
+            fail = self.failures > 0
+            if fail:
+                type(self).failures -= 1
+
+        if fail:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.rfile = io.BytesIO(body)
+        super().do_POST()
+
+
+class StubServerTest(unittest.TestCase):
+    """Run against a stub server recording the requests."""
+
+    def setUp(self) -> None:
+        """Start the stub server."""
+        self.handler = type(
+            'Handler', (RecordingHandler,), {'requests': [], 'failures': 0}
+        )
+        with mock.patch.object(stub_server, 'StubHandler', self.handler):
+            server, self.url = stub_server.start_stub_server()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def backend(self, auth_key: str | None = None) -> HttpBackend:
+        """Create a backend sending requests to the stub server."""
+        return HttpBackend(self.url, auth_key, 'DE', 'BG')
+
+
+class HttpBackendTest(StubServerTest):
+    """Requests and responses of the DeepL API."""
+
+    def test_maps_texts_to_translations(self) -> None:
+        """All texts go in a single form, translated in their order."""
+        translations = self.backend('secret').translate(['Haus', 'Maus'])
+
+        self.assertEqual(translations, ['[BG] Haus', '[BG] Maus'])
+        ((_, form, auth),) = self.handler.requests
+        self.assertEqual(
+            form,
+            {
+                'text': ['Haus', 'Maus'],
+                'source_lang': ['DE'],
+                'target_lang': ['BG'],
+            },
+        )
+        self.assertEqual(auth, 'DeepL-Auth-Key secret')
+
+    def test_sends_no_key_without_one(self) -> None:
+        """The stub server and self-hosted APIs need no key."""
+        self.backend().translate(['Haus'])
+
+        self.assertIsNone(self.handler.requests[0][2])
+
+    def test_raises_on_failed_requests(self) -> None:
+        """Errors of the API are TranslationErrors, left to the engine."""
+        self.handler.failures = 1
+
+        with self.assertRaises(TranslationError):
+            self.backend().translate(['Haus'])
+
+
+class EngineTest(StubServerTest):
+    """Translating many entries through the HTTP backend."""
+
+    def translate(
+        self, entries: dict[str, list[str]], rate: float = 1000
+    ) -> tuple[dict[str, list[str]], list[str]]:
+        """Translate the entries, a text per request.
+
+        Returns the translations of every entry and the failed entries.
+        """
+        backend = self.backend()
+        backend.max_batch_size = 1
+        translated: dict[str, list[str]] = {}
+        failed = translate_entries(
+            entries,
+            backend,
+            concurrency=4,
+            requests_per_second=rate,
+            on_translated=translated.__setitem__,
+        )
+        return translated, failed
+
+    def test_paces_requests(self) -> None:
+        """Requests are sent at the rate limit, whatever the concurrency."""
+        entries = {str(idx): [f'Text {idx}'] for idx in range(6)}
+
+        translated, failed = self.translate(entries, rate=20)
+
+        self.assertEqual(
+            translated,
+            {key: [f'[BG] {text}'] for key, (text,) in entries.items()},
+        )
+        self.assertEqual(failed, [])
+        times = sorted(sent for sent, _, _ in self.handler.requests)
+        # The bucket holds a single token, so requests are 50 ms apart.
+        self.assertGreaterEqual(times[-1] - times[0], 0.2)
+
+    def test_reports_failed_entries(self) -> None:
+        """Entries of failed requests are returned, the others translated."""
+        self.handler.failures = 1
+
+        translated, failed = self.translate({'a': ['A'], 'b': ['B']})
+
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(set(translated) | set(failed), {'a', 'b'})
+
+
+class TranslateTest(StubServerTest):
+    """07_translate.py with the HTTP backend."""
+
+    def setUp(self) -> None:
+        """Keep the translations, queue and memory in a temporary dir."""
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patchers = [
+            mock.patch.object(
+                translate, name, os.path.join(directory.name, path)
+            )
+            for name, path in (
+                ('TRANSLATIONS_DIR_PATH', '07'),
+                ('JOB_QUEUE_PATH', 'queue.sqlite'),
+                ('TRANSLATION_MEMORY_PATH', 'memory.sqlite'),
+            )
+        ]
+        patchers.append(
+            mock.patch.dict(
+                os.environ,
+                {
+                    'TRANSLATION_BACKEND': 'http',
+                    'TRANSLATION_API_URL': self.url,
+                    'TRANSLATION_RATE_LIMIT': '1000',
+                },
+            )
+        )
+        # Retry right away.
+        patchers.append(mock.patch.object(job_queue, 'INITIAL_BACKOFF', 0.01))
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sent_texts(self) -> list[str]:
+        """Texts sent to the server so far."""
+        return [
+            text
+            for _, form, _ in self.handler.requests
+            for text in form['text']
+        ]
+
+    def test_translates_shared_segments_once(self) -> None:
+        """An example of several words is only sent once."""
+        translate.run(ROWS)
+
+        self.assertCountEqual(
+            self.sent_texts(),
+            ['Abteilung', EXAMPLE, 'Die Abteilung ist neu.', 'arbeiten'],
+        )
+        self.assertEqual(
+            translate.read_translation('arbeiten'),
+            f'[BG] arbeiten\n---\n[BG] {EXAMPLE}\n',
+        )
+
+    def test_reuses_the_memory_across_runs(self) -> None:
+        """Only segments new to the memory are sent again."""
+        translate.run(ROWS[:1])
+        self.handler.requests.clear()
+
+        translate.run(ROWS)
+
+        self.assertEqual(self.sent_texts(), ['arbeiten'])
+
+    def test_retries_failed_requests(self) -> None:
+        """Words of failed requests are retried until translated."""
+        self.handler.failures = 2
+
+        translate.run(ROWS[1:])
+
+        self.assertEqual(len(self.handler.requests), 3)
+        self.assertEqual(
+            translate.read_translation('arbeiten'),
+            f'[BG] arbeiten\n---\n[BG] {EXAMPLE}\n',
+        )
+
+    def test_gives_up_after_max_attempts(self) -> None:
+        """A word failing every attempt fails the step."""
+        self.handler.failures = job_queue.MAX_ATTEMPTS
+
+        with self.assertRaises(SystemExit):
+            translate.run(ROWS[1:])
+
+        self.assertEqual(len(self.handler.requests), job_queue.MAX_ATTEMPTS)
+        self.assertIsNone(translate.read_translation('arbeiten'))
+
+
+if __name__ == '__main__':
+    unittest.main()